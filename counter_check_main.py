@@ -0,0 +1,33 @@
+import app_logging
+import model
+import model.crawl
+
+logger = app_logging.create_logger()
+
+
+def main():
+    app_logging.set_level(app_logging.INFO)
+
+    logger.info('counter check main')
+
+    session_context = model.create_session_context()
+
+    with session_context(do_commit=False) as session:
+        mismatches = model.crawl.check_counters(session)
+
+    for (job_id, name), (counter, count) in sorted(mismatches.items()):
+        logger.warning(f'counter mismatch: {job_id=}, {name=}, {counter=}, {count=}')
+    logger.info(f'{len(mismatches)=}')
+
+    if not mismatches:
+        return
+
+    repair = input('repair counters [y/n] > ').lower() == 'y'
+    logger.info(f'{repair=}')
+    if repair:
+        with session_context() as session:
+            model.crawl.check_counters(session, repair=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,69 @@
+import contextlib
+import os
+from typing import Optional
+
 import app_logging
 import cert
 import launch_cert_server
+import metrics
 import model.crawl
 import opener
 import worker.crawl
+from worker.crawl.manaba_family import ManabaPageFamily
 
 logger = app_logging.create_logger()
 
 COOKIE_FILE_PATH = 'cookie.txt'
+# metrics are collected and dumped only if set; `.json` for a JSON snapshot, otherwise
+# the Prometheus text format
+METRICS_FILE_PATH = os.environ.get('CRAWLER_METRICS_FILE')
+METRICS_DUMP_INTERVAL = 60.0
+# set to crawl the latest job together with other processes, each with its own id;
+# only one of them should create the job
+WORKER_ID = os.environ.get('CRAWLER_WORKER_ID')
+# responses are appended to this archive if set
+ARCHIVE_FILE_PATH = os.environ.get('CRAWLER_ARCHIVE_FILE')
+# set to crawl offline from an archive recorded with `CRAWLER_ARCHIVE_FILE`, without
+# logging in and without the rate limit
+REPLAY_FILE_PATH = os.environ.get('CRAWLER_REPLAY_FILE')
+# responses of the groups of `opener.MANABA_CACHE_POLICY` are cached in this directory
+# if set, and served from it by later runs while they live
+CACHE_DIR_PATH = os.environ.get('OPENER_CACHE_DIR')
+
+
+def create_cache() -> Optional[opener.ResponseCache]:
+    if not CACHE_DIR_PATH:
+        return None
+    return opener.ResponseCache(
+        CACHE_DIR_PATH,
+        opener.MANABA_CACHE_POLICY,
+        group_of=ManabaPageFamily.group_name_of
+    )
+
+
+def enter_url_opener(stack: contextlib.ExitStack, lcm: cert.LoginCertManager) \
+        -> opener.URLOpenerUtilMethodsMixin:
+    if REPLAY_FILE_PATH:
+        return stack.enter_context(
+            opener.ReplayURLOpener(archive_file_name=REPLAY_FILE_PATH)
+        )
+
+    url_opener = stack.enter_context(opener.ManabaURLOpener(
+        cookie_file_name=COOKIE_FILE_PATH,
+        rate_limiter=opener.URLRateLimiter(opener.MANABA_RATE_LIMIT_POLICY),
+        retrier=opener.URLRetrier(),
+        cache=None if ARCHIVE_FILE_PATH else create_cache()
+    ))
+    url_opener.login(lcm)
+    if ARCHIVE_FILE_PATH:
+        # retried by the recording opener, which the crawler calls
+        url_opener = stack.enter_context(opener.RecordingURLOpener(
+            url_opener=url_opener,
+            archive_file_name=ARCHIVE_FILE_PATH,
+            retrier=opener.URLRetrier(),
+            cache=create_cache()
+        ))
+    return url_opener
 
 
 def main():
@@ -19,11 +75,18 @@ def main():
     create_new_session = input('new session [y/n] > ').lower() == 'y'
     logger.info(f'{create_new_session=}')
 
-    with opener.ManabaURLOpener(
-            cookie_file_name=COOKIE_FILE_PATH,
-            rate_limiter=opener.URLRateLimiter(sleep=20)
-    ) as url_opener:
-        url_opener.login(lcm)
+    with contextlib.ExitStack() as stack:
+        if METRICS_FILE_PATH:
+            metrics.enable()
+            metrics.registry.start_periodic_dump(
+                METRICS_FILE_PATH,
+                interval=METRICS_DUMP_INTERVAL
+            )
+            # exited last, so the final dump is written even if the crawl fails and
+            # includes the metrics of closing the opener
+            stack.callback(metrics.registry.stop_periodic_dump)
+
+        url_opener = enter_url_opener(stack, lcm)
 
         manaba_crawler = worker.crawl.ManabaCrawler(
             session_context=model.create_session_context(),
@@ -32,10 +95,23 @@ def main():
 
         if create_new_session:
             manaba_crawler.initialize_tasks_by_period(
-                period=worker.crawl.ManabaCrawler.PERIOD_ALL
+                period=worker.crawl.ManabaCrawler.PERIOD_ALL,
+                storage='graph'
             )
 
-        manaba_crawler.crawl(resume_state=manaba_crawler.RESUME_LATEST)
+        if WORKER_ID:
+            manaba_crawler.crawl(
+                resume_state=manaba_crawler.RESUME_LATEST,
+                lease=worker.crawl.WorkerLease(worker_id=WORKER_ID)
+            )
+        else:
+            manaba_crawler.crawl_in_session(
+                resume_state=manaba_crawler.RESUME_LATEST,
+                commit_interval=1,
+                frontier=manaba_crawler.create_priority_frontier(
+                    group_priorities=manaba_crawler.NEWS_FIRST_GROUP_PRIORITIES
+                )
+            )
 
 
 if __name__ == '__main__':
@@ -1,3 +1,5 @@
+import os
+
 import app_logging
 import cert
 import launch_cert_server
@@ -9,6 +11,9 @@ logger = app_logging.create_logger()
 
 # TODO: unify duplicated definitions
 COOKIE_FILE_PATH = 'cookie.txt'
+# attachments are cached in this directory if set, and served from it by later runs
+# while they live
+CACHE_DIR_PATH = os.environ.get('OPENER_CACHE_DIR')
 
 
 def main():
@@ -19,7 +24,13 @@ def main():
 
     with opener.ManabaURLOpener(
             cookie_file_name=COOKIE_FILE_PATH,
-            rate_limiter=opener.URLRateLimiter(sleep=20)
+            rate_limiter=opener.URLRateLimiter(opener.MANABA_RATE_LIMIT_POLICY),
+            retrier=opener.URLRetrier(),
+            cache=opener.ResponseCache(
+                CACHE_DIR_PATH,
+                opener.MANABA_CACHE_POLICY,
+                group_of=worker.downloader.ManabaAttachmentDownloader.cache_group_of
+            ) if CACHE_DIR_PATH else None
     ) as url_opener:
         url_opener.login(lcm)
 
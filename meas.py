@@ -44,6 +44,10 @@ class TimerReport:
     def total(self):
         return sum(self.__times)
 
+    @property
+    def last_result(self):
+        return self.__last_result
+
     def __str__(self):
         return f'measured {self.count()} times' \
                f' with {self.outlier_count()} outlier(s),' \
@@ -93,6 +97,9 @@ class Timer:
                 if global_elapsed > max_time:
                     break
 
+    def iter_reports(self):
+        yield from self.__reports.items()
+
     def __str__(self):
         report_str = []
         for key, report in self.__reports.items():
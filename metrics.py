@@ -0,0 +1,241 @@
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+import app_logging
+
+__all__ = 'MetricsRegistry', 'registry', 'enable', 'disable', 'increment', 'observe', 'timer'
+
+logger = app_logging.create_logger()
+
+LabelsType = tuple[tuple[str, str], ...]
+
+# upper bounds in seconds; the last bucket takes everything above
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.__buckets = buckets
+        self.__counts = [0] * (len(buckets) + 1)
+        self.__sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.__counts[bisect.bisect_left(self.__buckets, value)] += 1
+        self.__sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.__counts)
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def iter_cumulative_buckets(self) -> Iterable[tuple[str, int]]:
+        cumulative_count = 0
+        for bound, count in zip(self.__buckets, self.__counts):
+            cumulative_count += count
+            yield repr(bound), cumulative_count
+        yield '+Inf', cumulative_count + self.__counts[-1]
+
+
+class _Timer:
+    def __init__(self, registry: 'MetricsRegistry', name: str, labels: LabelsType):
+        self.__registry = registry
+        self.__name = name
+        self.__labels = labels
+        self.__start = None
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__registry.observe_labels(
+            self.__name,
+            time.perf_counter() - self.__start,
+            self.__labels
+        )
+        return False
+
+
+def _labels_of(labels: dict[str, object]) -> LabelsType:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: LabelsType) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + '}'
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms keyed by metric name and labels.
+
+    Recording is a no-op while the registry is disabled, which is the default, so
+    instrumented code costs an attribute check when metrics are not wanted.
+    """
+
+    def __init__(self, *, enabled: bool = False, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.__buckets = buckets
+        self.__lock = threading.Lock()
+        self.__counters: dict[tuple[str, LabelsType], float] = {}
+        self.__histograms: dict[tuple[str, LabelsType], Histogram] = {}
+        self.__dump_thread: Optional[threading.Thread] = None
+        self.__dump_stopped = threading.Event()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = name, _labels_of(labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def observe_labels(self, name: str, value: float, labels: LabelsType) -> None:
+        if not self.enabled:
+            return
+        key = name, labels
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(self.__buckets)
+            histogram.observe(value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        self.observe_labels(name, value, _labels_of(labels))
+
+    def timer(self, name: str, **labels):
+        """
+        Context manager observing the seconds spent in it into histogram `name`.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, _labels_of(labels))
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        with self.__lock:
+            counters = [
+                dict(name=name, labels=dict(labels), value=value)
+                for (name, labels), value in sorted(self.__counters.items())
+            ]
+            histograms = [
+                dict(
+                    name=name,
+                    labels=dict(labels),
+                    count=histogram.count,
+                    sum=histogram.sum,
+                    buckets=dict(histogram.iter_cumulative_buckets())
+                )
+                for (name, labels), histogram in sorted(
+                    self.__histograms.items(),
+                    key=lambda item: item[0]
+                )
+            ]
+        return dict(timestamp=time.time(), counters=counters, histograms=histograms)
+
+    def to_prometheus_text(self) -> str:
+        lines = []
+        with self.__lock:
+            declared = set()
+            for (name, labels), value in sorted(self.__counters.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name}{_format_labels(labels)} {value!r}')
+            for (name, labels), histogram in sorted(
+                    self.__histograms.items(),
+                    key=lambda item: item[0]
+            ):
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f'# TYPE {name} histogram')
+                for bound, count in histogram.iter_cumulative_buckets():
+                    bucket_labels = _format_labels(labels + (('le', bound),))
+                    lines.append(f'{name}_bucket{bucket_labels} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum!r}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path: str) -> None:
+        """
+        Write the metrics to `path` as a JSON snapshot if it ends with `.json` and in
+        the Prometheus text format otherwise. The file is replaced atomically.
+        """
+        if path.endswith('.json'):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.to_prometheus_text()
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+    def start_periodic_dump(self, path: str, *, interval: float = 60.0) -> None:
+        if self.__dump_thread is not None:
+            raise ValueError('periodic dump already started')
+
+        def run():
+            while not self.__dump_stopped.wait(interval):
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    logger.warning(f'{e} occurred while dumping metrics to {path!r}')
+            self.dump(path)
+
+        self.__dump_stopped.clear()
+        self.__dump_thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+        self.__dump_thread.start()
+        logger.info(f'periodic metrics dump started: {path=}, {interval=}')
+
+    def stop_periodic_dump(self) -> None:
+        if self.__dump_thread is None:
+            return
+        self.__dump_stopped.set()
+        self.__dump_thread.join()
+        self.__dump_thread = None
+
+
+registry = MetricsRegistry()
+
+
+def enable() -> None:
+    registry.enabled = True
+
+
+def disable() -> None:
+    registry.enabled = False
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    registry.increment(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    registry.observe(name, value, **labels)
+
+
+def timer(name: str, **labels):
+    return registry.timer(name, **labels)
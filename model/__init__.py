@@ -5,7 +5,9 @@ _DATABASE_PATH = 'db/database.db'
 
 def create_session_context(custom_db_path=None):
     from sessctx import SessionContext
+    from .migration import migrate_database
     return SessionContext.create_instance(
         custom_db_path or _DATABASE_PATH,
-        SQLDataModelBase
+        SQLDataModelBase,
+        migrate=migrate_database
     )
@@ -1,10 +1,15 @@
-from sqlalchemy import func, and_
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from .counter import CrawlCounter
+from .graph import CrawlNode, CrawlEdge
 from .job import Job
-from .lookup import Lookup
-from .page import PageContent
+from .lookup import Lookup, LookupCache, LookupHashCollisionError, lookup_cache
+from .page import PageContent, PageBlob
+from .storage import CrawlEntry, CrawlStorage, TaskStorage, GraphStorage, STORAGES, \
+    storage_of
 from .task import Task
+from .validator import PageValidator
 
 
 # noinspection PyShadowingNames
@@ -13,23 +18,94 @@ def info_dict(
         *,
         job: Job
 ) -> dict[str, object]:
+    values = CrawlCounter.values(session, job=job)
     return {
-        'unfinished_task_count':
-            session.query(func.count(Task.id)).filter(
-                and_(
-                    Task.page_id.is_(None),
-                    Task.job == job
-                )
-            ).scalar(),
-        'finished_task_count':
-            session.query(func.count(Task.id)).filter(
-                and_(
-                    Task.page_id.is_not(None),
-                    Task.job == job
-                )
-            ).scalar(),
-        'whole_page_count':
-            session.query(func.count(PageContent.id)).scalar(),
-        'whole_lookup_count':
-            session.query(func.count(Lookup.id)).scalar(),
+        name: values.get(name, 0)
+        for name in (
+            CrawlCounter.UNFINISHED_TASK,
+            CrawlCounter.FINISHED_TASK,
+            CrawlCounter.WHOLE_PAGE,
+            CrawlCounter.WHOLE_LOOKUP,
+        )
     }
+
+
+def count_crawl_rows(session: Session) -> dict[tuple[int, str], int]:
+    """
+    Count the rows `CrawlCounter` keeps track of with `COUNT(*)` over whole tables.
+    """
+    counts = {}
+    for storage in STORAGES.values():
+        entry_class = storage.entry_class
+        query = session.query(
+            entry_class.job_id,
+            entry_class.page_id.is_(None),
+            func.count(entry_class.id)
+        ).group_by(
+            entry_class.job_id,
+            entry_class.page_id.is_(None)
+        )
+        for job_id, unfinished, count in query:
+            name = CrawlCounter.UNFINISHED_TASK if unfinished else CrawlCounter.FINISHED_TASK
+            counts[job_id, name] = counts.get((job_id, name), 0) + count
+
+    counts[CrawlCounter.GLOBAL_JOB_ID, CrawlCounter.WHOLE_PAGE] \
+        = session.query(func.count(PageContent.id)).scalar()
+    counts[CrawlCounter.GLOBAL_JOB_ID, CrawlCounter.WHOLE_LOOKUP] \
+        = session.query(func.count(Lookup.id)).scalar()
+
+    return counts
+
+
+def check_counters(
+        session: Session,
+        *,
+        repair: bool = False
+) -> dict[tuple[int, str], tuple[int, int]]:
+    """
+    Compare `CrawlCounter` with the real row counts. Returns `(counter, count)` of the
+    counters which differ, keyed by `(job_id, name)`; they are overwritten with the
+    real counts if `repair` is true.
+    """
+    counts = count_crawl_rows(session)
+    counters = {
+        (job_id, name): value
+        for job_id, name, value in session.query(
+            CrawlCounter.job_id,
+            CrawlCounter.name,
+            CrawlCounter.value
+        )
+    }
+
+    mismatches = {
+        key: (counters.get(key, 0), counts.get(key, 0))
+        for key in counts.keys() | counters.keys()
+        if counters.get(key, 0) != counts.get(key, 0)
+    }
+    if repair and mismatches:
+        CrawlCounter.reset(session, counts=counts)
+
+    return mismatches
+
+
+# noinspection PyShadowingNames
+def warm_lookup_cache(
+        session: Session,
+        *,
+        job: Job
+) -> int:
+    entry_class = storage_of(job).entry_class
+    query = session.query(Lookup.url, Lookup.id).join(
+        entry_class,
+        entry_class.url_id == Lookup.id
+    ).where(
+        entry_class.job_id == int(job)
+    ).distinct().limit(
+        lookup_cache.max_size
+    )
+
+    warmed_count = 0
+    for url, lookup_id in query:
+        lookup_cache.put(session, url, lookup_id)
+        warmed_count += 1
+    return warmed_count
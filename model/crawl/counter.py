@@ -0,0 +1,145 @@
+import collections
+from typing import Union, TYPE_CHECKING
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Column
+from sqlalchemy.types import INTEGER, TEXT
+
+from .base import SQLCrawlerModelBase
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+class CrawlCounter(SQLCrawlerModelBase):
+    """
+    Row counts of the crawl tables maintained as the rows are created and closed, so
+    that reading them costs a single indexed query instead of `COUNT(*)` scans.
+
+    Changes are accumulated in `Session.info` and written with the commit of the
+    session which made them; they are dropped if the session rolls back.
+    `model.crawl.check_counters` compares the counters with the real counts.
+    """
+
+    # counters not bound to any job are stored with this job id
+    GLOBAL_JOB_ID = 0
+
+    UNFINISHED_TASK = 'unfinished_task_count'
+    FINISHED_TASK = 'finished_task_count'
+    WHOLE_PAGE = 'whole_page_count'
+    WHOLE_LOOKUP = 'whole_lookup_count'
+
+    _PENDING_DELTAS_KEY = 'crawl_counter_pending_deltas'
+
+    job_id = Column(INTEGER, primary_key=True, nullable=False)
+    name = Column(TEXT, primary_key=True, nullable=False)
+    value = Column(INTEGER, nullable=False)
+
+    @classmethod
+    def __job_id(cls, job: Union['Job', int, None]) -> int:
+        return cls.GLOBAL_JOB_ID if job is None else int(job)
+
+    @classmethod
+    def __pending_deltas(cls, session: Session) -> collections.Counter:
+        return session.info.setdefault(cls._PENDING_DELTAS_KEY, collections.Counter())
+
+    @classmethod
+    def add(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int, None] = None,
+            name: str,
+            delta: int
+    ) -> None:
+        if delta == 0:
+            return
+        cls.__pending_deltas(session)[cls.__job_id(job), name] += delta
+
+    @classmethod
+    def close_task(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            count: int = 1
+    ) -> None:
+        cls.add(session, job=job, name=cls.UNFINISHED_TASK, delta=-count)
+        cls.add(session, job=job, name=cls.FINISHED_TASK, delta=count)
+
+    @classmethod
+    def values(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int, None] = None
+    ) -> dict[str, int]:
+        """
+        Counters of `job` merged with the global counters, including the changes of
+        `session` not committed yet.
+        """
+        job_ids = {cls.GLOBAL_JOB_ID, cls.__job_id(job)}
+        query = session.query(cls.job_id, cls.name, cls.value).filter(
+            cls.job_id.in_(job_ids)
+        )
+
+        values = collections.Counter()
+        for _, name, value in query:
+            values[name] += value
+        for (job_id, name), delta in cls.__pending_deltas(session).items():
+            if job_id in job_ids:
+                values[name] += delta
+
+        return dict(values)
+
+    @classmethod
+    def write_pending_deltas(cls, session: Session) -> int:
+        deltas = session.info.pop(cls._PENDING_DELTAS_KEY, None)
+        rows = [
+            dict(job_id=job_id, name=name, value=delta)
+            for (job_id, name), delta in (deltas or {}).items()
+            if delta != 0
+        ]
+        if not rows:
+            return 0
+
+        statement = sqlite_insert(cls.__table__)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[cls.job_id, cls.name],
+                set_={'value': cls.value + statement.excluded.value}
+            ),
+            rows
+        )
+        return len(rows)
+
+    @classmethod
+    def reset(
+            cls,
+            session: Session,
+            *,
+            counts: dict[tuple[int, str], int]
+    ) -> None:
+        session.info.pop(cls._PENDING_DELTAS_KEY, None)
+        session.query(cls).delete()
+        if not counts:
+            return
+        session.execute(
+            cls.__table__.insert(),
+            [
+                dict(job_id=job_id, name=name, value=value)
+                for (job_id, name), value in counts.items()
+            ]
+        )
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending_counter_deltas(session: Session):
+    CrawlCounter.write_pending_deltas(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_counter_deltas(session: Session):
+    session.info.pop(CrawlCounter._PENDING_DELTAS_KEY, None)
@@ -0,0 +1,344 @@
+from typing import Optional, Union, Iterable, TYPE_CHECKING
+
+from sqlalchemy import ForeignKey, desc, and_, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, relationship
+from sqlalchemy.schema import Column, Index
+from sqlalchemy.types import INTEGER, DATETIME
+
+from model import create_timestamp
+from worker.crawl.page_family import GroupedURL
+from .base import SQLCrawlerModelBase
+from .common import string_hash_63
+from .counter import CrawlCounter
+from .lease import LeaseMixin
+from .lookup import Lookup
+from .page import PageContent
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+class CrawlEdge(SQLCrawlerModelBase):
+    id = Column(INTEGER, primary_key=True, nullable=False)
+
+    job_id = Column(INTEGER, ForeignKey('job.id'), nullable=False)
+    url_id = Column(INTEGER, ForeignKey('lookup.id'), nullable=False)
+    back_url_id = Column(INTEGER, ForeignKey('lookup.id'), nullable=False)
+
+    __table_args__ = (
+        Index('ix_crawl_edge_job_id_back_url_id_url_id', job_id, back_url_id, url_id, unique=True),
+    )
+
+    @classmethod
+    def bulk_new_records(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            lookups: Iterable[Union[Lookup, int]],
+            back_lookup: Union[Lookup, int]
+    ) -> int:
+        rows = [
+            dict(
+                job_id=int(job),
+                url_id=int(lookup),
+                back_url_id=int(back_lookup)
+            )
+            for lookup in lookups
+        ]
+        if not rows:
+            return 0
+
+        session.flush()
+        result = session.execute(
+            sqlite_insert(cls.__table__).on_conflict_do_nothing(),
+            rows
+        )
+        return result.rowcount
+
+
+# noinspection PyPep8
+class CrawlNode(SQLCrawlerModelBase, LeaseMixin):
+    """
+    A url to retrieve in a job; unlike `Task`, there is exactly one node per url in a
+    job and the links between them are stored in `CrawlEdge`.
+    """
+
+    id = Column(INTEGER, primary_key=True, nullable=False)
+
+    job_id = Column(INTEGER, ForeignKey('job.id'), nullable=False)
+    url_id = Column(INTEGER, ForeignKey('lookup.id'), nullable=False)
+    timestamp = Column(DATETIME, nullable=False)
+    page_id = Column(INTEGER, ForeignKey('page_content.id'))
+
+    job = relationship('Job', foreign_keys=[job_id], lazy="joined")
+    lookup = relationship('Lookup', foreign_keys=[url_id], lazy="joined")
+    page = relationship('PageContent', foreign_keys=[page_id], lazy="joined")
+
+    __table_args__ = (
+        Index('ix_crawl_node_job_id_url_id', job_id, url_id, unique=True),
+        Index('ix_crawl_node_job_id_page_id_timestamp', job_id, page_id, timestamp),
+    )
+
+    # keeps the number of bound parameters of `IN (...)` below the limit of SQLite
+    _BULK_CHUNK_SIZE = 500
+
+    @classmethod
+    def session_query(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+    ):
+        query = session.query(cls).where(
+            cls.job_id == int(job)
+        )
+
+        return query
+
+    @classmethod
+    def add_initial_url(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            initial_mapped_url: GroupedURL,
+            force_append: bool = False
+    ) -> bool:
+        entry_count = cls.session_query(session, job=job).filter(
+            cls.page_id.is_not(None)
+        ).count()
+
+        if not force_append and entry_count > 0:
+            return False
+
+        lookup = Lookup.lookup_id(session, url=initial_mapped_url)
+        back_lookup = Lookup.lookup_id(session, url=None)
+
+        cls.bulk_new_records(session, job=job, lookups=[lookup])
+        edge_count = CrawlEdge.bulk_new_records(
+            session,
+            job=job,
+            lookups=[lookup],
+            back_lookup=back_lookup
+        )
+        if edge_count == 0:
+            raise ValueError('all tasks in the same job should be unique')
+        return True
+
+    @classmethod
+    def bulk_new_records(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            lookups: Iterable[Union[Lookup, int]]
+    ) -> list[tuple[int, int]]:
+        """
+        Insert nodes of `lookups` which are not in the job yet with a single batched
+        `INSERT ... ON CONFLICT DO NOTHING`.
+
+        Returns `(id, url_id)` of the nodes inserted.
+        """
+        timestamp = create_timestamp()
+        rows = [
+            dict(
+                job_id=int(job),
+                url_id=int(lookup),
+                timestamp=timestamp,
+                page_id=None
+            )
+            for lookup in lookups
+        ]
+        if not rows:
+            return []
+
+        session.flush()
+        # the nodes inserted below are told from the ones existed before by their ids,
+        # which are assigned in ascending order
+        max_id = session.query(func.max(cls.id)).scalar() or 0
+        result = session.execute(
+            sqlite_insert(cls.__table__).on_conflict_do_nothing(),
+            rows
+        )
+        if result.rowcount == 0:
+            return []
+        CrawlCounter.add(
+            session,
+            job=job,
+            name=CrawlCounter.UNFINISHED_TASK,
+            delta=result.rowcount
+        )
+
+        url_id_list = sorted({row['url_id'] for row in rows})
+        nodes = []
+        for i in range(0, len(url_id_list), cls._BULK_CHUNK_SIZE):
+            chunk = url_id_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(cls.id, cls.url_id).filter(
+                and_(
+                    cls.id > max_id,
+                    cls.job_id == int(job),
+                    cls.url_id.in_(chunk)
+                )
+            )
+            nodes.extend((node_id, url_id) for node_id, url_id in query)
+        assert len(nodes) == result.rowcount, (len(nodes), result.rowcount)
+
+        return nodes
+
+    @classmethod
+    def add_children(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            lookups: Iterable[Union[Lookup, int]],
+            back_lookup: Union[Lookup, int]
+    ) -> list[tuple[int, int]]:
+        lookups = list(lookups)
+        CrawlEdge.bulk_new_records(
+            session,
+            job=job,
+            lookups=lookups,
+            back_lookup=back_lookup
+        )
+        return cls.bulk_new_records(session, job=job, lookups=lookups)
+
+    # noinspection PyComparisonWithNone,PyPep8
+    @classmethod
+    def open_node(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+    ) -> Optional['CrawlNode']:
+        return cls.session_query(session, job=job).filter(
+            cls.page_id.is_(None)
+        ).order_by(
+            desc(cls.timestamp)
+        ).limit(1).first()
+
+    @classmethod
+    def open_nodes(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            limit: int,
+            excluded_url_ids: Iterable[int] = ()
+    ) -> list['CrawlNode']:
+        if limit <= 0:
+            return []
+
+        query = cls.session_query(session, job=job).filter(
+            cls.page_id.is_(None)
+        )
+        excluded_url_ids = set(excluded_url_ids)
+        if excluded_url_ids:
+            query = query.filter(cls.url_id.not_in(excluded_url_ids))
+
+        return query.order_by(
+            desc(cls.timestamp)
+        ).limit(limit).all()
+
+    @classmethod
+    def close_node(
+            cls,
+            session: Session,
+            *,
+            node: 'CrawlNode',
+            content: Optional[str]
+    ) -> None:
+        if node.page is None:
+            CrawlCounter.close_task(session, job=node.job_id)
+        node.page = PageContent.new_record(
+            session,
+            content=content
+        )
+
+    @classmethod
+    def iter_unfinished_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, str]]:
+        query = cls.session_query(session, job=job).where(
+            cls.page_id.is_(None)
+        ).join(
+            Lookup,
+            Lookup.id == cls.url_id
+        ).with_entities(
+            cls.id,
+            cls.url_id,
+            Lookup.group_name
+        ).order_by(
+            cls.timestamp
+        )
+
+        yield from query
+
+    @classmethod
+    def iter_edge_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, int, bool]]:
+        query = session.query(
+            cls.id,
+            CrawlEdge.url_id,
+            CrawlEdge.back_url_id,
+            CrawlEdge.back_url_id == string_hash_63(None)
+        ).join(
+            CrawlEdge,
+            and_(
+                CrawlEdge.job_id == cls.job_id,
+                CrawlEdge.url_id == cls.url_id
+            )
+        ).where(
+            cls.job_id == int(job)
+        ).order_by(
+            CrawlEdge.id
+        )
+
+        yield from query
+
+    @classmethod
+    def iter_roots(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable['CrawlNode']:
+        query = cls.session_query(session, job=job).join(
+            CrawlEdge,
+            and_(
+                CrawlEdge.job_id == cls.job_id,
+                CrawlEdge.url_id == cls.url_id
+            )
+        ).where(
+            CrawlEdge.back_url_id == string_hash_63(None)
+        )
+
+        yield from query
+
+    @classmethod
+    def iter_next(
+            cls,
+            session: Session,
+            *,
+            base_node: 'CrawlNode'
+    ) -> Iterable['CrawlNode']:
+        query = cls.session_query(session, job=base_node.job_id).join(
+            CrawlEdge,
+            and_(
+                CrawlEdge.job_id == cls.job_id,
+                CrawlEdge.url_id == cls.url_id
+            )
+        ).where(
+            CrawlEdge.back_url_id == base_node.url_id
+        )
+
+        yield from query
@@ -1,19 +1,25 @@
 from typing import Literal
 
-from sqlalchemy import distinct, asc, desc
+from sqlalchemy import distinct, asc, desc, union
 from sqlalchemy.orm import Session
-from sqlalchemy.schema import Column
-from sqlalchemy.types import INTEGER, DATETIME
+from sqlalchemy.schema import Column, Index
+from sqlalchemy.types import INTEGER, DATETIME, TEXT
 
 from model import create_timestamp
 from .base import SQLCrawlerModelBase
+from .graph import CrawlNode
 from .task import Task
 
 
-# TODO: adding index on timestamp may improve 'get_resumed_session'???
 class Job(SQLCrawlerModelBase):
     id = Column(INTEGER, primary_key=True, nullable=False)
     timestamp = Column(DATETIME)
+    # name of `CrawlStorage` storing tasks of the job; NULL on jobs older than storages
+    storage = Column(TEXT)
+
+    __table_args__ = (
+        Index('ix_job_timestamp', timestamp),
+    )
 
     def __int__(self):
         return self.id
@@ -22,9 +28,13 @@ class Job(SQLCrawlerModelBase):
     def get_new_session(
             cls,
             session: Session,
+            *,
+            storage: str = 'task'
     ) -> 'Job':
-        entry = cls(timestamp=create_timestamp())
+        entry = cls(timestamp=create_timestamp(), storage=storage)
         session.add(entry)
+        # tasks and counters of the job refer to its id
+        session.flush()
         return entry
 
     @classmethod
@@ -45,21 +55,33 @@ class Job(SQLCrawlerModelBase):
             state: Literal['finished', 'unfinished'],
             order: Literal['latest', 'oldest']
     ) -> 'Job':
-        job_ids_unfinished = session.query(
-            distinct(Task.job_id)
-        ).join(
-            Job
-        ).where(
-            Task.page_id.is_(None)
+        job_ids_unfinished = union(
+            session.query(
+                distinct(Task.job_id)
+            ).where(
+                Task.page_id.is_(None)
+            ),
+            session.query(
+                distinct(CrawlNode.job_id)
+            ).where(
+                CrawlNode.page_id.is_(None)
+            )
         )
 
         if state == 'unfinished':
             target_job_ids = job_ids_unfinished
         elif state == 'finished':
-            job_ids_finished = session.query(
-                distinct(Task.job_id)
-            ).where(
-                Task.job_id.not_in(job_ids_unfinished)
+            job_ids_finished = union(
+                session.query(
+                    distinct(Task.job_id)
+                ).where(
+                    Task.job_id.not_in(job_ids_unfinished)
+                ),
+                session.query(
+                    distinct(CrawlNode.job_id)
+                ).where(
+                    CrawlNode.job_id.not_in(job_ids_unfinished)
+                )
             )
             target_job_ids = job_ids_finished
         else:
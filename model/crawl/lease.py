@@ -0,0 +1,147 @@
+import datetime
+from typing import Optional, Union, TYPE_CHECKING
+
+from sqlalchemy import and_, or_, desc, func
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Column
+from sqlalchemy.types import DATETIME, TEXT
+
+from model import create_timestamp
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+class LeaseMixin:
+    """
+    Lease of unfinished entries of a job shared by crawler processes.
+
+    A process claims an entry for `lease_seconds` before retrieving it and holds it
+    again before storing the result; an entry whose lease has expired, such as one of
+    a crashed process, can be claimed by any process. Every claim is a conditional
+    `UPDATE`, so an entry is never claimed twice even by concurrent transactions.
+    """
+
+    claimed_by = Column(TEXT)
+    lease_expires_at = Column(DATETIME)
+
+    @classmethod
+    def __is_claimable(cls, now: datetime.datetime):
+        # noinspection PyUnresolvedReferences
+        return and_(
+            cls.page_id.is_(None),
+            or_(cls.claimed_by.is_(None), cls.lease_expires_at < now)
+        )
+
+    @classmethod
+    def __is_leased(cls, now: datetime.datetime):
+        # noinspection PyUnresolvedReferences
+        return and_(
+            cls.page_id.is_(None),
+            cls.claimed_by.is_not(None),
+            cls.lease_expires_at >= now
+        )
+
+    # noinspection PyUnresolvedReferences
+    @classmethod
+    def claim(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            worker: str,
+            lease_seconds: float,
+            candidate_count: int = 8
+    ):
+        """
+        Claim the latest unfinished entry of `job` whose url is not leased by anyone,
+        or return None if there is no such entry.
+        """
+        now = create_timestamp()
+        leased_url_ids = session.query(cls.url_id).filter(
+            cls.job_id == int(job),
+            cls.__is_leased(now)
+        )
+        candidate_ids = [
+            entry_id for entry_id, in session.query(cls.id).filter(
+                cls.job_id == int(job),
+                cls.__is_claimable(now),
+                cls.url_id.not_in(leased_url_ids.scalar_subquery())
+            ).order_by(
+                desc(cls.timestamp)
+            ).limit(candidate_count)
+        ]
+
+        for entry_id in candidate_ids:
+            row_count = session.query(cls).filter(
+                cls.id == entry_id,
+                cls.__is_claimable(now)
+            ).update({
+                cls.claimed_by: worker,
+                cls.lease_expires_at: now + datetime.timedelta(seconds=lease_seconds)
+            }, synchronize_session=False)
+            if row_count == 1:
+                return session.get(cls, entry_id, populate_existing=True)
+
+        return None
+
+    # noinspection PyUnresolvedReferences
+    @classmethod
+    def hold(
+            cls,
+            session: Session,
+            *,
+            entry_id: int,
+            worker: str,
+            lease_seconds: float
+    ):
+        """
+        Extend the lease of the entry claimed by `worker` and return it, or return None
+        if the entry is finished or claimed by another worker since.
+        """
+        row_count = session.query(cls).filter(
+            cls.id == entry_id,
+            cls.page_id.is_(None),
+            cls.claimed_by == worker
+        ).update({
+            cls.lease_expires_at: create_timestamp() + datetime.timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        if row_count == 0:
+            return None
+        return session.get(cls, entry_id, populate_existing=True)
+
+    # noinspection PyUnresolvedReferences
+    @classmethod
+    def release(
+            cls,
+            session: Session,
+            *,
+            entry_id: int,
+            worker: str
+    ) -> bool:
+        row_count = session.query(cls).filter(
+            cls.id == entry_id,
+            cls.page_id.is_(None),
+            cls.claimed_by == worker
+        ).update({
+            cls.claimed_by: None,
+            cls.lease_expires_at: None
+        }, synchronize_session=False)
+        return row_count == 1
+
+    # noinspection PyUnresolvedReferences
+    @classmethod
+    def next_lease_expiry(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Optional[datetime.datetime]:
+        """
+        Time the earliest lease of the unfinished entries of `job` expires at; None if
+        no unfinished entry is leased.
+        """
+        return session.query(func.min(cls.lease_expires_at)).filter(
+            cls.job_id == int(job),
+            cls.__is_leased(create_timestamp())
+        ).scalar()
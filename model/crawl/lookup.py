@@ -1,3 +1,9 @@
+import collections
+import threading
+from typing import Optional, Iterable, Union
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from sqlalchemy.schema import Column, Index
 from sqlalchemy.types import INTEGER, TEXT
@@ -5,6 +11,96 @@ from sqlalchemy.types import INTEGER, TEXT
 from worker.crawl.page_family import GroupedURL
 from .base import SQLCrawlerModelBase
 from .common import string_hash_63
+from .counter import CrawlCounter
+
+
+class LookupCache:
+    """
+    LRU-bounded mapping of url to lookup id shared by every session of the process.
+
+    Entries are scoped by the engine of the session, so databases opened in the same
+    process never see each other's lookups. Urls of lookups inserted by a session are
+    remembered in `Session.info` and removed from the cache when the session rolls
+    back, so the cache never refers to lookups which do not exist in the database.
+    """
+
+    _PENDING_URLS_KEY = 'lookup_cache_pending_urls'
+
+    def __init__(self, max_size: int):
+        self.__max_size = max_size
+        self.__entries: collections.OrderedDict[tuple[object, str], int] \
+            = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hit_count = 0
+        self.__miss_count = 0
+
+    @staticmethod
+    def __key(session: Session, url: Optional[str]) -> tuple[object, Optional[str]]:
+        return session.get_bind(), url
+
+    def get(self, session: Session, url: Optional[str]) -> Optional[int]:
+        key = self.__key(session, url)
+        with self.__lock:
+            lookup_id = self.__entries.get(key)
+            if lookup_id is None:
+                self.__miss_count += 1
+                return None
+            self.__hit_count += 1
+            self.__entries.move_to_end(key)
+            return lookup_id
+
+    def put(self, session: Session, url: Optional[str], lookup_id: int) -> None:
+        key = self.__key(session, url)
+        with self.__lock:
+            self.__entries[key] = lookup_id
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+
+    def put_pending(self, session: Session, url: Optional[str], lookup_id: int) -> None:
+        session.info.setdefault(self._PENDING_URLS_KEY, []).append(url)
+        self.put(session, url, lookup_id)
+
+    def discard(self, session: Session, urls: Iterable[Optional[str]]) -> None:
+        with self.__lock:
+            for url in urls:
+                self.__entries.pop(self.__key(session, url), None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            access_count = self.__hit_count + self.__miss_count
+            return {
+                'lookup_cache_size': len(self.__entries),
+                'lookup_cache_hit_count': self.__hit_count,
+                'lookup_cache_miss_count': self.__miss_count,
+                'lookup_cache_hit_ratio':
+                    round(self.__hit_count / access_count, 3) if access_count else None,
+            }
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
+
+
+lookup_cache = LookupCache(max_size=1 << 16)
+
+
+class LookupHashCollisionError(ValueError):
+    pass
+
+
+@event.listens_for(Session, 'after_commit')
+def _release_pending_lookups(session: Session):
+    session.info.pop(LookupCache._PENDING_URLS_KEY, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_lookups(session: Session):
+    lookup_cache.discard(session, session.info.pop(LookupCache._PENDING_URLS_KEY, ()))
 
 
 # noinspection PyShadowingBuiltins
@@ -18,6 +114,12 @@ class Lookup(SQLCrawlerModelBase):
 
     __UNSPECIFIED = object()
 
+    # keeps the number of bound parameters of `IN (...)` below the limit of SQLite
+    _BULK_CHUNK_SIZE = 500
+
+    def __int__(self):
+        return self.id
+
     @classmethod
     def _is_specified(cls, obj):
         return obj is not cls.__UNSPECIFIED
@@ -39,38 +141,135 @@ class Lookup(SQLCrawlerModelBase):
             raise ValueError('either \'id\' or \'url\' should be specified')
 
         if cls._is_specified(id):
-            group_name = None
-            filter_predicate = Lookup.id == id
+            entry = session.query(Lookup).filter(
+                Lookup.id == id
+            ).first()
+
+            if entry is None:
+                raise ValueError(f'unregistered {id=!r}')
+            return entry
         elif cls._is_specified(url):
-            if isinstance(url, GroupedURL):
-                group_name = url.group_name
-                url = url.url
-            else:
-                group_name = None
-            filter_predicate = Lookup.url == url
+            # building the entry takes a query whether the url is cached or not, so
+            # the cache is only filled here; use `lookup_id` to resolve cached urls
+            return cls.__lookup_url_uncached(session, url=url)
         else:
             assert False
 
+    @classmethod
+    def __lookup_url_uncached(
+            cls,
+            session: Session,
+            *,
+            url: Union[GroupedURL, str, None]
+    ) -> 'Lookup':
+        if isinstance(url, GroupedURL):
+            group_name = url.group_name
+            url = url.url
+        else:
+            group_name = None
+
         entry = session.query(Lookup).filter(
-            filter_predicate
+            Lookup.url == url
         ).first()
 
         if entry is not None:
+            lookup_cache.put(session, entry.url, entry.id)
             return entry
 
-        if cls._is_specified(id):
-            raise ValueError(f'unregistered {id=!r}')
-        elif cls._is_specified(url):
-            if group_name is None and url is not None:
-                raise ValueError('new url entry must have non-null group_name')
-            entry = cls(
-                id=string_hash_63(url),
-                url=url,
-                group_name=group_name
-            )
-        else:
-            assert False
+        if group_name is None and url is not None:
+            raise ValueError('new url entry must have non-null group_name')
+        entry = cls(
+            id=string_hash_63(url),
+            url=url,
+            group_name=group_name
+        )
 
         session.add(entry)
+        lookup_cache.put_pending(session, entry.url, entry.id)
+        CrawlCounter.add(session, name=CrawlCounter.WHOLE_LOOKUP, delta=1)
 
         return entry
+
+    @classmethod
+    def lookup_id(
+            cls,
+            session: Session,
+            *,
+            url: Union[GroupedURL, str, None]
+    ) -> int:
+        """
+        Same as `Lookup.lookup` with `url` but returns the id only, which lets cached
+        urls be resolved without any query.
+        """
+        plain_url = url.url if isinstance(url, GroupedURL) else url
+        cached_id = lookup_cache.get(session, plain_url)
+        if cached_id is not None:
+            return cached_id
+        return cls.__lookup_url_uncached(session, url=url).id
+
+    @classmethod
+    def bulk_lookup_ids(
+            cls,
+            session: Session,
+            *,
+            urls: Iterable[GroupedURL]
+    ) -> dict[str, int]:
+        """
+        Resolve ids of `urls`, inserting the missing lookups with a single batched
+        `INSERT ... ON CONFLICT DO NOTHING`.
+
+        Ids are assigned by `string_hash_63`; a url whose id is already taken by another
+        url raises `LookupHashCollisionError`.
+        """
+        lookup_ids = {}
+        uncached_urls = {}
+        for grouped_url in urls:
+            cached_id = lookup_cache.get(session, grouped_url.url)
+            if cached_id is None:
+                uncached_urls[grouped_url.url] = grouped_url
+            else:
+                lookup_ids[grouped_url.url] = cached_id
+
+        if not uncached_urls:
+            return lookup_ids
+
+        for grouped_url in uncached_urls.values():
+            if grouped_url.group_name is None:
+                raise ValueError('new url entry must have non-null group_name')
+
+        # pending lookups added through the ORM must reach the database before the
+        # statement below, or the ORM would insert them again on its next flush
+        session.flush()
+        result = session.execute(
+            sqlite_insert(cls.__table__).on_conflict_do_nothing(),
+            [
+                dict(
+                    id=string_hash_63(grouped_url.url),
+                    url=grouped_url.url,
+                    group_name=grouped_url.group_name
+                )
+                for grouped_url in uncached_urls.values()
+            ]
+        )
+
+        CrawlCounter.add(session, name=CrawlCounter.WHOLE_LOOKUP, delta=result.rowcount)
+
+        uncached_url_list = list(uncached_urls.keys())
+        for i in range(0, len(uncached_url_list), cls._BULK_CHUNK_SIZE):
+            chunk = uncached_url_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(Lookup.url, Lookup.id).filter(
+                Lookup.url.in_(chunk)
+            )
+            for url, lookup_id in query:
+                lookup_ids[url] = lookup_id
+                # the rows may have been inserted right now, so they are pending
+                lookup_cache.put_pending(session, url, lookup_id)
+
+        missing_urls = uncached_urls.keys() - lookup_ids.keys()
+        if missing_urls:
+            raise LookupHashCollisionError(
+                f'ids of {len(missing_urls)} url(s) are taken by other urls',
+                sorted(missing_urls)
+            )
+
+        return lookup_ids
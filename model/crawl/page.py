@@ -1,22 +1,96 @@
-from typing import Optional, Type
+import hashlib
+import zlib
+from typing import Optional, Type, Iterable
 
-from sqlalchemy.orm import Session
+from sqlalchemy import ForeignKey
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.schema import Column
-from sqlalchemy.types import INTEGER, DATETIME, UnicodeText
+from sqlalchemy.types import INTEGER, DATETIME, TEXT, BLOB, UnicodeText
 
 from model import create_timestamp
 from .base import SQLCrawlerModelBase
 from .common import string_hash_63
+from .counter import CrawlCounter
 
+CONTENT_ENCODING = 'utf-8'
+COMPRESSION_LEVEL = 6
 
-# TODO: Before working on the following TODO, investigate duplications of content hash on the table.
-# TODO: Change mapping into content_hash -> content; store timestamp on Task, not on this table.
-#       This change can reduce the size of database.
+
+def content_digest(content: str) -> str:
+    return hashlib.sha3_256(content.encode(CONTENT_ENCODING)).hexdigest()
+
+
+def compress_content(content: str) -> bytes:
+    return zlib.compress(content.encode(CONTENT_ENCODING), COMPRESSION_LEVEL)
+
+
+def decompress_content(data: bytes) -> str:
+    return zlib.decompress(data).decode(CONTENT_ENCODING)
+
+
+class PageBlob(SQLCrawlerModelBase):
+    """
+    Compressed content shared by every `PageContent` of the same content.
+    """
+
+    digest = Column(TEXT, primary_key=True, nullable=False)
+    data = Column(BLOB, nullable=False)
+    size = Column(INTEGER, nullable=False)
+
+    @classmethod
+    def put_content(
+            cls,
+            session: Session,
+            *,
+            content: str
+    ) -> str:
+        """
+        Store `content` unless it is stored already and return its digest.
+        """
+        digest = content_digest(content)
+        exists = session.query(cls.digest).filter(
+            cls.digest == digest
+        ).first() is not None
+
+        if not exists:
+            session.execute(
+                sqlite_insert(cls.__table__).on_conflict_do_nothing(),
+                dict(
+                    digest=digest,
+                    data=compress_content(content),
+                    size=len(content)
+                )
+            )
+
+        return digest
+
+
+# TODO: store timestamp on Task, not on this table.
 class PageContent(SQLCrawlerModelBase):
     id = Column(INTEGER, primary_key=True, nullable=False)
     timestamp = Column(DATETIME, nullable=False)
-    content = Column(UnicodeText)
+    # content of the rows stored before `PageBlob`; moved to `PageBlob` by migration
+    _content = Column('content', UnicodeText)
     content_hash = Column(INTEGER, nullable=False)
+    blob_digest = Column(TEXT, ForeignKey('page_blob.digest'))
+
+    # loaded only when the content is read
+    _blob = relationship('PageBlob', foreign_keys=[blob_digest], lazy='select')
+
+    # keeps the number of bound parameters of `IN (...)` below the limit of SQLite
+    _BULK_CHUNK_SIZE = 500
+
+    @property
+    def content(self) -> Optional[str]:
+        if self.blob_digest is None:
+            return self._content
+        content = self.__dict__.get('_decompressed_content')
+        if content is None:
+            content = decompress_content(self._blob.data)
+            self.__dict__['_decompressed_content'] = content
+        return content
 
     @classmethod
     def new_record(
@@ -27,8 +101,58 @@ class PageContent(SQLCrawlerModelBase):
     ) -> 'PageContent':
         entry = cls(
             timestamp=create_timestamp(),
-            content=content,
-            content_hash=string_hash_63(content)
+            content_hash=string_hash_63(content),
+            blob_digest=None if content is None
+            else PageBlob.put_content(session, content=content)
         )
+        entry.__dict__['_decompressed_content'] = content
         session.add(entry)
+        CrawlCounter.add(session, name=CrawlCounter.WHOLE_PAGE, delta=1)
         return entry
+
+    @classmethod
+    def map_pages(
+            cls: Type['PageContent'],
+            session: Session,
+            *,
+            page_ids: Iterable[int]
+    ) -> dict[int, 'PageContent']:
+        """
+        Map `page_ids` to their pages in a query per chunk of ids rather than a query
+        per page. The content is not loaded until `load_blobs` or reading it.
+        """
+        page_id_list = sorted(set(page_ids))
+        pages = {}
+        for i in range(0, len(page_id_list), cls._BULK_CHUNK_SIZE):
+            chunk = page_id_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(cls).where(
+                cls.id.in_(chunk)
+            )
+            pages.update((page.id, page) for page in query)
+        return pages
+
+    @classmethod
+    def load_blobs(
+            cls: Type['PageContent'],
+            session: Session,
+            *,
+            pages: Iterable['PageContent']
+    ) -> None:
+        """
+        Load the content of `pages` in a query per chunk of blobs, for pages whose
+        content is read one after another.
+        """
+        pages = [
+            page for page in pages
+            if page.blob_digest is not None and '_blob' not in page.__dict__
+        ]
+        digest_list = sorted({page.blob_digest for page in pages})
+        blobs = {}
+        for i in range(0, len(digest_list), cls._BULK_CHUNK_SIZE):
+            chunk = digest_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(PageBlob).where(
+                PageBlob.digest.in_(chunk)
+            )
+            blobs.update((blob.digest, blob) for blob in query)
+        for page in pages:
+            set_committed_value(page, '_blob', blobs.get(page.blob_digest))
@@ -0,0 +1,422 @@
+import datetime
+from abc import ABCMeta, abstractmethod
+from typing import Optional, Union, Iterable, TYPE_CHECKING
+
+from sqlalchemy.orm import Session, lazyload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from worker.crawl.page_family import GroupedURL
+from .counter import CrawlCounter
+from .graph import CrawlNode, CrawlEdge
+from .lookup import Lookup
+from .page import PageContent
+from .task import Task
+
+if TYPE_CHECKING:
+    from .job import Job
+
+CrawlEntry = Union[Task, CrawlNode]
+
+
+class CrawlStorage(metaclass=ABCMeta):
+    """
+    Operations of crawlers and scrapers which depend on how a job stores its link graph.
+
+    Entries returned (`Task` or `CrawlNode`) share the attributes `id`, `url_id`,
+    `lookup`, `timestamp`, `page_id` and `page`.
+    """
+
+    name: str = ...
+    entry_class: type[CrawlEntry] = ...
+
+    # keeps the number of bound parameters of `IN (...)` below the limit of SQLite
+    _BULK_CHUNK_SIZE = 500
+
+    @classmethod
+    @abstractmethod
+    def add_initial_url(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            initial_mapped_url: GroupedURL,
+            force_append: bool = False
+    ) -> bool:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def fill_pages(cls, session: Session, *, job: 'Job') -> int:
+        raise NotImplementedError()
+
+    @classmethod
+    def fill_entry(
+            cls,
+            session: Session,
+            *,
+            entry: CrawlEntry,
+            page_id: int
+    ) -> None:
+        """
+        Close `entry` with the page retrieved for another entry of the same url.
+        """
+        if entry.page_id is None:
+            CrawlCounter.close_task(session, job=entry.job_id)
+        entry.page_id = page_id
+
+    @classmethod
+    @abstractmethod
+    def get_entry(cls, session: Session, *, entry_id: int) -> Optional[CrawlEntry]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def open_entry(cls, session: Session, *, job: 'Job') -> Optional[CrawlEntry]:
+        raise NotImplementedError()
+
+    @classmethod
+    def claim_entry(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            worker: str,
+            lease_seconds: float
+    ) -> Optional[CrawlEntry]:
+        return cls.entry_class.claim(
+            session,
+            job=job,
+            worker=worker,
+            lease_seconds=lease_seconds
+        )
+
+    @classmethod
+    def hold_entry(
+            cls,
+            session: Session,
+            *,
+            entry_id: int,
+            worker: str,
+            lease_seconds: float
+    ) -> Optional[CrawlEntry]:
+        return cls.entry_class.hold(
+            session,
+            entry_id=entry_id,
+            worker=worker,
+            lease_seconds=lease_seconds
+        )
+
+    @classmethod
+    def release_entry(cls, session: Session, *, entry_id: int, worker: str) -> bool:
+        return cls.entry_class.release(session, entry_id=entry_id, worker=worker)
+
+    @classmethod
+    def next_lease_expiry(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Optional[datetime.datetime]:
+        return cls.entry_class.next_lease_expiry(session, job=job)
+
+    @classmethod
+    @abstractmethod
+    def open_entries(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            limit: int,
+            excluded_url_ids: Iterable[int] = ()
+    ) -> list[CrawlEntry]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def iter_unfinished_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, str]]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def map_page_ids(cls, session: Session, *, job: Union['Job', int]) -> dict[int, int]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def add_children(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            lookups: Iterable[Union[Lookup, int]],
+            back_lookup: Union[Lookup, int]
+    ) -> list[tuple[int, int]]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def map_children(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            back_lookup: Union[Lookup, int]
+    ) -> dict[int, str]:
+        """
+        Map url ids linked from `back_lookup` in `job` to their group names.
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def close_entry(
+            cls,
+            session: Session,
+            *,
+            entry: CrawlEntry,
+            content: Optional[str]
+    ) -> None:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def iter_edge_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, int, bool]]:
+        """
+        Entry id, url id and back url id of every link in `job`, and whether the link
+        is from no page, that is the entry is a root, in a single query.
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def map_entries(
+            cls,
+            session: Session,
+            *,
+            entry_ids: Iterable[int]
+    ) -> dict[int, CrawlEntry]:
+        """
+        Map `entry_ids` to their entries with the pages loaded, in a query per chunk
+        of entries and of pages. Pages shared by entries of the same url are loaded once;
+        their content is loaded by `PageContent.load_blobs`.
+        """
+        entry_id_list = sorted(set(entry_ids))
+        entries = {}
+        for i in range(0, len(entry_id_list), cls._BULK_CHUNK_SIZE):
+            chunk = entry_id_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(cls.entry_class).options(
+                lazyload(cls.entry_class.page)
+            ).where(
+                cls.entry_class.id.in_(chunk)
+            )
+            entries.update((entry.id, entry) for entry in query)
+
+        pages = PageContent.map_pages(
+            session,
+            page_ids=(entry.page_id for entry in entries.values() if entry.page_id is not None)
+        )
+        for entry in entries.values():
+            if entry.page_id is not None:
+                set_committed_value(entry, 'page', pages.get(entry.page_id))
+        return entries
+
+    @classmethod
+    @abstractmethod
+    def iter_roots(cls, session: Session, *, job: Union['Job', int]) -> Iterable[CrawlEntry]:
+        raise NotImplementedError()
+
+    @classmethod
+    @abstractmethod
+    def iter_next(cls, session: Session, *, base_entry: CrawlEntry) -> Iterable[CrawlEntry]:
+        raise NotImplementedError()
+
+
+class TaskStorage(CrawlStorage):
+    """
+    One `Task` per link; pages are shared between tasks of the same url by
+    `Task.fill_pages`.
+    """
+
+    name = 'task'
+    entry_class = Task
+
+    @classmethod
+    def add_initial_url(cls, session, *, job, initial_mapped_url, force_append=False):
+        return Task.add_initial_url(
+            session,
+            job=job,
+            initial_mapped_url=initial_mapped_url,
+            force_append=force_append
+        )
+
+    @classmethod
+    def fill_pages(cls, session, *, job):
+        return Task.fill_pages(session, job=job)
+
+    @classmethod
+    def get_entry(cls, session, *, entry_id):
+        return session.get(Task, entry_id)
+
+    @classmethod
+    def open_entry(cls, session, *, job):
+        return Task.open_task(session, job=job)
+
+    @classmethod
+    def open_entries(cls, session, *, job, limit, excluded_url_ids=()):
+        return Task.open_tasks(
+            session,
+            job=job,
+            limit=limit,
+            excluded_url_ids=excluded_url_ids
+        )
+
+    @classmethod
+    def iter_unfinished_rows(cls, session, *, job):
+        return Task.iter_unfinished_rows(session, job=job)
+
+    @classmethod
+    def map_page_ids(cls, session, *, job):
+        return Task.map_page_ids(session, job=job)
+
+    @classmethod
+    def add_children(cls, session, *, job, lookups, back_lookup):
+        return Task.bulk_new_records(
+            session,
+            job=job,
+            lookups=lookups,
+            back_lookup=back_lookup
+        )
+
+    @classmethod
+    def map_children(cls, session, *, job, back_lookup):
+        query = Task.session_query(session, job=job).where(
+            Task.back_url_id == int(back_lookup)
+        ).join(
+            Lookup,
+            Lookup.id == Task.url_id
+        ).with_entities(
+            Task.url_id,
+            Lookup.group_name
+        )
+        return {url_id: group_name for url_id, group_name in query}
+
+    @classmethod
+    def close_entry(cls, session, *, entry, content):
+        Task.close_task(session, task=entry, content=content)
+
+    @classmethod
+    def iter_edge_rows(cls, session, *, job):
+        return Task.iter_edge_rows(session, job=job)
+
+    @classmethod
+    def iter_roots(cls, session, *, job):
+        return Task.iter_roots(session, job=job)
+
+    @classmethod
+    def iter_next(cls, session, *, base_entry):
+        return Task.iter_next(session, base_task=base_entry)
+
+
+class GraphStorage(CrawlStorage):
+    """
+    One `CrawlNode` per url and one `CrawlEdge` per link; every url is retrieved once
+    and no fill pass is needed.
+    """
+
+    name = 'graph'
+    entry_class = CrawlNode
+
+    @classmethod
+    def add_initial_url(cls, session, *, job, initial_mapped_url, force_append=False):
+        return CrawlNode.add_initial_url(
+            session,
+            job=job,
+            initial_mapped_url=initial_mapped_url,
+            force_append=force_append
+        )
+
+    @classmethod
+    def fill_pages(cls, session, *, job):
+        return 0
+
+    @classmethod
+    def get_entry(cls, session, *, entry_id):
+        return session.get(CrawlNode, entry_id)
+
+    @classmethod
+    def open_entry(cls, session, *, job):
+        return CrawlNode.open_node(session, job=job)
+
+    @classmethod
+    def open_entries(cls, session, *, job, limit, excluded_url_ids=()):
+        return CrawlNode.open_nodes(
+            session,
+            job=job,
+            limit=limit,
+            excluded_url_ids=excluded_url_ids
+        )
+
+    @classmethod
+    def iter_unfinished_rows(cls, session, *, job):
+        return CrawlNode.iter_unfinished_rows(session, job=job)
+
+    @classmethod
+    def map_page_ids(cls, session, *, job):
+        # every url has its own node, so there is nothing to share
+        return {}
+
+    @classmethod
+    def add_children(cls, session, *, job, lookups, back_lookup):
+        return CrawlNode.add_children(
+            session,
+            job=job,
+            lookups=lookups,
+            back_lookup=back_lookup
+        )
+
+    @classmethod
+    def map_children(cls, session, *, job, back_lookup):
+        query = session.query(CrawlEdge.url_id, Lookup.group_name).join(
+            Lookup,
+            Lookup.id == CrawlEdge.url_id
+        ).where(
+            CrawlEdge.job_id == int(job),
+            CrawlEdge.back_url_id == int(back_lookup)
+        )
+        return {url_id: group_name for url_id, group_name in query}
+
+    @classmethod
+    def close_entry(cls, session, *, entry, content):
+        CrawlNode.close_node(session, node=entry, content=content)
+
+    @classmethod
+    def iter_edge_rows(cls, session, *, job):
+        return CrawlNode.iter_edge_rows(session, job=job)
+
+    @classmethod
+    def iter_roots(cls, session, *, job):
+        return CrawlNode.iter_roots(session, job=job)
+
+    @classmethod
+    def iter_next(cls, session, *, base_entry):
+        return CrawlNode.iter_next(session, base_node=base_entry)
+
+
+STORAGES: dict[str, type[CrawlStorage]] = {
+    storage.name: storage
+    for storage in (TaskStorage, GraphStorage)
+}
+
+
+def storage_of(job: 'Job') -> type[CrawlStorage]:
+    # jobs created before storages were introduced have no storage recorded
+    return STORAGES[job.storage or TaskStorage.name]
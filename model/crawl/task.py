@@ -1,13 +1,16 @@
 from typing import Optional, Union, Iterable, TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, case, desc, and_
+from sqlalchemy import ForeignKey, case, desc, and_, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session, relationship, aliased
-from sqlalchemy.schema import Column
+from sqlalchemy.schema import Column, Index
 from sqlalchemy.types import INTEGER, DATETIME
 
 from model import create_timestamp
 from worker.crawl.page_family import GroupedURL
 from .base import SQLCrawlerModelBase
+from .counter import CrawlCounter
+from .lease import LeaseMixin
 from .lookup import Lookup
 from .page import PageContent
 
@@ -16,7 +19,7 @@ if TYPE_CHECKING:
 
 
 # noinspection PyPep8
-class Task(SQLCrawlerModelBase):
+class Task(SQLCrawlerModelBase, LeaseMixin):
     id = Column(INTEGER, primary_key=True, nullable=False)
 
     job_id = Column(INTEGER, ForeignKey('job.id'), nullable=False)
@@ -30,6 +33,16 @@ class Task(SQLCrawlerModelBase):
     back_lookup = relationship('Lookup', foreign_keys=[back_url_id], lazy="joined")
     page = relationship('PageContent', foreign_keys=[page_id], lazy="joined")
 
+    # keep in sync with model.migration, which creates these on existing databases
+    __table_args__ = (
+        Index('ix_task_job_id_url_id_back_url_id', job_id, url_id, back_url_id, unique=True),
+        Index('ix_task_job_id_page_id_timestamp', job_id, page_id, timestamp),
+        Index('ix_task_job_id_back_url_id', job_id, back_url_id),
+    )
+
+    # keeps the number of bound parameters of `IN (...)` below the limit of SQLite
+    _BULK_CHUNK_SIZE = 500
+
     @classmethod
     def list_group_names(
             cls,
@@ -68,11 +81,11 @@ class Task(SQLCrawlerModelBase):
         cls.new_record(
             session=session,
             job=job,
-            lookup=Lookup.lookup(
+            lookup=Lookup.lookup_id(
                 session,
                 url=initial_mapped_url
             ),
-            back_lookup=Lookup.lookup(
+            back_lookup=Lookup.lookup_id(
                 session,
                 url=None
             )
@@ -85,31 +98,96 @@ class Task(SQLCrawlerModelBase):
             session: Session,
             *,
             job: 'Job',
-            lookup: Lookup,
-            back_lookup: Lookup
+            lookup: Union[Lookup, int],
+            back_lookup: Union[Lookup, int]
     ) -> 'Task':
         entry_count = session.query(Task).filter(
             (Task.job == job) &
-            (Task.lookup == lookup) &
-            (Task.back_lookup == back_lookup)
+            (Task.url_id == int(lookup)) &
+            (Task.back_url_id == int(back_lookup))
         ).count()
 
         if entry_count > 0:
             raise ValueError('all tasks in the same job should be unique')
 
-        assert lookup.url is not None
+        if isinstance(lookup, Lookup):
+            assert lookup.url is not None
 
         entry = cls(
             job=job,
-            lookup=lookup,
-            back_lookup=back_lookup,
+            url_id=int(lookup),
+            back_url_id=int(back_lookup),
             timestamp=create_timestamp(),
             page=None
         )
         session.add(entry)
+        CrawlCounter.add(session, job=job, name=CrawlCounter.UNFINISHED_TASK, delta=1)
 
         return entry
 
+    @classmethod
+    def bulk_new_records(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int],
+            lookups: Iterable[Union[Lookup, int]],
+            back_lookup: Union[Lookup, int]
+    ) -> list[tuple[int, int]]:
+        """
+        Insert tasks from `back_lookup` to each of `lookups` with a single batched
+        `INSERT ... ON CONFLICT DO NOTHING`, skipping tasks which already exist.
+
+        Returns `(id, url_id)` of the tasks inserted.
+        """
+        timestamp = create_timestamp()
+        rows = [
+            dict(
+                job_id=int(job),
+                url_id=int(lookup),
+                back_url_id=int(back_lookup),
+                timestamp=timestamp,
+                page_id=None
+            )
+            for lookup in lookups
+        ]
+        if not rows:
+            return []
+
+        session.flush()
+        # the tasks inserted below are told from the ones existed before by their ids,
+        # which are assigned in ascending order
+        max_id = session.query(func.max(cls.id)).scalar() or 0
+        result = session.execute(
+            sqlite_insert(cls.__table__).on_conflict_do_nothing(),
+            rows
+        )
+        if result.rowcount == 0:
+            return []
+        CrawlCounter.add(
+            session,
+            job=job,
+            name=CrawlCounter.UNFINISHED_TASK,
+            delta=result.rowcount
+        )
+
+        url_id_list = sorted({row['url_id'] for row in rows})
+        tasks = []
+        for i in range(0, len(url_id_list), cls._BULK_CHUNK_SIZE):
+            chunk = url_id_list[i:i + cls._BULK_CHUNK_SIZE]
+            query = session.query(cls.id, cls.url_id).filter(
+                and_(
+                    cls.id > max_id,
+                    cls.job_id == int(job),
+                    cls.back_url_id == int(back_lookup),
+                    cls.url_id.in_(chunk)
+                )
+            )
+            tasks.extend((task_id, url_id) for task_id, url_id in query)
+        assert len(tasks) == result.rowcount, (len(tasks), result.rowcount)
+
+        return tasks
+
     # noinspection PyComparisonWithNone,PyPep8
     @classmethod
     def open_task(
@@ -132,6 +210,39 @@ class Task(SQLCrawlerModelBase):
 
         return entry
 
+    @classmethod
+    def open_tasks(
+            cls,
+            session: Session,
+            *,
+            job: 'Job',
+            limit: int,
+            excluded_url_ids: Iterable[int] = ()
+    ) -> list['Task']:
+        excluded_url_ids = set(excluded_url_ids)
+
+        query = session.query(Task).filter(
+            and_(
+                Task.job == job,
+                Task.page_id.is_(None)
+            )
+        ).order_by(
+            desc(Task.timestamp)
+        )
+
+        entries = []
+        if limit <= 0:
+            return entries
+        for entry in query.yield_per(max(limit, 16)):
+            if entry.url_id in excluded_url_ids:
+                continue
+            excluded_url_ids.add(entry.url_id)
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+
+        return entries
+
     @classmethod
     def close_task(
             cls,
@@ -140,6 +251,8 @@ class Task(SQLCrawlerModelBase):
             task: 'Task',
             content: Optional[str]
     ) -> None:
+        if task.page is None:
+            CrawlCounter.close_task(session, job=task.job_id)
         task.page = PageContent.new_record(
             session,
             content=content
@@ -186,10 +299,10 @@ class Task(SQLCrawlerModelBase):
                 value=Task.url_id
             )
         }, synchronize_session='fetch')
+        CrawlCounter.close_task(session, job=job, count=row_count)
 
         return row_count
 
-    # TODO: USE THIS!!!
     @classmethod
     def session_query(
             cls,
@@ -203,6 +316,69 @@ class Task(SQLCrawlerModelBase):
 
         return query
 
+    @classmethod
+    def iter_unfinished_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, str]]:
+        query = cls.session_query(session, job=job).where(
+            cls.page_id.is_(None)
+        ).join(
+            Lookup,
+            Lookup.id == cls.url_id
+        ).with_entities(
+            cls.id,
+            cls.url_id,
+            Lookup.group_name
+        ).order_by(
+            cls.timestamp
+        )
+
+        yield from query
+
+    @classmethod
+    def map_page_ids(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> dict[int, int]:
+        query = cls.session_query(session, job=job).where(
+            cls.page_id.is_not(None)
+        ).with_entities(
+            cls.url_id,
+            cls.page_id
+        )
+
+        return {url_id: page_id for url_id, page_id in query}
+
+    @classmethod
+    def iter_edge_rows(
+            cls,
+            session: Session,
+            *,
+            job: Union['Job', int]
+    ) -> Iterable[tuple[int, int, int, bool]]:
+        back_lookup = aliased(Lookup)
+
+        query = session.query(
+            cls.id,
+            cls.url_id,
+            cls.back_url_id,
+            back_lookup.url.is_(None)
+        ).where(
+            cls.job_id == int(job)
+        ).join(
+            back_lookup,
+            back_lookup.id == cls.back_url_id
+        ).order_by(
+            cls.id
+        )
+
+        yield from query
+
     @classmethod
     def iter_roots(
             cls,
@@ -0,0 +1,59 @@
+from typing import Optional, Union, TYPE_CHECKING
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Session, relationship
+from sqlalchemy.schema import Column
+from sqlalchemy.types import INTEGER, TEXT
+
+from .base import SQLCrawlerModelBase
+from .lookup import Lookup
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+class PageValidator(SQLCrawlerModelBase):
+    """
+    Cache validators of the latest page retrieved for a url. `job_id` is the job
+    which holds the links of the page, so they can be copied without parsing the page
+    again when the server answers `304 Not Modified`.
+    """
+
+    url_id = Column(INTEGER, ForeignKey('lookup.id'), primary_key=True, nullable=False)
+    job_id = Column(INTEGER, ForeignKey('job.id'), nullable=False)
+    page_id = Column(INTEGER, ForeignKey('page_content.id'), nullable=False)
+    etag = Column(TEXT)
+    last_modified = Column(TEXT)
+
+    job = relationship('Job', foreign_keys=[job_id], lazy="joined")
+
+    @classmethod
+    def get_record(
+            cls,
+            session: Session,
+            *,
+            lookup: Union[Lookup, int]
+    ) -> Optional['PageValidator']:
+        return session.get(cls, int(lookup))
+
+    @classmethod
+    def put_record(
+            cls,
+            session: Session,
+            *,
+            lookup: Union[Lookup, int],
+            job: Union['Job', int],
+            page_id: int,
+            etag: Optional[str],
+            last_modified: Optional[str]
+    ) -> 'PageValidator':
+        entry = cls.get_record(session, lookup=lookup)
+        if entry is None:
+            entry = cls(url_id=int(lookup))
+            session.add(entry)
+        entry.job_id = int(job)
+        entry.page_id = page_id
+        entry.etag = etag
+        entry.last_modified = last_modified
+
+        return entry
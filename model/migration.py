@@ -0,0 +1,288 @@
+from typing import NamedTuple, Callable
+
+from sqlalchemy import MetaData, desc, distinct, select
+from sqlalchemy.engine import Connection, Engine
+
+import app_logging
+
+logger = app_logging.create_logger()
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def has_table(connection: Connection, table_name: str) -> bool:
+    row = connection.exec_driver_sql(
+        'SELECT 1 FROM sqlite_master WHERE type = \'table\' AND name = ?',
+        (table_name,)
+    ).first()
+    return row is not None
+
+
+def has_column(connection: Connection, table_name: str, column_name: str) -> bool:
+    rows = connection.exec_driver_sql(f'PRAGMA table_info({table_name})').all()
+    return any(row[1] == column_name for row in rows)
+
+
+def create_index(connection: Connection, table_name: str, sql: str) -> None:
+    # tables of modules not imported by the application are not created by
+    # `create_all`, so their indexes are left for the run which creates them
+    if not has_table(connection, table_name):
+        logger.info(f'index skipped for missing table {table_name!r}: {sql}')
+        return
+    connection.exec_driver_sql(sql)
+
+
+def _migrate_crawl_indexes(connection: Connection) -> None:
+    create_index(
+        connection,
+        'job',
+        'CREATE INDEX IF NOT EXISTS ix_job_timestamp ON job (timestamp)'
+    )
+    create_index(
+        connection,
+        'task',
+        'CREATE INDEX IF NOT EXISTS ix_task_job_id_page_id_timestamp'
+        ' ON task (job_id, page_id, timestamp)'
+    )
+    create_index(
+        connection,
+        'task',
+        'CREATE INDEX IF NOT EXISTS ix_task_job_id_back_url_id ON task (job_id, back_url_id)'
+    )
+    create_index(
+        connection,
+        'task',
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_task_job_id_url_id_back_url_id'
+        ' ON task (job_id, url_id, back_url_id)'
+    )
+
+
+def _migrate_job_storage(connection: Connection) -> None:
+    # `crawl_node` and `crawl_edge` are new tables and are created by `create_all`
+    if not has_table(connection, 'job') or has_column(connection, 'job', 'storage'):
+        return
+    connection.exec_driver_sql('ALTER TABLE job ADD COLUMN storage TEXT')
+
+
+def _migrate_crawl_counters(connection: Connection) -> None:
+    # `crawl_counter` itself is created by `create_all`; fill it with the counts of
+    # the rows which existed before it
+    if not has_table(connection, 'crawl_counter'):
+        return
+    connection.exec_driver_sql('DELETE FROM crawl_counter')
+    for table_name in ('task', 'crawl_node'):
+        if not has_table(connection, table_name):
+            continue
+        connection.exec_driver_sql(
+            'INSERT INTO crawl_counter (job_id, name, value)'
+            ' SELECT job_id, CASE WHEN page_id IS NULL'
+            ' THEN \'unfinished_task_count\' ELSE \'finished_task_count\' END AS name,'
+            ' COUNT(*)'
+            f' FROM {table_name} WHERE true GROUP BY job_id, name'
+            ' ON CONFLICT (job_id, name) DO UPDATE SET value = value + excluded.value'
+        )
+    for table_name, name in (('page_content', 'whole_page_count'), ('lookup', 'whole_lookup_count')):
+        if not has_table(connection, table_name):
+            continue
+        connection.exec_driver_sql(
+            'INSERT INTO crawl_counter (job_id, name, value)'
+            f' SELECT 0, \'{name}\', COUNT(*) FROM {table_name}'
+        )
+
+
+def _migrate_page_blobs(connection: Connection) -> None:
+    from model.crawl.page import content_digest, compress_content
+
+    if not has_table(connection, 'page_content'):
+        return
+    if not has_column(connection, 'page_content', 'blob_digest'):
+        connection.exec_driver_sql('ALTER TABLE page_content ADD COLUMN blob_digest TEXT')
+
+    # contents are moved in batches so that the whole table is never held in memory
+    while True:
+        rows = connection.exec_driver_sql(
+            'SELECT id, content FROM page_content'
+            ' WHERE content IS NOT NULL AND blob_digest IS NULL LIMIT 256'
+        ).all()
+        if not rows:
+            break
+        blobs = {}
+        updates = []
+        for page_id, content in rows:
+            digest = content_digest(content)
+            if digest not in blobs:
+                blobs[digest] = (digest, compress_content(content), len(content))
+            updates.append((digest, page_id))
+        connection.exec_driver_sql(
+            'INSERT INTO page_blob (digest, data, size) VALUES (?, ?, ?)'
+            ' ON CONFLICT (digest) DO NOTHING',
+            list(blobs.values())
+        )
+        connection.exec_driver_sql(
+            'UPDATE page_content SET blob_digest = ?, content = NULL WHERE id = ?',
+            updates
+        )
+    logger.info('page contents moved to page_blob; run VACUUM to reclaim the space')
+
+
+def _migrate_crawl_leases(connection: Connection) -> None:
+    for table_name in ('task', 'crawl_node'):
+        if not has_table(connection, table_name):
+            continue
+        if not has_column(connection, table_name, 'claimed_by'):
+            connection.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN claimed_by TEXT')
+        if not has_column(connection, table_name, 'lease_expires_at'):
+            connection.exec_driver_sql(
+                f'ALTER TABLE {table_name} ADD COLUMN lease_expires_at DATETIME'
+            )
+
+
+MIGRATIONS = [
+    Migration(
+        version=1,
+        description='indexes and unique constraint of crawl tables',
+        apply=_migrate_crawl_indexes
+    ),
+    Migration(
+        version=2,
+        description='storage of crawl jobs',
+        apply=_migrate_job_storage
+    ),
+    Migration(
+        version=3,
+        description='row counters of crawl tables',
+        apply=_migrate_crawl_counters
+    ),
+    Migration(
+        version=4,
+        description='content-addressed compressed page contents',
+        apply=_migrate_page_blobs
+    ),
+    Migration(
+        version=5,
+        description='leases of crawl entries shared by crawler processes',
+        apply=_migrate_crawl_leases
+    ),
+]
+
+
+def _iter_hot_queries():
+    import model.crawl
+    Job, Task = model.crawl.Job, model.crawl.Task
+    CrawlCounter = model.crawl.CrawlCounter
+
+    yield 'Job.get_job', select(Job.id).where(
+        Job.id.in_(select(distinct(Task.job_id)).where(Task.page_id.is_(None)))
+    ).order_by(desc(Job.timestamp)).limit(1)
+    yield 'Task.open_task', select(Task.id).where(
+        Task.job_id == 1,
+        Task.page_id.is_(None)
+    ).order_by(desc(Task.timestamp)).limit(1)
+    yield 'Task.fill_pages', select(Task.url_id, Task.page_id).where(
+        Task.url_id.in_(select(Task.url_id).where(Task.job_id == 1)),
+        Task.job_id == 1,
+        Task.page_id.is_not(None)
+    )
+    yield 'Task.iter_next', select(Task.id).where(
+        Task.job_id == 1,
+        Task.back_url_id == 1
+    )
+    yield 'info_dict', select(CrawlCounter.name, CrawlCounter.value).where(
+        CrawlCounter.job_id.in_([0, 1])
+    )
+
+
+def explain_hot_queries(connection: Connection) -> dict[str, list[str]]:
+    if not has_table(connection, 'task'):
+        return {}
+
+    plans = {}
+    for name, statement in _iter_hot_queries():
+        compiled = statement.compile(
+            dialect=connection.dialect,
+            compile_kwargs={'render_postcompile': True}
+        )
+        parameters = tuple(compiled.params[key] for key in compiled.positiontup)
+        rows = connection.exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {compiled.string}',
+            parameters
+        ).all()
+        plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def _log_hot_query_plans(connection: Connection, state: str) -> None:
+    plans = explain_hot_queries(connection)
+    logger.info('\n'.join(
+        f'[QUERY PLAN {state}] {name}: {detail}'
+        for name, details in plans.items()
+        for detail in details
+    ) or f'[QUERY PLAN {state}] no crawl tables')
+
+
+class MigrationRunner:
+    def __init__(self, migrations: list[Migration]):
+        versions = [migration.version for migration in migrations]
+        if versions != sorted(set(versions)):
+            raise ValueError('migration versions must be unique and in ascending order')
+        self.__migrations = migrations
+
+    @property
+    def latest_version(self) -> int:
+        return self.__migrations[-1].version if self.__migrations else 0
+
+    @staticmethod
+    def current_version(connection: Connection) -> int:
+        return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+    def migrate(self, engine: Engine, metadata: MetaData) -> int:
+        """
+        Create tables of `metadata` and apply migrations newer than `PRAGMA user_version`
+        of the database, each in its own transaction. Returns the number of migrations
+        applied.
+
+        New databases get the latest schema from `create_all` and are only stamped with
+        the latest version. Query plans of the hot queries are logged before and after
+        if any migration is applied.
+        """
+        with engine.connect() as connection:
+            version = self.current_version(connection)
+            is_new_database = connection.exec_driver_sql(
+                'SELECT 1 FROM sqlite_master WHERE type = \'table\''
+            ).first() is None
+
+        metadata.create_all(engine)
+
+        if is_new_database:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f'PRAGMA user_version = {self.latest_version:d}')
+            return 0
+
+        pending_migrations = [
+            migration for migration in self.__migrations
+            if migration.version > version
+        ]
+        if not pending_migrations:
+            return 0
+
+        with engine.connect() as connection:
+            _log_hot_query_plans(connection, 'BEFORE')
+
+        for migration in pending_migrations:
+            logger.info(f'migrating to version {migration.version}: {migration.description}')
+            with engine.begin() as connection:
+                migration.apply(connection)
+                connection.exec_driver_sql(f'PRAGMA user_version = {migration.version:d}')
+
+        with engine.connect() as connection:
+            _log_hot_query_plans(connection, 'AFTER')
+
+        return len(pending_migrations)
+
+
+def migrate_database(engine: Engine, metadata: MetaData) -> int:
+    return MigrationRunner(MIGRATIONS).migrate(engine, metadata)
@@ -3,3 +3,4 @@ from .contents_page import CourseContentsPage
 from .contents_page_list import CourseContentsPageList
 from .course import Course, CourseSchedule, CourseInstructor
 from .course_news import CourseNews
+from .source import ScrapeSource
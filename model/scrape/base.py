@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from typing import Optional
+from typing import Optional, Any
 
 from sqlalchemy.orm import Session
 
@@ -46,7 +46,7 @@ class SQLScraperModelBase(
             cls,
             session: Session,
             *,
-            task_entry: model.crawl.Task
+            task_entry: model.crawl.CrawlEntry
     ) -> Optional['SQLScraperModelBase']:
         dup_entry = cls.find_duplication(
             session,
@@ -63,24 +63,34 @@ class SQLScraperModelBase(
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'],
             *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         raise NotImplementedError()
 
+    @classmethod
+    def parse_fields(cls, content: str) -> dict[str, Any]:
+        """
+        Fields parsed from the page `content` as plain values, which are sent back
+        from the processes of the parsing pool of the scraper.
+        """
+        return cls._soup_parser().from_html(content).extract_fields()
+
     @classmethod
     def from_task_entry(
             cls: type['SQLScraperModelBase'],
             *,
-            task_entry: model.crawl.Task
+            task_entry: model.crawl.CrawlEntry,
+            fields: Optional[dict[str, Any]] = None
     ) -> Optional['SQLScraperModelBase']:
         if task_entry.page.content is None:
             return None
-        soup_parser = cls._soup_parser().from_html(task_entry.page.content)
+        if fields is None:
+            fields = cls.parse_fields(task_entry.page.content)
 
         entry = cls._create_entry_from_task_entry(
             task_entry=task_entry,
-            soup_parser=soup_parser
+            fields=fields
         )
 
         return entry
@@ -89,28 +99,50 @@ class SQLScraperModelBase(
     def _set_parent_model_entry(self, parent_model_entry: ParentModelEntries):
         raise NotImplementedError()
 
+    def _update_from_entry(self, entry: 'SQLScraperModelBase') -> None:
+        # columns of the row parsed again; the parent is set again afterwards
+        for column in self.__table__.columns:
+            if not column.primary_key:
+                setattr(self, column.key, getattr(entry, column.key))
+
     @classmethod
     def insert_from_task_entry(
             cls,
             session: Session,
             *,
-            task_entry: model.crawl.Task,
-            parent_model_entries: ParentModelEntries
+            task_entry: model.crawl.CrawlEntry,
+            parent_model_entries: ParentModelEntries,
+            fields: Optional[dict[str, Any]] = None,
+            existing_entry: Optional['SQLScraperModelBase'] = None
     ) -> Optional['SQLScraperModelBase']:
-        dup_entry = cls.get_dup_entry(
-            session,
-            task_entry=task_entry
-        )
-        if dup_entry is not None:
-            return dup_entry
+        """
+        Insert the entry of `task_entry` unless it is scraped already. `fields` are
+        the fields parsed from its page in advance, or None to parse the page here.
+        `existing_entry` scraped from an older content of the page is updated in place,
+        or deleted if the page has no content now.
+        """
+        if existing_entry is None:
+            dup_entry = cls.get_dup_entry(
+                session,
+                task_entry=task_entry
+            )
+            if dup_entry is not None:
+                return dup_entry
 
         entry = cls.from_task_entry(
-            task_entry=task_entry
+            task_entry=task_entry,
+            fields=fields
         )
 
         if entry is None:
+            if existing_entry is not None:
+                session.delete(existing_entry)
             return None
 
+        if existing_entry is not None:
+            existing_entry._update_from_entry(entry)
+            entry = existing_entry
+
         entry._set_parent_model_entry(parent_model_entries)
 
         session.add(entry)
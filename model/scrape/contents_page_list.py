@@ -1,4 +1,5 @@
 import re
+from typing import Any
 
 import dateutil.parser
 from sqlalchemy import ForeignKey
@@ -53,13 +54,13 @@ class CourseContentsPageList(SQLScraperModelBase):
     @classmethod
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'], *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         entry = cls(
             timestamp=task_entry.timestamp,
             url=task_entry.lookup.url,
-            **soup_parser.extract_properties('title', 'release_date')
+            **fields
         )
 
         return entry
@@ -1,5 +1,5 @@
 import re
-from typing import Iterable
+from typing import Iterable, Any
 
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
@@ -25,8 +25,8 @@ class CourseInstructor(SQLScraperModelBase):
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'],
             *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         raise NotImplementedError()
 
@@ -50,17 +50,6 @@ class CourseInstructor(SQLScraperModelBase):
                 name=part
             )
 
-    @classmethod
-    def list_entries_from_string(
-            cls,
-            *,
-            string: str,
-    ) -> Iterable['CourseInstructor']:
-        return [
-            CourseInstructor(**field)
-            for field in cls.iter_fields_from_string(string=string)
-        ]
-
 
 class CourseSchedule(SQLScraperModelBase):
     id = Column(INTEGER, primary_key=True)
@@ -81,8 +70,8 @@ class CourseSchedule(SQLScraperModelBase):
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'],
             *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         raise NotImplementedError()
 
@@ -92,17 +81,6 @@ class CourseSchedule(SQLScraperModelBase):
     ):
         raise NotImplementedError()
 
-    @classmethod
-    def list_entries_from_string(
-            cls,
-            *,
-            string: str
-    ) -> Iterable['CourseSchedule']:
-        return [
-            CourseSchedule(**field)
-            for field in cls.iter_fields_from_string(string)
-        ]
-
     @classmethod
     def iter_fields_from_string(cls, string: str, *, year: str = None) -> Iterable[dict]:
         assert isinstance(string, str)
@@ -153,14 +131,12 @@ class CourseSoupParser(SoupParser):
     @property
     def schedules(self):
         string = self._soup.select_one('.coursedata-info').text.strip()
-        # TODO: simplify parameter
-        return CourseSchedule.list_entries_from_string(string=string)
+        return list(CourseSchedule.iter_fields_from_string(string))
 
     @property
     def instructors(self):
         string = self._soup.select_one('.courseteacher').attrs['title'].strip()
-        # TODO: simplify parameter
-        return CourseInstructor.list_entries_from_string(string=string)
+        return list(CourseInstructor.iter_fields_from_string(string))
 
 
 class Course(SQLScraperModelBase):
@@ -171,8 +147,18 @@ class Course(SQLScraperModelBase):
     name = Column(TEXT)
 
     # TODO: relationship with back_populates
-    schedules = relationship('CourseSchedule', backref='course', lazy="joined")
-    instructors = relationship('CourseInstructor', backref='course', lazy="joined")
+    schedules = relationship(
+        'CourseSchedule',
+        backref='course',
+        lazy="joined",
+        cascade='all, delete-orphan'
+    )
+    instructors = relationship(
+        'CourseInstructor',
+        backref='course',
+        lazy="joined",
+        cascade='all, delete-orphan'
+    )
 
     contents_page_list_entries = relationship(
         'CourseContentsPageList',
@@ -193,17 +179,28 @@ class Course(SQLScraperModelBase):
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'],
             *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         entry = cls(
             timestamp=task_entry.timestamp,
             url=task_entry.lookup.url,
-            **soup_parser.extract_properties('name', 'schedules', 'instructors')
+            name=fields['name'],
+            schedules=[CourseSchedule(**field) for field in fields['schedules']],
+            instructors=[CourseInstructor(**field) for field in fields['instructors']]
         )
 
         return entry
 
+    def _update_from_entry(self, entry: 'Course') -> None:
+        super()._update_from_entry(entry)
+        schedules, instructors = list(entry.schedules), list(entry.instructors)
+        # detached first, otherwise `entry` is cascaded into the session with them
+        entry.schedules, entry.instructors = [], []
+        # the rows replaced are deleted as orphans
+        self.schedules = schedules
+        self.instructors = instructors
+
     def _set_parent_model_entry(
             self,
             parent_model_entries: ParentModelEntries
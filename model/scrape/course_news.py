@@ -1,3 +1,5 @@
+from typing import Any
+
 from sqlalchemy import ForeignKey
 from sqlalchemy.schema import Column
 from sqlalchemy.types import INTEGER, TEXT, DATETIME, UnicodeText
@@ -42,13 +44,13 @@ class CourseNews(SQLScraperModelBase):
     @classmethod
     def _create_entry_from_task_entry(
             cls: type['SQLScraperModelBase'], *,
-            task_entry: model.crawl.Task,
-            soup_parser: SoupParser
+            task_entry: model.crawl.CrawlEntry,
+            fields: dict[str, Any]
     ) -> 'SQLScraperModelBase':
         entry = cls(
             timestamp=task_entry.timestamp,
             url=task_entry.lookup.url,
-            **soup_parser.extract_properties('title', 'body')
+            **fields
         )
 
         return entry
@@ -5,6 +5,10 @@ import bs4
 
 
 class SoupParser:
+    # raise when the parser extracts different fields, so that every page of it is
+    # parsed again by the next scrape
+    version: int = 1
+
     def __init__(self, soup: bs4.BeautifulSoup):
         self.__soup = soup
 
@@ -33,6 +37,9 @@ class SoupParser:
         }
         return properties
 
+    def extract_fields(self) -> dict[str, Any]:
+        return dict(self.__properties)
+
     def extract_properties(self, *names: str) -> dict[str, Any]:
         return {
             name: value
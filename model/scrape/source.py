@@ -0,0 +1,60 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import Column, Index
+from sqlalchemy.types import INTEGER, TEXT
+
+from model import SQLDataModelMixin, SQLDataModelBase
+
+
+class ScrapeSource(SQLDataModelBase, SQLDataModelMixin):
+    """
+    Page a scraped row was parsed from, by the content hash of the page and the
+    version of the parser. The scraper parses a page again only if either changed,
+    and deletes the rows whose pages are no longer crawled.
+    """
+
+    id = Column(INTEGER, primary_key=True)
+
+    model_name = Column(TEXT, nullable=False)
+    url = Column(TEXT, nullable=False)
+    row_id = Column(INTEGER, nullable=False)
+    content_hash = Column(INTEGER, nullable=False)
+    parser_version = Column(INTEGER, nullable=False)
+
+    __table_args__ = (
+        Index('ix_scrape_source_model_name_url', model_name, url, unique=True),
+    )
+
+    @classmethod
+    def map_sources(cls, session: Session) -> dict[tuple[str, str], 'ScrapeSource']:
+        return {
+            (source.model_name, source.url): source
+            for source in session.query(cls)
+        }
+
+    def is_stale(self, *, content_hash: int, parser_version: int) -> bool:
+        return self.content_hash != content_hash or self.parser_version != parser_version
+
+    @classmethod
+    def record(
+            cls,
+            session: Session,
+            *,
+            source: Optional['ScrapeSource'],
+            model_name: str,
+            url: str,
+            row_id: int,
+            content_hash: int,
+            parser_version: int
+    ) -> 'ScrapeSource':
+        """
+        Update `source` of the row, or add a new one if it is None.
+        """
+        if source is None:
+            source = cls(model_name=model_name, url=url)
+            session.add(source)
+        source.row_id = row_id
+        source.content_hash = content_hash
+        source.parser_version = parser_version
+        return source
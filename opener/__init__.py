@@ -1,7 +1,34 @@
+from .archive import RecordingURLOpenHandler, ReplayURLOpenHandler, ArchiveReader, \
+    ArchiveWriter
+from .cache import ResponseCache, CachePolicy
 from .chuo_sso import URLOpenerChuoSSOLoginMixin
-from .limiter import URLRateLimiter
+from .decoding import ContentDecodingProcessor, TransferCounter
+from .limiter import URLRateLimiter, RateLimitPolicy
 from .opener import CookieURLOpenHandler, DiskURLOpenHandler, MemoryURLOpenHandler
-from .util import URLOpenerUtilMethodsMixin
+from .pool import ConnectionPool, KeepAliveHandler
+from .retry import URLRetrier, RetryPolicy, CircuitBreakerPolicy, CircuitOpenError, \
+    is_transient_error
+from .util import URLOpenerUtilMethodsMixin, Validators, ConditionalResponse, ResponseBody, \
+    ResponseTooLargeError
+
+# starts as slow as manaba has always been crawled and speeds up while it responds quickly
+MANABA_RATE_LIMIT_POLICY = RateLimitPolicy(
+    rate=1 / 20,
+    min_rate=1 / 120,
+    max_rate=1 / 2,
+    increase=1 / 60,
+    target_latency=3.0
+)
+
+# pages of course contents and attachments rarely change once published; group names
+# are of `worker.crawl.ManabaPageFamily` and of the attachment downloader
+MANABA_CACHE_POLICY = CachePolicy(
+    group_ttls={
+        'course_contents_page': 24 * 60 * 60,
+        'attachment': 7 * 24 * 60 * 60,
+    },
+    max_bytes=1 << 32
+)
 
 
 class ManabaURLOpener(
@@ -42,3 +69,29 @@ class MemoryURLOpener(
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._exit_handler()
         return False
+
+
+class RecordingURLOpener(
+    RecordingURLOpenHandler,
+    URLOpenerUtilMethodsMixin
+):
+    def __enter__(self):
+        self._enter_handler()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._exit_handler()
+        return False
+
+
+class ReplayURLOpener(
+    ReplayURLOpenHandler,
+    URLOpenerUtilMethodsMixin
+):
+    def __enter__(self):
+        self._enter_handler()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._exit_handler()
+        return False
@@ -0,0 +1,378 @@
+import email.message
+import http
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+import urllib.error
+import urllib.request
+import urllib.response
+from typing import NamedTuple, Optional, Iterable, Callable
+
+import app_logging
+from .opener import URLOpenHandlerBase
+from .prototype import URLOpenerPrototype, RequestLike, extract_url_from_request_like
+from .util import ResponseBody, iter_response_chunks, DEFAULT_CHUNK_SIZE, UNSTORED_HEADERS
+
+logger = app_logging.create_logger()
+
+ARCHIVE_MAGIC = b'MWA1'
+# magic, status, bytes of url, bytes of headers and bytes of body of a record, followed
+# by the url, the headers as a JSON list of name and value pairs, and the body
+RECORD_HEADER = struct.Struct('>4sHIIQ')
+
+
+class ArchiveEntry(NamedTuple):
+    url: str
+    status: int
+    headers: list[tuple[str, str]]
+    body_offset: int
+    body_size: int
+
+    @property
+    def end_offset(self) -> int:
+        return self.body_offset + self.body_size
+
+    def create_headers(self) -> email.message.Message:
+        headers = email.message.Message()
+        for name, value in self.headers:
+            headers[name] = value
+        headers['Content-Length'] = str(self.body_size)
+        return headers
+
+
+def iter_archive_entries(buffer) -> Iterable[ArchiveEntry]:
+    """
+    Entries of the records in `buffer` in the order they were appended. A record cut
+    off at the end, by a recording process killed while appending it, is ignored.
+    """
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(buffer):
+        magic, status, url_size, headers_size, body_size \
+            = RECORD_HEADER.unpack_from(buffer, offset)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f'broken archive record at {offset=}')
+        url_offset = offset + RECORD_HEADER.size
+        body_offset = url_offset + url_size + headers_size
+        if body_offset + body_size > len(buffer):
+            break
+        url = bytes(buffer[url_offset:url_offset + url_size]).decode('utf-8')
+        headers = json.loads(bytes(buffer[url_offset + url_size:body_offset]))
+        yield ArchiveEntry(
+            url=url,
+            status=status,
+            headers=[(name, value) for name, value in headers],
+            body_offset=body_offset,
+            body_size=body_size
+        )
+        offset = body_offset + body_size
+
+
+def _map_file(fp) -> Optional[mmap.mmap]:
+    # an empty file cannot be mapped
+    if os.fstat(fp.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ArchiveWriter:
+    """
+    Append-only archive of responses. Records cut off at the end of an existing
+    archive are truncated before appending.
+    """
+
+    def __init__(self, file_name: str):
+        self.__lock = threading.Lock()
+        self.__fp = open(file_name, 'a+b')
+
+        buffer = _map_file(self.__fp)
+        valid_size = 0
+        if buffer is not None:
+            with buffer:
+                for entry in iter_archive_entries(buffer):
+                    valid_size = entry.end_offset
+                size = len(buffer)
+        else:
+            size = 0
+        if valid_size < size:
+            logger.warning(f'{size - valid_size} bytes of a broken record truncated')
+            self.__fp.truncate(valid_size)
+        self.__fp.seek(valid_size)
+
+    def append(
+            self,
+            url: str,
+            *,
+            status: int,
+            headers: Optional[email.message.Message],
+            chunks: Iterable[bytes],
+            size: int
+    ) -> ArchiveEntry:
+        """
+        Append a response of `url` whose body is `size` bytes given by `chunks`.
+        """
+        header_pairs = [
+            (name, value)
+            for name, value in (headers.items() if headers is not None else [])
+            if name.lower() not in UNSTORED_HEADERS
+        ]
+        url_bytes = url.encode('utf-8')
+        headers_bytes = json.dumps(header_pairs, ensure_ascii=False).encode('utf-8')
+
+        with self.__lock:
+            offset = self.__fp.tell()
+            self.__fp.write(RECORD_HEADER.pack(
+                ARCHIVE_MAGIC,
+                status,
+                len(url_bytes),
+                len(headers_bytes),
+                size
+            ))
+            self.__fp.write(url_bytes)
+            self.__fp.write(headers_bytes)
+            written = 0
+            for chunk in chunks:
+                self.__fp.write(chunk)
+                written += len(chunk)
+            if written != size:
+                self.__fp.truncate(offset)
+                self.__fp.seek(offset)
+                raise ValueError(f'{written} bytes of body given instead of {size} bytes')
+            self.__fp.flush()
+
+        return ArchiveEntry(
+            url=url,
+            status=status,
+            headers=header_pairs,
+            body_offset=offset + RECORD_HEADER.size + len(url_bytes) + len(headers_bytes),
+            body_size=size
+        )
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__fp.close()
+
+
+class ArchiveReader:
+    """
+    Memory-mapped archive indexed by url; the latest record of a url is served.
+    """
+
+    def __init__(self, file_name: str):
+        with open(file_name, 'rb') as fp:
+            self.__buffer = _map_file(fp)
+        self.__index: dict[str, ArchiveEntry] = {}
+        if self.__buffer is not None:
+            for entry in iter_archive_entries(self.__buffer):
+                self.__index[entry.url] = entry
+        logger.info(f'archive loaded: {file_name=}, {len(self.__index)=}')
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.__index
+
+    def urls(self) -> Iterable[str]:
+        return self.__index.keys()
+
+    def get(self, url: str) -> Optional[ArchiveEntry]:
+        return self.__index.get(url)
+
+    def body_of(self, entry: ArchiveEntry) -> memoryview:
+        return memoryview(self.__buffer)[entry.body_offset:entry.end_offset] \
+            if entry.body_size else memoryview(b'')
+
+    def close(self) -> None:
+        if self.__buffer is None:
+            return
+        try:
+            self.__buffer.close()
+        except BufferError:
+            # bodies of responses still open refer to the map, which is closed once
+            # they are collected
+            pass
+
+
+class _ChunkReader(io.RawIOBase):
+    # reads the body given by `chunks` without joining them
+    def __init__(self, chunks: Iterable, close_callback: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self.__chunks = iter(chunks)
+        self.__chunk = b''
+        self.__offset = 0
+        self.__close_callback = close_callback
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while self.__offset >= len(self.__chunk):
+            self.__chunk = next(self.__chunks, None)
+            self.__offset = 0
+            if self.__chunk is None:
+                self.__chunk = b''
+                return 0
+        size = min(len(b), len(self.__chunk) - self.__offset)
+        b[:size] = self.__chunk[self.__offset:self.__offset + size]
+        self.__offset += size
+        return size
+
+    def close(self) -> None:
+        if not self.closed and self.__close_callback is not None:
+            self.__close_callback()
+        super().close()
+
+
+def _reason_of(status: int) -> str:
+    try:
+        return http.HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+def _create_response(
+        url: str,
+        status: int,
+        headers: email.message.Message,
+        raw: _ChunkReader
+) -> urllib.response.addinfourl:
+    response = urllib.response.addinfourl(io.BufferedReader(raw), headers, url, status)
+    response.msg = _reason_of(status)
+    return response
+
+
+def _create_http_error(
+        url: str,
+        status: int,
+        headers: email.message.Message,
+        raw: _ChunkReader
+) -> urllib.error.HTTPError:
+    return urllib.error.HTTPError(url, status, _reason_of(status), headers, io.BufferedReader(raw))
+
+
+class RecordingURLOpenHandler(URLOpenHandlerBase):
+    """
+    Handler sending requests through `url_opener` and appending the responses of
+    GET requests to the archive `archive_file_name`, which `ReplayURLOpenHandler`
+    serves later. Responses of `304 Not Modified` are not recorded, since they have
+    no body; they are answered from the validators of the recorded response instead.
+    """
+
+    def __init__(
+            self,
+            *,
+            url_opener: URLOpenerPrototype,
+            archive_file_name: str,
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+
+        self.__url_opener = url_opener
+        self.__writer = ArchiveWriter(archive_file_name)
+
+    def create_header(self) -> dict:
+        return self.__url_opener.create_header()
+
+    def auth_scope(self) -> str:
+        return self.__url_opener.auth_scope()
+
+    def __record(self, url: str, status: int, res) -> _ChunkReader:
+        body = ResponseBody()
+        try:
+            for chunk in iter_response_chunks(res):
+                body.write(chunk)
+            self.__writer.append(
+                url,
+                status=status,
+                headers=getattr(res, 'headers', None),
+                chunks=body.iter_chunks(),
+                size=body.size
+            )
+        except BaseException:
+            body.close()
+            raise
+        return _ChunkReader(body.iter_chunks(), body.close)
+
+    def urlopen(self, url_or_req: RequestLike):
+        if isinstance(url_or_req, urllib.request.Request) and url_or_req.data is not None:
+            return self.__url_opener.urlopen(url_or_req)
+
+        url = extract_url_from_request_like(url_or_req)
+        try:
+            # responses of some openers are only context managers of the response
+            with self.__url_opener.urlopen(url_or_req) as res:
+                status = getattr(res, 'status', None) or http.HTTPStatus.OK.value
+                raw = self.__record(url, status, res)
+                headers = getattr(res, 'headers', None) or email.message.Message()
+        except urllib.error.HTTPError as e:
+            if e.code == http.HTTPStatus.NOT_MODIFIED:
+                raise
+            with e:
+                raw = self.__record(url, e.code, e)
+            raise _create_http_error(url, e.code, e.headers, raw) from None
+        return _create_response(url, status, headers, raw)
+
+    def _exit_handler(self) -> None:
+        self.__writer.close()
+        super()._exit_handler()
+
+
+class ReplayURLOpenHandler(URLOpenHandlerBase):
+    """
+    Handler serving the responses recorded by `RecordingURLOpenHandler` from the
+    memory-mapped archive `archive_file_name`, without any network access. Urls not
+    in the archive raise `FileNotFoundError` like `DiskURLOpenHandler`; conditional
+    requests are answered with `304 Not Modified` if the recorded validators match.
+    """
+
+    def __init__(
+            self,
+            *,
+            archive_file_name: str,
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+
+        self.__reader = ArchiveReader(archive_file_name)
+
+    # noinspection PyMethodMayBeStatic
+    def create_header(self) -> dict:
+        return {}
+
+    def urlopen(self, url_or_req: RequestLike):
+        url = extract_url_from_request_like(url_or_req)
+        logger.debug(f'urlopen {url}')
+
+        entry = self.__reader.get(url)
+        if entry is None:
+            raise FileNotFoundError(url)
+        headers = entry.create_headers()
+
+        if isinstance(url_or_req, urllib.request.Request) and entry.status < 300:
+            etag = url_or_req.get_header('If-none-match')
+            last_modified = url_or_req.get_header('If-modified-since')
+            if (etag is not None and etag == headers['ETag']) \
+                    or (last_modified is not None and last_modified == headers['Last-Modified']):
+                raise urllib.error.HTTPError(
+                    url,
+                    http.HTTPStatus.NOT_MODIFIED,
+                    'Not Modified',
+                    headers,
+                    None
+                )
+
+        body = self.__reader.body_of(entry)
+        chunks = (
+            body[offset:offset + DEFAULT_CHUNK_SIZE]
+            for offset in range(0, len(body), DEFAULT_CHUNK_SIZE)
+        )
+        if entry.status >= 400:
+            raise _create_http_error(url, entry.status, headers, _ChunkReader(chunks))
+        return _create_response(url, entry.status, headers, _ChunkReader(chunks))
+
+    def _exit_handler(self) -> None:
+        self.__reader.close()
+        super()._exit_handler()
@@ -0,0 +1,289 @@
+import collections
+import email.message
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import NamedTuple, Optional, Callable
+
+import app_logging
+import metrics
+from .util import ResponseBody, UNSTORED_HEADERS
+
+logger = app_logging.create_logger()
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    `url` with the scheme and the host lowercased, the default port and the fragment
+    removed and the query parameters sorted, so that urls of the same resource are
+    cached once.
+    """
+    components = urllib.parse.urlsplit(url)
+    scheme = components.scheme.lower()
+    netloc = components.netloc.lower()
+    if components.port is not None and DEFAULT_PORTS.get(scheme) == components.port:
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(components.query, keep_blank_values=True))
+    )
+    return urllib.parse.urlunsplit((scheme, netloc, components.path or '/', query, ''))
+
+
+class CachePolicy(NamedTuple):
+    """
+    Seconds a response is served from the cache per group name, and the bytes of
+    bodies the cache holds at most; the least recently used responses are evicted
+    beyond it. Urls of groups not in `group_ttls` are not cached.
+    """
+    group_ttls: dict[str, float]
+    max_bytes: int = 1 << 30
+
+
+class CachedResponse(NamedTuple):
+    body: ResponseBody
+    headers: email.message.Message
+
+
+class ResponseCache:
+    """
+    Responses of GET requests cached on disk, keyed by the normalized url and the
+    auth scope, the user whose session retrieved them. Bodies are files in
+    `dir_path` and an sqlite3 database there indexes them. `group_of` tells the
+    group name of a url, which decides its time to live by `policy`.
+    """
+
+    INDEX_FILE_NAME = 'index.sqlite3'
+
+    def __init__(
+            self,
+            dir_path: str,
+            policy: CachePolicy,
+            *,
+            group_of: Callable[[str], Optional[str]],
+            clock: Callable[[], float] = time.time
+    ):
+        logger.info(f'initialized with {dir_path=}, {policy=}')
+        self.__dir_path = dir_path
+        self.__policy = policy
+        self.__group_of = group_of
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__counts: dict[str, collections.Counter] = collections.defaultdict(
+            collections.Counter
+        )
+
+        os.makedirs(os.path.join(dir_path, 'bodies'), exist_ok=True)
+        self.__connection = sqlite3.connect(
+            os.path.join(dir_path, self.INDEX_FILE_NAME),
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS response ('
+            ' key TEXT PRIMARY KEY,'
+            ' url TEXT NOT NULL,'
+            ' group_name TEXT NOT NULL,'
+            ' headers TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL'
+            ')'
+        )
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS response_accessed_at ON response (accessed_at)'
+        )
+
+    def ttl_of(self, url: str) -> Optional[tuple[str, float]]:
+        """
+        Group name and seconds to live of `url`, or None if it is not cached.
+        """
+        group_name = self.__group_of(url)
+        if group_name is None:
+            return None
+        ttl = self.__policy.group_ttls.get(group_name)
+        if ttl is None:
+            return None
+        return group_name, ttl
+
+    @classmethod
+    def __key_of(cls, url: str, auth_scope: str) -> str:
+        scoped_url = f'{auth_scope}\n{normalize_url(url)}'
+        return hashlib.sha256(scoped_url.encode('utf-8')).hexdigest()
+
+    def __body_path(self, key: str) -> str:
+        return os.path.join(self.__dir_path, 'bodies', key)
+
+    def __count(self, group_name: str, result: str) -> None:
+        with self.__lock:
+            self.__counts[group_name][result] += 1
+        metrics.increment('opener_cache_requests_total', group=group_name, result=result)
+
+    def __delete(self, key: str) -> None:
+        # called with the lock held
+        self.__connection.execute('DELETE FROM response WHERE key = ?', (key,))
+        try:
+            os.remove(self.__body_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, url: str, *, auth_scope: str) -> Optional[CachedResponse]:
+        """
+        The cached response of `url` which has not expired, or None. The caller closes
+        the body.
+        """
+        group_ttl = self.ttl_of(url)
+        if group_ttl is None:
+            return None
+        group_name, _ = group_ttl
+
+        key = self.__key_of(url, auth_scope)
+        now = self.__clock()
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT headers, size, expires_at FROM response WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is not None and row[2] <= now:
+                self.__delete(key)
+                result = 'expired'
+            elif row is not None:
+                try:
+                    fp = open(self.__body_path(key), 'rb')
+                except FileNotFoundError:
+                    self.__delete(key)
+                    result = 'miss'
+                else:
+                    self.__connection.execute(
+                        'UPDATE response SET accessed_at = ? WHERE key = ?',
+                        (now, key)
+                    )
+                    result = 'hit'
+            else:
+                result = 'miss'
+        self.__count(group_name, result)
+        if result != 'hit':
+            return None
+
+        headers_json, size, _ = row
+        headers = email.message.Message()
+        for name, value in json.loads(headers_json):
+            headers[name] = value
+        headers['Content-Length'] = str(size)
+        return CachedResponse(body=ResponseBody.from_file(fp, size), headers=headers)
+
+    def put(
+            self,
+            url: str,
+            *,
+            auth_scope: str,
+            headers: Optional[email.message.Message],
+            body: ResponseBody
+    ) -> bool:
+        """
+        Cache `body` of a successful response of `url`; False if `url` is not cached.
+        """
+        group_ttl = self.ttl_of(url)
+        if group_ttl is None:
+            return False
+        group_name, ttl = group_ttl
+        if body.size > self.__policy.max_bytes:
+            return False
+
+        key = self.__key_of(url, auth_scope)
+        header_pairs = [
+            (name, value)
+            for name, value in (headers.items() if headers is not None else [])
+            if name.lower() not in UNSTORED_HEADERS
+        ]
+        # written aside and renamed, so that readers never see a partial body
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.__dir_path, 'bodies'))
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                body.copy_to(fp)
+            now = self.__clock()
+            with self.__lock:
+                os.replace(temp_path, self.__body_path(key))
+                self.__connection.execute(
+                    'INSERT OR REPLACE INTO response'
+                    ' (key, url, group_name, headers, size, expires_at, accessed_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        key,
+                        url,
+                        group_name,
+                        json.dumps(header_pairs, ensure_ascii=False),
+                        body.size,
+                        now + ttl,
+                        now
+                    )
+                )
+                evicted_count = self.__evict()
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.__count(group_name, 'store')
+        if evicted_count:
+            logger.debug(f'least recently used responses evicted: {evicted_count=}')
+        return True
+
+    def __evict(self) -> int:
+        # called with the lock held
+        total_size, = self.__connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM response'
+        ).fetchone()
+        evicted_count = 0
+        if total_size <= self.__policy.max_bytes:
+            return evicted_count
+        for key, group_name, size in self.__connection.execute(
+                'SELECT key, group_name, size FROM response ORDER BY accessed_at'
+        ).fetchall():
+            self.__delete(key)
+            self.__counts[group_name]['evicted'] += 1
+            evicted_count += 1
+            total_size -= size
+            if total_size <= self.__policy.max_bytes:
+                break
+        return evicted_count
+
+    def stats(self) -> dict[str, object]:
+        """
+        Lookups answered from the cache (`hit`), not found (`miss`) or found expired
+        (`expired`), responses stored and evicted, in total and per group.
+        """
+        with self.__lock:
+            per_group = {
+                group_name: dict(counter)
+                for group_name, counter in self.__counts.items()
+            }
+            total_size, entry_count = self.__connection.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM response'
+            ).fetchone()
+        total = collections.Counter()
+        for counter in per_group.values():
+            total.update(counter)
+        lookup_count = total['hit'] + total['miss'] + total['expired']
+        return {
+            'cache_hit_count': total['hit'],
+            'cache_miss_count': total['miss'],
+            'cache_expired_count': total['expired'],
+            'cache_stored_count': total['store'],
+            'cache_evicted_count': total['evicted'],
+            'cache_hit_ratio': total['hit'] / lookup_count if lookup_count else None,
+            'cache_entry_count': entry_count,
+            'cache_bytes': total_size,
+            'cache_groups': per_group,
+        }
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
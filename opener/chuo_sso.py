@@ -16,6 +16,8 @@ class URLOpenerChuoSSOLoginMixin(URLOpenerPrototype):
         super().__init__(**kwargs)
 
         self.__login_uid: Optional[str] = None
+        # user of the session, even if it was certified before `login`
+        self.__certified_uid: Optional[str] = None
 
     LOGIN_CHECK_URL = 'https://room.chuo-u.ac.jp/ct/home'
 
@@ -69,6 +71,7 @@ class URLOpenerChuoSSOLoginMixin(URLOpenerPrototype):
 
         if redirect_url is None:
             logger.info('already certified')
+            self.__certified_uid = uid
             return
 
         logger.info('certification required')
@@ -98,7 +101,7 @@ class URLOpenerChuoSSOLoginMixin(URLOpenerPrototype):
         redirect_url = self.check_login()
 
         if redirect_url is None:
-            self.__login_uid = uid
+            self.__login_uid = self.__certified_uid = uid
             return
 
         parse_result = urllib.parse.urlparse(redirect_url)
@@ -113,11 +116,14 @@ class URLOpenerChuoSSOLoginMixin(URLOpenerPrototype):
                 pass
 
         if self.check_login() is None:
-            self.__login_uid = uid
+            self.__login_uid = self.__certified_uid = uid
             return
 
         raise ValueError('login failed')
 
+    def auth_scope(self) -> str:
+        return f'chuo-sso:{self.__certified_uid}' if self.__certified_uid is not None else ''
+
     LOGOUT_URL = 'https://room.chuo-u.ac.jp/ct/logout'
 
     def logout(self):
@@ -127,7 +133,7 @@ class URLOpenerChuoSSOLoginMixin(URLOpenerPrototype):
         logger.info(f'logout of login_uid={self.__login_uid}')
         with self.urlopen(self.LOGOUT_URL):
             pass
-        self.__login_uid = None
+        self.__login_uid = self.__certified_uid = None
 
     def _exit_handler(self):
         self.logout()
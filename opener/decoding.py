@@ -0,0 +1,163 @@
+import collections
+import io
+import threading
+import urllib.request
+import urllib.response
+import zlib
+from typing import Optional
+
+import metrics
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# bytes read from the wire at once
+READ_CHUNK_SIZE = 1 << 16
+
+
+class TransferCounter:
+    """
+    Bytes of response bodies as transferred and as decoded, per content encoding.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counts = collections.Counter()
+
+    def add(self, encoding: str, *, wire: int = 0, decoded: int = 0, responses: int = 0) -> None:
+        with self.__lock:
+            self.__counts['wire', encoding] += wire
+            self.__counts['decoded', encoding] += decoded
+            self.__counts['responses', encoding] += responses
+        metrics.increment('opener_wire_bytes_total', wire, encoding=encoding)
+        metrics.increment('opener_decoded_bytes_total', decoded, encoding=encoding)
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            counts = collections.Counter(self.__counts)
+        wire = sum(v for (kind, _), v in counts.items() if kind == 'wire')
+        decoded = sum(v for (kind, _), v in counts.items() if kind == 'decoded')
+        return {
+            'transfer_wire_bytes': wire,
+            'transfer_decoded_bytes': decoded,
+            'transfer_compression_ratio': wire / decoded if decoded else None,
+            'transfer_responses': {
+                encoding: count
+                for (kind, encoding), count in counts.items()
+                if kind == 'responses'
+            },
+        }
+
+
+def _create_decompressor(encoding: str, *, raw_deflate: bool = False):
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        # `deflate` is meant to be zlib-wrapped but some servers send raw deflate
+        return zlib.decompressobj(-zlib.MAX_WBITS if raw_deflate else zlib.MAX_WBITS)
+    return None
+
+
+class DecodingReader(io.RawIOBase):
+    """
+    Body of `raw` decompressed as it is read, counting the bytes read from `raw` and
+    the bytes decoded into `counter`. Bodies of other encodings are passed through.
+    """
+
+    def __init__(self, raw, encoding: str, counter: TransferCounter):
+        super().__init__()
+        self.__raw = raw
+        self.__encoding = encoding
+        self.__counter = counter
+        self.__decompressor = _create_decompressor(encoding)
+        self.__first_chunk = True
+        self.__buffer = b''
+        self.__offset = 0
+        self.__eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def __decode(self, chunk: bytes) -> bytes:
+        if self.__decompressor is None:
+            return chunk
+        try:
+            return self.__decompressor.decompress(chunk)
+        except zlib.error:
+            if not (self.__first_chunk and self.__encoding == 'deflate'):
+                raise
+            self.__decompressor = _create_decompressor('deflate', raw_deflate=True)
+            return self.__decompressor.decompress(chunk)
+
+    def __fill(self) -> Optional[bytes]:
+        # decoded bytes of the next chunk of the wire, empty if the chunk decoded to
+        # nothing and None at the end of the body
+        if self.__eof:
+            return None
+        chunk = self.__raw.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self.__eof = True
+            decoded = self.__decompressor.flush() if self.__decompressor is not None else b''
+            self.__counter.add(self.__encoding, decoded=len(decoded), responses=1)
+            return decoded or None
+        decoded = self.__decode(chunk)
+        self.__first_chunk = False
+        self.__counter.add(self.__encoding, wire=len(chunk), decoded=len(decoded))
+        return decoded
+
+    def readinto(self, b) -> int:
+        while self.__offset >= len(self.__buffer):
+            decoded = self.__fill()
+            if decoded is None:
+                return 0
+            self.__buffer, self.__offset = decoded, 0
+        size = min(len(b), len(self.__buffer) - self.__offset)
+        b[:size] = self.__buffer[self.__offset:self.__offset + size]
+        self.__offset += size
+        return size
+
+    def readall(self) -> bytes:
+        parts = [self.__buffer[self.__offset:]]
+        self.__buffer, self.__offset = b'', 0
+        while True:
+            decoded = self.__fill()
+            if decoded is None:
+                return b''.join(parts)
+            parts.append(decoded)
+
+    def close(self) -> None:
+        try:
+            self.__raw.close()
+        finally:
+            super().close()
+
+
+class ContentDecodingProcessor(urllib.request.BaseHandler):
+    """
+    Processor asking for compressed bodies with `Accept-Encoding` and decompressing
+    them transparently. Runs before the processors handling errors and redirects, so
+    that their bodies are decoded as well.
+    """
+
+    handler_order = 900
+
+    def __init__(self, counter: Optional[TransferCounter] = None):
+        self.counter = counter or TransferCounter()
+
+    def http_request(self, req: urllib.request.Request) -> urllib.request.Request:
+        if not req.has_header('Accept-encoding'):
+            req.add_unredirected_header('Accept-encoding', ACCEPT_ENCODING)
+        return req
+
+    def http_response(self, req: urllib.request.Request, response):
+        encoding = (response.headers.get('Content-Encoding') or 'identity').strip().lower()
+        decoded_response = urllib.response.addinfourl(
+            io.BufferedReader(DecodingReader(response, encoding, self.counter)),
+            response.headers,
+            response.url,
+            response.status
+        )
+        decoded_response.msg = response.msg
+        return decoded_response
+
+    https_request = http_request
+    https_response = http_response
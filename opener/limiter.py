@@ -1,30 +1,222 @@
-import collections
+import email.utils
+import http
+import threading
 import time
 import urllib.parse
-import urllib.request
+from typing import NamedTuple, Optional, Callable
 
 import app_logging
+import metrics
 
 logger = app_logging.create_logger()
 
+# responses asking the client to slow down; their `Retry-After` is honored
+BACKOFF_STATUSES = frozenset({
+    http.HTTPStatus.TOO_MANY_REQUESTS.value,
+    http.HTTPStatus.SERVICE_UNAVAILABLE.value,
+})
+
+
+class RateLimitPolicy(NamedTuple):
+    """
+    Request rate of a domain, in requests per second.
+
+    The rate starts at `rate` and is adapted between `min_rate` and `max_rate` by
+    AIMD: every response faster than `target_latency` adds `increase` to the rate,
+    and a backoff response or a slower response multiplies it by `decrease_factor`.
+    Without `min_rate` and `max_rate` the rate is fixed. Up to `burst` requests are
+    sent without waiting after the domain has been idle.
+    """
+    rate: float
+    burst: int = 1
+    min_rate: Optional[float] = None
+    max_rate: Optional[float] = None
+    increase: float = 0.0
+    decrease_factor: float = 0.5
+    target_latency: Optional[float] = None
+
+    @classmethod
+    def fixed_interval(cls, interval: float, *, burst: int = 1) -> 'RateLimitPolicy':
+        return cls(rate=1 / interval, burst=burst)
+
+    @property
+    def lower_rate(self) -> float:
+        return self.rate if self.min_rate is None else self.min_rate
+
+    @property
+    def upper_rate(self) -> float:
+        return self.rate if self.max_rate is None else self.max_rate
+
+
+def parse_retry_after(value: Optional[str], *, now: float) -> Optional[float]:
+    """
+    Seconds to wait from `now`, a POSIX timestamp, told by a `Retry-After` header of
+    either delta-seconds or an HTTP-date; None if `value` is missing or malformed.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - now)
+
+
+class TokenBucket:
+    """
+    Token bucket of a domain. A request takes a token; callers finding the bucket
+    empty take a token in advance and wait until it is refilled, so concurrent
+    callers are spaced by the rate instead of waking up all together.
+    """
+
+    def __init__(self, policy: RateLimitPolicy, now: float):
+        self.policy = policy
+        self.rate = policy.rate
+        self.__tokens = float(policy.burst)
+        # tokens are refilled from this time, which is in the future while backing off
+        self.__refilled_time = now
+        self.__decreased_time = float('-inf')
+
+    def __refill(self, now: float) -> None:
+        if now <= self.__refilled_time:
+            return
+        self.__tokens = min(
+            float(self.policy.burst),
+            self.__tokens + (now - self.__refilled_time) * self.rate
+        )
+        self.__refilled_time = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token and return the seconds to wait before sending the request.
+        """
+        self.__refill(now)
+        self.__tokens -= 1
+        return max(0.0, self.__refilled_time - now) + max(0.0, -self.__tokens) / self.rate
+
+    def back_off(self, now: float, seconds: float) -> None:
+        """
+        Hold requests for `seconds` from `now`; the first one waiting is sent then.
+        """
+        self.__refill(now)
+        self.__tokens = min(self.__tokens, 1.0)
+        self.__refilled_time = max(self.__refilled_time, now + seconds)
+
+    def increase(self) -> None:
+        self.rate = min(self.policy.upper_rate, self.rate + self.policy.increase)
+
+    def decrease(self, now: float) -> bool:
+        # a single congestion is usually told by every request in flight; decrease
+        # once per interval so that they do not collapse the rate together
+        if now - self.__decreased_time < 1 / self.rate:
+            return False
+        self.__decreased_time = now
+        self.rate = max(self.policy.lower_rate, self.rate * self.policy.decrease_factor)
+        return True
+
 
 class URLRateLimiter:
-    def __init__(self, sleep):
-        logger.info(f'initialized with {sleep=}')
+    """
+    Per-domain token bucket rate limiter adapting the rate to the responses reported
+    by `report_response`. Domains not in `domain_policies` follow `default_policy`.
+    """
+
+    def __init__(
+            self,
+            default_policy: RateLimitPolicy,
+            *,
+            domain_policies: Optional[dict[str, RateLimitPolicy]] = None,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        logger.info(f'initialized with {default_policy=}, {domain_policies=}')
+        self.__default_policy = default_policy
+        self.__domain_policies = domain_policies or {}
+        self.__clock = clock
         self.__sleep = sleep
-        self.__last_time_blocking_finished = collections.defaultdict(float)
+        self.__buckets: dict[str, TokenBucket] = {}
+        self.__lock = threading.Lock()
 
     @classmethod
-    def __now(cls) -> float:
-        return time.time()
+    def __domain_of(cls, url: str) -> str:
+        return urllib.parse.urlparse(url).netloc
+
+    def __bucket(self, domain: str) -> TokenBucket:
+        bucket = self.__buckets.get(domain)
+        if bucket is None:
+            bucket = self.__buckets[domain] = TokenBucket(
+                self.__domain_policies.get(domain, self.__default_policy),
+                self.__clock()
+            )
+        return bucket
+
+    def rate_of(self, url: str) -> float:
+        domain = self.__domain_of(url)
+        with self.__lock:
+            return self.__bucket(domain).rate
+
+    def block(self, url: str) -> None:
+        domain = self.__domain_of(url)
+
+        with self.__lock:
+            required_sleep = self.__bucket(domain).reserve(self.__clock())
+
+        metrics.observe('opener_rate_limit_sleep_seconds', required_sleep, domain=domain)
+        if required_sleep > 0:
+            logger.info(f'blocking {domain!r} for {required_sleep:.3f} seconds...')
+            self.__sleep(required_sleep)
+
+    def report_response(
+            self,
+            url: str,
+            *,
+            status: Optional[int],
+            latency: float,
+            retry_after: Optional[str] = None
+    ) -> None:
+        """
+        Adapt the rate of the domain of `url` to a response of `status` taking
+        `latency` seconds; `status` is None if the request failed without a response.
+        Server errors back off as failures do, and client errors keep the rate.
+        `retry_after` is the value of the `Retry-After` header of the response.
+        """
+        domain = self.__domain_of(url)
+
+        with self.__lock:
+            now = self.__clock()
+            bucket = self.__bucket(domain)
+            policy = bucket.policy
+            old_rate = bucket.rate
 
-    def block(self, url):
-        domain = urllib.parse.urlparse(url).netloc
+            if status is None or status in BACKOFF_STATUSES or status >= 500:
+                reason = 'status' if status is not None else 'error'
+                back_off_seconds = parse_retry_after(retry_after, now=time.time())
+                if back_off_seconds is not None:
+                    bucket.back_off(now, back_off_seconds)
+            elif policy.target_latency is not None and latency > policy.target_latency:
+                reason = 'latency'
+                back_off_seconds = None
+            elif status >= 400:
+                # a client error tells nothing about the load of the server
+                return
+            else:
+                bucket.increase()
+                return
 
-        last_time = self.__last_time_blocking_finished[domain]
-        elapsed = self.__now() - last_time
-        required_sleep = max(0.1, self.__sleep - elapsed)
-        logger.info(f'blocking {domain!r} for {required_sleep:.3f} seconds...')
-        time.sleep(required_sleep)
+            decreased = bucket.decrease(now)
+            new_rate = bucket.rate
 
-        self.__last_time_blocking_finished[domain] = self.__now()
+        metrics.increment('opener_rate_limit_backoffs_total', domain=domain, reason=reason)
+        if back_off_seconds is not None:
+            logger.warning(
+                f'{domain!r} answered {status} with Retry-After,'
+                f' holding requests for {back_off_seconds:.3f} seconds'
+            )
+        if decreased and new_rate != old_rate:
+            logger.info(
+                f'rate of {domain!r} decreased by {reason}:'
+                f' {old_rate:.4f} -> {new_rate:.4f} requests/sec'
+            )
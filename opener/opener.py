@@ -1,14 +1,22 @@
 import contextlib
+import email.message
+import hashlib
+import http
 import http.cookiejar
 import io
 import os
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
 from typing import Iterable
 from typing import Union
 
 import app_logging
+import metrics
+from .decoding import ContentDecodingProcessor
 from .limiter import URLRateLimiter
+from .pool import ConnectionPool, KeepAliveHandler
 from .prototype import URLOpenerPrototype, RequestLike, extract_url_from_request_like
 
 logger = app_logging.create_logger()
@@ -46,10 +54,20 @@ class CookieURLOpenHandler(URLOpenHandlerBase):
         self.__rate_limiter = rate_limiter
 
         self.__cookie_jar = http.cookiejar.LWPCookieJar(filename=cookie_file_name)
+        self.__connection_pool = ConnectionPool()
+        self.__decoding_processor = ContentDecodingProcessor()
         self.__opener = urllib.request.build_opener(
-            urllib.request.HTTPCookieProcessor(self.__cookie_jar)
+            urllib.request.HTTPCookieProcessor(self.__cookie_jar),
+            KeepAliveHandler(self.__connection_pool),
+            self.__decoding_processor
         )
 
+    def connection_stats(self) -> dict[str, object]:
+        return self.__connection_pool.stats()
+
+    def transfer_stats(self) -> dict[str, object]:
+        return self.__decoding_processor.counter.stats()
+
     # noinspection PyMethodMayBeStatic
     def create_header(self) -> dict:
         default_header = {"User-Agent": "Mozilla/4.0 (compatible; MSIE 5.5; Windows NT)"}
@@ -58,8 +76,36 @@ class CookieURLOpenHandler(URLOpenHandlerBase):
     def urlopen(self, url_or_req: RequestLike):
         url = extract_url_from_request_like(url_or_req)
         logger.info(f'urlopen {url}')
+        domain = urllib.parse.urlparse(url).netloc
+        if self.__rate_limiter is None:
+            with metrics.timer('opener_request_seconds', domain=domain):
+                return self.__opener.open(url_or_req)
+
         self.__rate_limiter.block(url)
-        res = self.__opener.open(url_or_req)
+        start = time.perf_counter()
+        try:
+            with metrics.timer('opener_request_seconds', domain=domain):
+                res = self.__opener.open(url_or_req)
+        except urllib.error.HTTPError as e:
+            self.__rate_limiter.report_response(
+                url,
+                status=e.code,
+                latency=time.perf_counter() - start,
+                retry_after=e.headers.get('Retry-After') if e.headers is not None else None
+            )
+            raise
+        except OSError:
+            self.__rate_limiter.report_response(
+                url,
+                status=None,
+                latency=time.perf_counter() - start
+            )
+            raise
+        self.__rate_limiter.report_response(
+            url,
+            status=res.status,
+            latency=time.perf_counter() - start
+        )
         return res
 
     def _enter_handler(self):
@@ -74,6 +120,9 @@ class CookieURLOpenHandler(URLOpenHandlerBase):
     def _exit_handler(self):
         self.__cookie_jar.save(ignore_discard=True, ignore_expires=True)
         logger.info(f'cookie saved to {self.__cookie_jar.filename!r}')
+        logger.info(f'connection pool closed: {self.connection_stats()}')
+        logger.info(f'bytes transferred: {self.transfer_stats()}')
+        self.__connection_pool.close()
         super()._exit_handler()
 
 
@@ -137,7 +186,23 @@ class MemoryURLOpenHandler(URLOpenHandlerBase):
             content = self.__files.get(url)
             if content is None:
                 raise FileNotFoundError
-            yield io.BytesIO(content)
+
+            # answers conditional requests like a server sending strong etags
+            headers = email.message.Message()
+            headers['ETag'] = f'"{hashlib.sha1(content).hexdigest()}"'
+            if isinstance(url_or_req, urllib.request.Request) \
+                    and url_or_req.get_header('If-none-match') == headers['ETag']:
+                raise urllib.error.HTTPError(
+                    url,
+                    http.HTTPStatus.NOT_MODIFIED,
+                    'Not Modified',
+                    headers,
+                    None
+                )
+
+            res = io.BytesIO(content)
+            res.headers = headers
+            yield res
 
         return dummy_manager()
 
@@ -0,0 +1,261 @@
+import collections
+import functools
+import http.client
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Optional
+
+import app_logging
+import metrics
+
+logger = app_logging.create_logger()
+
+PoolKey = tuple[str, str]
+
+# errors of a request on a reused connection which the server had closed while idle;
+# the request is sent again on a new connection
+STALE_CONNECTION_ERRORS = (ConnectionError, http.client.BadStatusLine)
+
+# methods sent again when the response of a reused connection fails; the server may
+# have received the request already, which must not be processed twice
+RESENDABLE_METHODS = frozenset({'GET', 'HEAD'})
+
+
+class _PooledHTTPResponse(http.client.HTTPResponse):
+    """
+    Response giving its connection back to the pool once the body is read to its end;
+    a response closed before that closes its connection.
+    """
+
+    _release: Optional[Callable[[bool], None]] = None
+    __closing = False
+
+    def __release(self, reusable: bool) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release(reusable)
+
+    def _close_conn(self):
+        super()._close_conn()
+        # called at the end of the body, or by `close` or a premature EOF before it
+        self.__release(
+            not self.__closing
+            and not self.will_close
+            and (self.chunked or self.length == 0)
+        )
+
+    def close(self):
+        self.__closing = True
+        try:
+            super().close()
+        finally:
+            self.__release(False)
+
+
+def _is_dropped(connection: http.client.HTTPConnection) -> bool:
+    # an idle connection is readable only if the server has closed it
+    if connection.sock is None:
+        return True
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+    return bool(readable)
+
+
+class _IdleConnection:
+    def __init__(self, connection: http.client.HTTPConnection, released_time: float):
+        self.connection = connection
+        self.released_time = released_time
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections per scheme and host, shared by threads; a connection is
+    used by one request at a time.
+    """
+
+    def __init__(self, *, max_idle_per_host: int = 4, idle_timeout: float = 60.0):
+        self.__max_idle_per_host = max_idle_per_host
+        self.__idle_timeout = idle_timeout
+        self.__idle: dict[PoolKey, list[_IdleConnection]] = collections.defaultdict(list)
+        self.__lock = threading.Lock()
+        self.__stats: dict[PoolKey, collections.Counter] \
+            = collections.defaultdict(collections.Counter)
+
+    @classmethod
+    def __now(cls) -> float:
+        return time.monotonic()
+
+    def acquire(self, key: PoolKey) -> Optional[http.client.HTTPConnection]:
+        """
+        Take the most recently used idle connection of `key` which is still open, or
+        return None if there is none.
+        """
+        discarded = []
+        with self.__lock:
+            idle_connections = self.__idle[key]
+            acquired = None
+            while idle_connections:
+                idle = idle_connections.pop()
+                if self.__now() - idle.released_time > self.__idle_timeout \
+                        or _is_dropped(idle.connection):
+                    discarded.append(idle.connection)
+                    continue
+                acquired = idle.connection
+                break
+            self.__stats[key]['dropped'] += len(discarded)
+        for connection in discarded:
+            connection.close()
+        return acquired
+
+    def count(self, key: PoolKey, *, reused: bool) -> None:
+        with self.__lock:
+            self.__stats[key]['requests'] += 1
+            self.__stats[key]['reused' if reused else 'created'] += 1
+        metrics.increment('opener_connections_total', host=key[1], reused=reused)
+
+    def count_stale(self, key: PoolKey) -> None:
+        with self.__lock:
+            self.__stats[key]['stale'] += 1
+
+    def release(
+            self,
+            key: PoolKey,
+            connection: http.client.HTTPConnection,
+            reusable: bool
+    ) -> None:
+        if reusable and connection.sock is not None:
+            with self.__lock:
+                idle_connections = self.__idle[key]
+                if len(idle_connections) < self.__max_idle_per_host:
+                    idle_connections.append(_IdleConnection(connection, self.__now()))
+                    return
+        connection.close()
+
+    def close(self) -> None:
+        with self.__lock:
+            idle_connections = [
+                idle.connection
+                for idle_list in self.__idle.values()
+                for idle in idle_list
+            ]
+            self.__idle.clear()
+        for connection in idle_connections:
+            connection.close()
+
+    def stats(self) -> dict[str, object]:
+        """
+        Requests sent, connections created and reused, idle connections found closed by
+        the server (`dropped`) and requests resent after a reused connection failed
+        (`stale`), in total and per `scheme://host`.
+        """
+        with self.__lock:
+            per_host = {
+                f'{scheme}://{host}': dict(counter)
+                for (scheme, host), counter in self.__stats.items()
+            }
+        total = collections.Counter()
+        for counter in per_host.values():
+            total.update(counter)
+        return {
+            'connection_pool_request_count': total['requests'],
+            'connection_pool_created_count': total['created'],
+            'connection_pool_reused_count': total['reused'],
+            'connection_pool_dropped_count': total['dropped'],
+            'connection_pool_stale_count': total['stale'],
+            'connection_pool_reuse_ratio':
+                total['reused'] / total['requests'] if total['requests'] else None,
+            'connection_pool_hosts': per_host,
+        }
+
+
+class KeepAliveHandler(urllib.request.HTTPHandler, urllib.request.HTTPSHandler):
+    """
+    Handler of http and https sending requests on persistent connections of
+    `ConnectionPool` instead of a new connection per request. `build_opener` puts it
+    in place of the default handlers, so processors like `HTTPCookieProcessor` work
+    as before.
+    """
+
+    def __init__(self, pool: ConnectionPool, debuglevel: int = 0, context=None):
+        urllib.request.HTTPSHandler.__init__(self, debuglevel, context=context)
+        self.__pool = pool
+
+    def __connection(self, key, http_class, req, http_conn_args) \
+            -> tuple[http.client.HTTPConnection, bool]:
+        connection = self.__pool.acquire(key)
+        if connection is not None:
+            connection.timeout = req.timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(
+                    socket.getdefaulttimeout()
+                    if req.timeout is socket._GLOBAL_DEFAULT_TIMEOUT
+                    else req.timeout
+                )
+            return connection, True
+
+        connection = http_class(req.host, timeout=req.timeout, **http_conn_args)
+        connection.set_debuglevel(self._debuglevel)
+        connection.response_class = _PooledHTTPResponse
+        return connection, False
+
+    def do_open(self, http_class, req, **http_conn_args):
+        if not req.host:
+            raise urllib.error.URLError('no host given')
+        if req._tunnel_host:
+            # connections through proxy tunnels are not pooled
+            return super().do_open(http_class, req, **http_conn_args)
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items() if k not in headers})
+        headers['Connection'] = 'keep-alive'
+        headers = {name.title(): val for name, val in headers.items()}
+
+        key = req.type, req.host
+        while True:
+            connection, reused = self.__connection(key, http_class, req, http_conn_args)
+            sent = False
+            try:
+                try:
+                    connection.request(
+                        req.get_method(),
+                        req.selector,
+                        req.data,
+                        headers,
+                        encode_chunked=req.has_header('Transfer-encoding')
+                    )
+                except OSError as e:
+                    if reused and isinstance(e, STALE_CONNECTION_ERRORS):
+                        raise
+                    raise urllib.error.URLError(e)
+                sent = True
+                response = connection.getresponse()
+            except STALE_CONNECTION_ERRORS as e:
+                connection.close()
+                if not reused:
+                    raise
+                if sent and req.get_method() not in RESENDABLE_METHODS:
+                    logger.warning(
+                        f'reused connection to {req.host!r} was closed after'
+                        f' {req.get_method()} was sent, which is not sent again: {e!r}'
+                    )
+                    raise urllib.error.URLError(e)
+                logger.debug(f'reused connection to {req.host!r} was closed: {e!r}')
+                self.__pool.count_stale(key)
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            break
+
+        self.__pool.count(key, reused=reused)
+        response._release = functools.partial(self.__pool.release, key, connection)
+        response.url = req.get_full_url()
+        response.msg = response.reason
+        if response.length == 0:
+            # nothing to read, like 304 which is raised as `HTTPError` and never read;
+            # the connection goes back now instead of waiting for the response closed
+            response.read()
+        return response
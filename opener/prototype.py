@@ -23,6 +23,10 @@ class URLOpenerPrototype:
     def create_header(self) -> dict:
         ...
 
+    def auth_scope(self) -> str:
+        # responses are cached per scope, so that users never see others' responses
+        return ''
+
     def urlopen(self, url_or_req: Union[str, urllib.request.Request]):
         ...
 
@@ -0,0 +1,259 @@
+import collections
+import http
+import http.client
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+from typing import NamedTuple, Optional, Callable, TypeVar
+
+import app_logging
+import metrics
+from .limiter import parse_retry_after
+
+logger = app_logging.create_logger()
+
+T = TypeVar('T')
+
+# responses telling that the same request may succeed later
+TRANSIENT_STATUSES = frozenset({
+    http.HTTPStatus.REQUEST_TIMEOUT.value,
+    http.HTTPStatus.TOO_EARLY.value,
+    http.HTTPStatus.TOO_MANY_REQUESTS.value,
+    http.HTTPStatus.INTERNAL_SERVER_ERROR.value,
+    http.HTTPStatus.BAD_GATEWAY.value,
+    http.HTTPStatus.SERVICE_UNAVAILABLE.value,
+    http.HTTPStatus.GATEWAY_TIMEOUT.value,
+})
+
+# errors of the connection rather than of the request; `ConnectionError` includes
+# connection resets and servers closing the connection without a response
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError, socket.gaierror, http.client.IncompleteRead)
+
+
+class CircuitOpenError(urllib.error.URLError):
+    """
+    Request not sent because its domain has failed repeatedly.
+    """
+
+    def __init__(self, domain: str, retry_after: float):
+        super().__init__(f'circuit of {domain!r} is open for {retry_after:.3f} more seconds')
+        self.domain = domain
+        self.retry_after = retry_after
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """
+    Whether the request failing with `e` may succeed if it is sent again later.
+    Errors of the request itself, like 404, `FileNotFoundError` of the disk and the
+    memory openers or `ResponseTooLargeError`, are permanent.
+    """
+    if isinstance(e, CircuitOpenError):
+        return True
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code in TRANSIENT_STATUSES
+    if isinstance(e, urllib.error.URLError):
+        # the reason is the error of the connection, or a string for invalid requests
+        return isinstance(e.reason, TRANSIENT_ERRORS)
+    return isinstance(e, TRANSIENT_ERRORS)
+
+
+class RetryPolicy(NamedTuple):
+    """
+    Attempts of a request failing with transient errors. The n-th retry waits a
+    random time up to `base_delay * multiplier ** (n - 1)` seconds capped by
+    `max_delay` (full jitter), or longer if the response asked so by `Retry-After`.
+    """
+    max_attempts: int = 4
+    base_delay: float = 2.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+
+    def delay(self, retry_count: int, random_value: float) -> float:
+        return random_value * min(
+            self.max_delay,
+            self.base_delay * self.multiplier ** (retry_count - 1)
+        )
+
+
+class CircuitBreakerPolicy(NamedTuple):
+    """
+    A domain failing `failure_threshold` times in a row with transient errors is not
+    sent any request for `reset_timeout` seconds. Then a single trial request is sent,
+    whose success closes the circuit again and whose failure opens it again.
+    """
+    failure_threshold: int = 5
+    reset_timeout: float = 60.0
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, policy: CircuitBreakerPolicy):
+        self.policy = policy
+        self.state = self.CLOSED
+        self.__failure_count = 0
+        self.__opened_time = 0.0
+        self.__trial_in_flight = False
+
+    def allow(self, now: float) -> Optional[float]:
+        """
+        None if a request may be sent now, otherwise the seconds until the circuit
+        lets a trial request through.
+        """
+        if self.state == self.OPEN:
+            remaining = self.__opened_time + self.policy.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = self.HALF_OPEN
+            self.__trial_in_flight = False
+        if self.state == self.HALF_OPEN:
+            if self.__trial_in_flight:
+                return self.policy.reset_timeout
+            self.__trial_in_flight = True
+        return None
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.__failure_count = 0
+        self.__trial_in_flight = False
+
+    def record_failure(self, now: float) -> bool:
+        """
+        Count a transient failure; True if it opened the circuit.
+        """
+        self.__failure_count += 1
+        if self.state == self.HALF_OPEN \
+                or self.__failure_count >= self.policy.failure_threshold:
+            opened = self.state != self.OPEN
+            self.state = self.OPEN
+            self.__opened_time = now
+            self.__trial_in_flight = False
+            return opened
+        return False
+
+
+class URLRetrier:
+    """
+    Retries requests failing with transient errors and breaks the circuit of domains
+    failing repeatedly. Every attempt is a new call of the request, so an opener with
+    `URLRateLimiter` spaces the retries by the rate of the domain, which the failures
+    also slow down.
+    """
+
+    def __init__(
+            self,
+            policy: RetryPolicy = RetryPolicy(),
+            *,
+            breaker_policy: CircuitBreakerPolicy = CircuitBreakerPolicy(),
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+            random_value: Callable[[], float] = random.random
+    ):
+        logger.info(f'initialized with {policy=}, {breaker_policy=}')
+        self.__policy = policy
+        self.__breaker_policy = breaker_policy
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__random_value = random_value
+        self.__breakers: dict[str, CircuitBreaker] = {}
+        self.__counts = collections.Counter()
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def __domain_of(cls, url: str) -> str:
+        return urllib.parse.urlparse(url).netloc
+
+    def __breaker(self, domain: str) -> CircuitBreaker:
+        breaker = self.__breakers.get(domain)
+        if breaker is None:
+            breaker = self.__breakers[domain] = CircuitBreaker(self.__breaker_policy)
+        return breaker
+
+    def state_of(self, url: str) -> str:
+        domain = self.__domain_of(url)
+        with self.__lock:
+            return self.__breaker(domain).state
+
+    def __delay(self, retry_count: int, e: Exception) -> float:
+        delay = self.__policy.delay(retry_count, self.__random_value())
+        if isinstance(e, urllib.error.HTTPError) and e.headers is not None:
+            retry_after = parse_retry_after(e.headers.get('Retry-After'), now=time.time())
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
+
+    def call(self, url: str, func: Callable[[], T]) -> T:
+        """
+        Call `func` sending the request of `url` until it succeeds, fails with a
+        permanent error or runs out of attempts; the error of the last attempt is
+        raised. Raises `CircuitOpenError` without calling `func` if the circuit of
+        the domain is open.
+        """
+        domain = self.__domain_of(url)
+        retry_count = 0
+        while True:
+            with self.__lock:
+                wait_seconds = self.__breaker(domain).allow(self.__clock())
+                self.__counts['rejected' if wait_seconds is not None else 'attempts'] += 1
+            if wait_seconds is not None:
+                metrics.increment('opener_circuit_rejections_total', domain=domain)
+                raise CircuitOpenError(domain, wait_seconds)
+
+            try:
+                result = func()
+            except Exception as e:
+                transient = is_transient_error(e)
+                with self.__lock:
+                    breaker = self.__breaker(domain)
+                    if transient:
+                        opened = breaker.record_failure(self.__clock())
+                        self.__counts['failures'] += 1
+                    else:
+                        # the domain is answering, only not to this request
+                        breaker.record_success()
+                        opened = False
+                if opened:
+                    logger.warning(
+                        f'circuit of {domain!r} opened for'
+                        f' {self.__breaker_policy.reset_timeout:.3f} seconds by {e!r}'
+                    )
+                    metrics.increment('opener_circuit_opened_total', domain=domain)
+
+                retry_count += 1
+                if not transient or opened or retry_count >= self.__policy.max_attempts:
+                    raise
+                delay = self.__delay(retry_count, e)
+                logger.warning(
+                    f'{e!r} while opening {url!r}, retrying in {delay:.3f} seconds'
+                    f' ({retry_count}/{self.__policy.max_attempts - 1})'
+                )
+                metrics.increment('opener_retries_total', domain=domain, error=type(e).__name__)
+                if isinstance(e, urllib.error.HTTPError):
+                    # gives the connection of the error response back to the pool
+                    e.close()
+                with self.__lock:
+                    self.__counts['retries'] += 1
+                self.__sleep(delay)
+                continue
+
+            with self.__lock:
+                self.__breaker(domain).record_success()
+            return result
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            return {
+                'retry_attempt_count': self.__counts['attempts'],
+                'retry_retried_count': self.__counts['retries'],
+                'retry_failure_count': self.__counts['failures'],
+                'retry_rejected_count': self.__counts['rejected'],
+                'retry_circuit_states': {
+                    domain: breaker.state
+                    for domain, breaker in self.__breakers.items()
+                },
+            }
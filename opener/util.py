@@ -1,20 +1,375 @@
+import http
+import io
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from email.message import Message
+from typing import NamedTuple, Optional, Iterable, BinaryIO, Callable, TypeVar, TYPE_CHECKING
+
 import bs4
 
-from .prototype import RequestLike, URLOpenerPrototype
+import app_logging
+import metrics
+from .prototype import RequestLike, URLOpenerPrototype, extract_url_from_request_like
+from .retry import URLRetrier
+
+if TYPE_CHECKING:
+    from .cache import ResponseCache
+
+logger = app_logging.create_logger()
+
+T = TypeVar('T')
+
+
+class Validators(NamedTuple):
+    """
+    Cache validators of a response which let the next request of the url be answered
+    with `304 Not Modified`.
+    """
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @classmethod
+    def from_headers(cls, headers: Optional[Message]) -> Optional['Validators']:
+        if headers is None:
+            return None
+        validators = cls(
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified')
+        )
+        if validators.etag is None and validators.last_modified is None:
+            return None
+        return validators
+
+    def create_header(self) -> dict:
+        header = {}
+        if self.etag is not None:
+            header['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            header['If-Modified-Since'] = self.last_modified
+        return header
+
+
+class ConditionalResponse(NamedTuple):
+    # None if the content is not modified since the validators sent
+    string: Optional[str]
+    validators: Optional[Validators]
+
+    @property
+    def not_modified(self) -> bool:
+        return self.string is None
+
+
+# headers describing the transfer rather than the decoded body which archives and
+# caches store; cookies are never stored
+UNSTORED_HEADERS = frozenset({
+    'connection',
+    'content-encoding',
+    'content-length',
+    'keep-alive',
+    'set-cookie',
+    'transfer-encoding',
+})
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+# bodies larger than this are spilled to a temporary file
+DEFAULT_SPILL_THRESHOLD = 1 << 22
+
+
+class ResponseTooLargeError(ValueError):
+    pass
+
+
+def iter_response_chunks(
+        res,
+        *,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_size: Optional[int] = None
+) -> Iterable[bytes]:
+    """
+    Read the body of `res` in chunks of `chunk_size` bytes at most. Raises
+    `ResponseTooLargeError` as soon as the body is known to exceed `max_size` bytes.
+    """
+    headers = getattr(res, 'headers', None)
+    content_length = headers.get('Content-Length') if headers is not None else None
+    # a compressed body is larger than the length on the wire
+    if max_size is not None and content_length is not None and content_length.isdigit() \
+            and headers.get('Content-Encoding') in (None, 'identity') \
+            and int(content_length) > max_size:
+        raise ResponseTooLargeError(
+            f'response of {content_length} bytes exceeds {max_size} bytes'
+        )
+
+    size = 0
+    while True:
+        chunk = res.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise ResponseTooLargeError(f'response exceeds {max_size} bytes')
+        yield chunk
+
+
+class ResponseBody:
+    """
+    Response body held in memory up to `spill_threshold` bytes and in an anonymous
+    temporary file above it, so that large bodies are never held as a whole unless
+    asked by `read_bytes` or `read_string`.
+    """
+
+    def __init__(self, *, spill_threshold: int = DEFAULT_SPILL_THRESHOLD):
+        self.__spill_threshold = spill_threshold
+        self.__file: BinaryIO = io.BytesIO()
+        self.__spilled = False
+        self.__size = 0
+
+    @classmethod
+    def from_file(cls, fp: BinaryIO, size: int) -> 'ResponseBody':
+        """
+        Body of `size` bytes stored in the file `fp`, which the body closes.
+        """
+        body = cls()
+        body.__file.close()
+        body.__file = fp
+        body.__spilled = True
+        body.__size = size
+        return body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def spilled(self) -> bool:
+        return self.__spilled
+
+    def write(self, chunk: bytes) -> None:
+        if not self.__spilled and self.__size + len(chunk) > self.__spill_threshold:
+            spill_file = tempfile.TemporaryFile()
+            with self.__file.getbuffer() as buffer:
+                spill_file.write(buffer)
+            self.__file.close()
+            self.__file = spill_file
+            self.__spilled = True
+        self.__file.write(chunk)
+        self.__size += len(chunk)
+
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterable[bytes]:
+        self.__file.seek(0)
+        while True:
+            chunk = self.__file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def copy_to(self, fp: BinaryIO) -> None:
+        self.__file.seek(0)
+        shutil.copyfileobj(self.__file, fp, DEFAULT_CHUNK_SIZE)
+
+    def read_bytes(self) -> bytes:
+        if not self.__spilled:
+            return self.__file.getvalue()
+        self.__file.seek(0)
+        return self.__file.read()
+
+    def read_string(self, encoding: str) -> str:
+        if not self.__spilled:
+            # decoded straight from the buffer without copying it into `bytes` first
+            with self.__file.getbuffer() as buffer:
+                return str(buffer, encoding)
+        self.__file.seek(0)
+        return self.__file.read().decode(encoding)
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class _OpenedBody(NamedTuple):
+    body: ResponseBody
+    headers: Optional[Message]
+    # served by `ResponseCache` without sending the request
+    cached: bool
 
 
 class URLOpenerUtilMethodsMixin(URLOpenerPrototype):
-    def urlopen_bytes(self, url_or_req: RequestLike):
+    def __init__(
+            self,
+            *,
+            retrier: Optional[URLRetrier] = None,
+            cache: Optional['ResponseCache'] = None,
+            **kwargs
+    ):
+        super().__init__(**kwargs)
+
+        self.__retrier = retrier
+        self.__cache = cache
+
+    def _call_with_retries(self, url_or_req: RequestLike, func: Callable[[], T]) -> T:
+        # a request opened and read by `func` is sent again on transient errors
+        if self.__retrier is None:
+            return func()
+        return self.__retrier.call(extract_url_from_request_like(url_or_req), func)
+
+    def retry_stats(self) -> dict[str, object]:
+        return self.__retrier.stats() if self.__retrier is not None else {}
+
+    def cache_stats(self) -> dict[str, object]:
+        return self.__cache.stats() if self.__cache is not None else {}
+
+    def urlopen_chunks(
+            self,
+            url_or_req: RequestLike,
+            *,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            max_size: Optional[int] = None
+    ) -> Iterable[bytes]:
+        # not retried; a part of the body may have been consumed before an error
         with self.urlopen(url_or_req) as res:
-            return res.read()
+            yield from iter_response_chunks(res, chunk_size=chunk_size, max_size=max_size)
+
+    @staticmethod
+    def _read_body(
+            res,
+            *,
+            max_size: Optional[int],
+            spill_threshold: int
+    ) -> ResponseBody:
+        body = ResponseBody(spill_threshold=spill_threshold)
+        try:
+            for chunk in iter_response_chunks(res, max_size=max_size):
+                body.write(chunk)
+        except BaseException:
+            body.close()
+            raise
+        metrics.increment('opener_response_bytes_total', body.size)
+        return body
+
+    def __open_body(
+            self,
+            url_or_req: RequestLike,
+            *,
+            max_size: Optional[int],
+            spill_threshold: int
+    ) -> _OpenedBody:
+        url = extract_url_from_request_like(url_or_req)
+        cacheable = self.__cache is not None and not (
+                isinstance(url_or_req, urllib.request.Request) and url_or_req.data is not None
+        )
+
+        if cacheable:
+            cached = self.__cache.get(url, auth_scope=self.auth_scope())
+            if cached is not None:
+                if max_size is not None and cached.body.size > max_size:
+                    cached.body.close()
+                    raise ResponseTooLargeError(f'response exceeds {max_size} bytes')
+                return _OpenedBody(body=cached.body, headers=cached.headers, cached=True)
+
+        def open_and_read() -> tuple[ResponseBody, Optional[Message]]:
+            with self.urlopen(url_or_req) as res:
+                with metrics.timer('opener_read_seconds'):
+                    read_body = self._read_body(
+                        res,
+                        max_size=max_size,
+                        spill_threshold=spill_threshold
+                    )
+                return read_body, getattr(res, 'headers', None)
+
+        body, headers = self._call_with_retries(url_or_req, open_and_read)
+        if cacheable:
+            try:
+                self.__cache.put(url, auth_scope=self.auth_scope(), headers=headers, body=body)
+            except BaseException:
+                body.close()
+                raise
+        return _OpenedBody(body=body, headers=headers, cached=False)
+
+    def urlopen_body(
+            self,
+            url_or_req: RequestLike,
+            *,
+            max_size: Optional[int] = None,
+            spill_threshold: int = DEFAULT_SPILL_THRESHOLD
+    ) -> ResponseBody:
+        """
+        Read the body of the response into a `ResponseBody`, which the caller closes.
+        With a `ResponseCache`, responses of GET requests are served from it while
+        they live.
+        """
+        return self.__open_body(
+            url_or_req,
+            max_size=max_size,
+            spill_threshold=spill_threshold
+        ).body
 
-    def urlopen_string(self, url_or_req: RequestLike):
-        return self.urlopen_bytes(url_or_req).decode(self.RESPONSE_ENCODING)
+    def urlopen_bytes(self, url_or_req: RequestLike, *, max_size: Optional[int] = None):
+        with self.urlopen_body(url_or_req, max_size=max_size) as body:
+            return body.read_bytes()
+
+    def urlopen_string(self, url_or_req: RequestLike, *, max_size: Optional[int] = None):
+        with self.urlopen_body(url_or_req, max_size=max_size) as body:
+            return body.read_string(self.RESPONSE_ENCODING)
 
     def urlopen_string_and_soup(self, url_or_req: RequestLike):
         string = self.urlopen_string(url_or_req)
         return string, bs4.BeautifulSoup(string, features='lxml')
 
+    def urlopen_string_conditionally(
+            self,
+            url: str,
+            *,
+            validators: Optional[Validators] = None,
+            max_size: Optional[int] = None
+    ) -> ConditionalResponse:
+        """
+        Open `url` with `If-None-Match` and `If-Modified-Since` of `validators`, so the
+        body is not transferred if it is not modified since. Bodies over `max_size`
+        bytes raise `ResponseTooLargeError`. A response served from the cache with the
+        same validators is not modified either.
+        """
+        req = urllib.request.Request(
+            extract_url_from_request_like(url),
+            headers=validators.create_header() if validators is not None else {}
+        )
+
+        try:
+            body, headers, cached = self.__open_body(
+                req,
+                max_size=max_size,
+                spill_threshold=DEFAULT_SPILL_THRESHOLD
+            )
+        except urllib.error.HTTPError as e:
+            if e.code != http.HTTPStatus.NOT_MODIFIED:
+                raise
+            metrics.increment('opener_responses_total', status=e.code)
+            return ConditionalResponse(
+                string=None,
+                validators=Validators.from_headers(e.headers) or validators
+            )
+
+        response_validators = Validators.from_headers(headers)
+        if cached and validators is not None and response_validators == validators:
+            body.close()
+            return ConditionalResponse(string=None, validators=validators)
+
+        if not cached:
+            metrics.increment('opener_responses_total', status=http.HTTPStatus.OK.value)
+        with body, metrics.timer('opener_decode_seconds'):
+            string = body.read_string(self.RESPONSE_ENCODING)
+
+        return ConditionalResponse(
+            string=string,
+            validators=response_validators
+        )
+
     # TODO: use urlopen_soup on sso-login
     def urlopen_soup(self, url_or_req: RequestLike):
         string, soup = self.urlopen_string_and_soup(url_or_req)
@@ -24,4 +379,8 @@ class URLOpenerUtilMethodsMixin(URLOpenerPrototype):
         super()._enter_handler()
 
     def _exit_handler(self) -> None:
+        if self.__retrier is not None:
+            logger.info(f'retries: {self.retry_stats()}')
+        if self.__cache is not None:
+            logger.info(f'response cache: {self.cache_stats()}')
         super()._exit_handler()
@@ -1,9 +1,14 @@
+import os
+
 import app_logging
 import model.scrape
 import worker.scrape
 
 logger = app_logging.create_logger()
 
+# pages are parsed by a pool of this many processes if set
+PARSE_WORKER_COUNT = int(os.environ.get('SCRAPER_PARSE_WORKERS') or 0) or None
+
 session_context = model.create_session_context()
 
 
@@ -14,16 +19,18 @@ def main():
 
     mnb = worker.scrape.ManabaScraper(
         session_context=session_context,
-        max_process_count=None
+        max_process_count=None,
+        parse_worker_count=PARSE_WORKER_COUNT
     )
 
     # noinspection PyUnusedLocal
     job = mnb.set_active_job(
         state='finished',
-        order='oldest'
+        order='latest'
     )
 
-    mnb.reset_database()
+    # only the pages changed since the last run are parsed; `reset_database` forces
+    # every page to be parsed again
     mnb.scrape_all()
 
 
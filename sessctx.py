@@ -1,14 +1,51 @@
 import contextlib
 import hashlib
+import time
 from typing import Callable
 from typing import Iterable
 
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
 
 import app_logging
+import metrics
+
+_FLUSH_STARTED_KEY = 'metrics_flush_started'
+_COMMIT_STARTED_KEY = 'metrics_commit_started'
+
+# execution option of the connection telling how its transaction begins
+_BEGIN_MODE_OPTION = 'sqlite_begin_mode'
+
+# seconds a connection waits for the lock of another process before failing
+BUSY_TIMEOUT = 30.0
+
+
+@event.listens_for(Session, 'before_flush')
+def _start_flush_timer(session, flush_context, instances):
+    if metrics.registry.enabled:
+        session.info[_FLUSH_STARTED_KEY] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _stop_flush_timer(session, flush_context):
+    started = session.info.pop(_FLUSH_STARTED_KEY, None)
+    if started is not None:
+        metrics.observe('session_flush_seconds', time.perf_counter() - started)
+
+
+@event.listens_for(Session, 'before_commit')
+def _start_commit_timer(session):
+    if metrics.registry.enabled:
+        session.info[_COMMIT_STARTED_KEY] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def _stop_commit_timer(session):
+    started = session.info.pop(_COMMIT_STARTED_KEY, None)
+    if started is not None:
+        metrics.observe('session_commit_seconds', time.perf_counter() - started)
 
 
 class SessionContext:
@@ -28,8 +65,15 @@ class SessionContext:
         return default
 
     @contextlib.contextmanager
-    def __call__(self, *, do_commit=None) -> Iterable[Session]:
+    def __call__(self, *, do_commit=None, immediate=False) -> Iterable[Session]:
+        """
+        Session committed at the end unless `do_commit` is false. An `immediate`
+        session takes the write lock of the database as it begins, so that it never
+        fails to upgrade its read to a write after another process has written.
+        """
         session: Session = self.__session_class()
+        if immediate:
+            session.connection(execution_options={_BEGIN_MODE_OPTION: 'IMMEDIATE'})
         session_index = hashlib.sha3_256(str(session).encode('utf-8')).hexdigest()[-8:]
         session_index = f'0x{session_index.upper()}'
         do_commit_final = self.__eval_prioritized_values(
@@ -53,15 +97,45 @@ class SessionContext:
             session.close()
             self.logger.debug(f'session {self.__name} {session_index} CLOSED')
 
+    @staticmethod
+    def __configure_sqlite_engine(engine: Engine) -> None:
+        # other processes may share the database; WAL lets readers go on while a writer
+        # holds the lock, and writers wait for each other instead of failing at once.
+        # pysqlite's own implicit BEGIN is disabled so that `_BEGIN_MODE_OPTION` can
+        # take the write lock at the beginning of a transaction.
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute(f'PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000):d}')
+            cursor.close()
+
+        @event.listens_for(engine, 'begin')
+        def on_begin(connection):
+            mode = connection.get_execution_options().get(_BEGIN_MODE_OPTION, 'DEFERRED')
+            connection.exec_driver_sql(f'BEGIN {mode}')
+
     @classmethod
-    def create_session_class(cls, db_path: str, base) -> Callable[..., Session]:
+    def create_session_class(
+            cls,
+            db_path: str,
+            base,
+            migrate: Callable[[Engine, MetaData], object] = None
+    ) -> Callable[..., Session]:
         engine: Engine = create_engine(f'sqlite:///{db_path}?charset=utf-8')
-        base.metadata.create_all(engine)
+        cls.__configure_sqlite_engine(engine)
+        if migrate is None:
+            base.metadata.create_all(engine)
+        else:
+            # `migrate` creates tables by itself so that it can tell new databases from
+            # existing ones
+            migrate(engine, base.metadata)
         SessionClass = sessionmaker(engine)
         return SessionClass
 
     @classmethod
-    def create_instance(cls, db_path: str, base, **kwargs):
-        SessionClass = cls.create_session_class(db_path, base)
+    def create_instance(cls, db_path: str, base, migrate=None, **kwargs):
+        SessionClass = cls.create_session_class(db_path, base, migrate=migrate)
         cls.logger.info(f'session context created: {db_path=}, {base=}, {kwargs=}')
         return cls(SessionClass, name=db_path, **kwargs)
@@ -0,0 +1,281 @@
+"""
+End-to-end crawl benchmark on synthetic sites served by `opener.MemoryURLOpener`.
+
+    python -m test.benchmark_crawl --sizes 1000 10000 --output benchmark.json
+    python -m test.benchmark_crawl --sizes 1000 --baseline benchmark.json
+
+Every case runs in its own process so that its peak RSS is not inflated by the cases
+before it. Results are written as JSON; with `--baseline`, pages/sec of the cases found
+in the baseline are compared and the exit status is 1 if any of them regressed by more
+than `--tolerance`.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import NamedTuple
+
+from sqlalchemy import event, func, distinct
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import app_logging
+import meas
+import model
+import model.crawl
+import opener
+
+try:
+    from .crawl_site import SiteCrawler, ROOT_URL
+    from .generate_html import create_html
+except ImportError:
+    from crawl_site import SiteCrawler, ROOT_URL
+    from generate_html import create_html
+
+logger = app_logging.create_logger()
+
+MODES = 'session', 'sequential', 'concurrent'
+STORAGES = 'graph', 'task'
+
+
+class BenchmarkCase(NamedTuple):
+    num_pages: int
+    mode: str
+    storage: str
+    num_links_mean: float
+    seed: int
+    max_time: float
+
+    @property
+    def name(self) -> str:
+        return f'{self.storage}-{self.mode}-{self.num_pages}'
+
+
+def generate_site(
+        num_pages: int,
+        num_links_mean: float,
+        seed: int
+) -> dict[str, str]:
+    """
+    Generate `num_pages` pages all reachable from `0.html`, linking `num_links_mean`
+    pages on average. Links to a tenth more pages than exist, so missing pages are
+    crawled as well.
+    """
+    rand = random.Random(seed)
+    num_names = num_pages + num_pages // 10
+
+    links = [[] for _ in range(num_pages)]
+    for i in range(1, num_pages):
+        # a spanning tree keeps every page reachable
+        links[rand.randrange(i)].append(i)
+    for i in range(num_pages):
+        num_extra_links = max(0, round(rand.expovariate(1 / num_links_mean)) - 1)
+        links[i].extend(rand.randrange(num_names) for _ in range(num_extra_links))
+
+    return {
+        f'{ROOT_URL}{i}.html': create_html(f'{i}.html', [f'{j}.html' for j in page_links])
+        for i, page_links in enumerate(links)
+    }
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def count_retrieved_pages(session: Session, *, job: model.crawl.Job) -> int:
+    """
+    Urls retrieved in `job`. Finished tasks are not pages, since the task storage has
+    a task per link rather than per url.
+    """
+    entry_class = model.crawl.storage_of(job).entry_class
+    return session.query(func.count(distinct(entry_class.url_id))).where(
+        entry_class.job_id == job.id,
+        entry_class.page_id.is_not(None)
+    ).scalar()
+
+
+def _crawl_once(case: BenchmarkCase, files: dict[str, bytes]) -> dict[str, object]:
+    with tempfile.TemporaryDirectory() as dir_path:
+        db_path = os.path.join(dir_path, 'benchmark.db')
+        session_context = model.create_session_context(db_path)
+        model.crawl.lookup_cache.clear()
+
+        with opener.MemoryURLOpener(files=files) as url_opener:
+            crawler = SiteCrawler(session_context=session_context, url_opener=url_opener)
+            crawler.initialize_tasks([f'{ROOT_URL}0.html'], storage=case.storage)
+
+            query_counter = _QueryCounter()
+            event.listen(Engine, 'before_cursor_execute', query_counter)
+            try:
+                start = time.perf_counter()
+                if case.mode == 'session':
+                    crawler.crawl_in_session(crawler.RESUME_LATEST)
+                elif case.mode == 'sequential':
+                    crawler.crawl(resume_state=crawler.RESUME_LATEST)
+                elif case.mode == 'concurrent':
+                    crawler.crawl_concurrently(crawler.RESUME_LATEST, worker_count=4)
+                else:
+                    raise ValueError(f'unknown mode {case.mode!r}')
+                elapsed = time.perf_counter() - start
+            finally:
+                event.remove(Engine, 'before_cursor_execute', query_counter)
+
+        with session_context(do_commit=False) as session:
+            job = model.crawl.Job.get_job(session, state='finished', order='latest')
+            num_crawled = count_retrieved_pages(session, job=job)
+
+        return dict(
+            elapsed=elapsed,
+            crawled_count=num_crawled,
+            query_count=query_counter.count,
+            db_bytes=sum(
+                os.path.getsize(os.path.join(dir_path, name))
+                for name in os.listdir(dir_path)
+            )
+        )
+
+
+def run_case(case: BenchmarkCase) -> dict[str, object]:
+    app_logging.set_level(app_logging.WARNING)
+
+    files = {
+        url: html.encode(opener.MemoryURLOpener.RESPONSE_ENCODING)
+        for url, html in generate_site(case.num_pages, case.num_links_mean, case.seed).items()
+    }
+
+    # the timer decides how many runs fit in `max_time`; throughput is of the crawl
+    # alone, without creating and filling the database of each run
+    elapsed_list = []
+
+    def crawl_once():
+        result = _crawl_once(case, dict(files))
+        elapsed_list.append(result['elapsed'])
+        return result
+
+    timer = meas.Timer(crawl_once)
+    timer.timeit(max_time=case.max_time)
+    (_, report), = timer.iter_reports()
+    last_result = report.last_result
+
+    seconds = statistics.fmean(elapsed_list)
+    return dict(
+        name=case.name,
+        case=case._asdict(),
+        runs=len(elapsed_list),
+        seconds_mean=seconds,
+        seconds_std=statistics.pstdev(elapsed_list),
+        crawled_count=last_result['crawled_count'],
+        pages_per_second=last_result['crawled_count'] / seconds,
+        queries_per_page=last_result['query_count'] / last_result['crawled_count'],
+        db_bytes=last_result['db_bytes'],
+        # peak of the process running this case alone, in kilobytes on Linux
+        process_peak_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    )
+
+
+def compare_with_baseline(
+        results: list[dict],
+        baseline: dict,
+        tolerance: float
+) -> list[str]:
+    baseline_results = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_results.get(result['name'])
+        if baseline_result is None:
+            continue
+        ratio = result['pages_per_second'] / baseline_result['pages_per_second']
+        logger.warning(
+            f'{result["name"]}: {result["pages_per_second"]:,.1f} pages/sec,'
+            f' {ratio:.2f}x of baseline {baseline_result["pages_per_second"]:,.1f};'
+            f' {result["queries_per_page"]:.2f} queries/page'
+            f' (baseline {baseline_result["queries_per_page"]:.2f})'
+        )
+        if ratio < 1 - tolerance:
+            regressions.append(result['name'])
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=['session'])
+    parser.add_argument('--storages', nargs='+', choices=STORAGES, default=list(STORAGES))
+    parser.add_argument('--links-mean', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-time', type=float, default=60.0,
+                        help='seconds to repeat each case for; every case runs 3 times at least')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=None)
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    app_logging.set_level(app_logging.WARNING)
+
+    cases = [
+        BenchmarkCase(
+            num_pages=num_pages,
+            mode=mode,
+            storage=storage,
+            num_links_mean=args.links_mean,
+            seed=args.seed,
+            max_time=args.max_time
+        )
+        for num_pages in args.sizes
+        for mode in args.modes
+        for storage in args.storages
+    ]
+
+    results = []
+    for case in cases:
+        # a fresh process per case keeps its peak RSS its own
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            result = executor.submit(run_case, case).result()
+        logger.warning(
+            f'{result["name"]}: {result["pages_per_second"]:,.1f} pages/sec,'
+            f' {result["queries_per_page"]:.2f} queries/page,'
+            f' {result["process_peak_rss_kib"]:,} KiB process peak RSS, {result["db_bytes"]:,} bytes of db'
+        )
+        results.append(result)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(
+            dict(
+                created=time.time(),
+                python=sys.version,
+                platform=platform.platform(),
+                results=results
+            ),
+            f,
+            indent=2
+        )
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        logger.error(f'regressed cases: {regressions}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
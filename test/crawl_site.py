@@ -0,0 +1,120 @@
+"""
+Crawls of sites generated by `generate_html`, served by `opener.MemoryURLOpener`.
+"""
+
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import model.crawl
+import opener
+import worker.crawl
+from worker.crawl.crawler import AbstractCrawler
+from worker.crawl.page_family import GroupedURL
+
+try:
+    from .generate_html import generate_mapping, iter_htmls_from_mapping
+except ImportError:
+    from generate_html import generate_mapping, iter_htmls_from_mapping
+
+ROOT_URL = 'https://example.invalid/'
+INITIAL_URL = ROOT_URL + '0.html'
+GROUP_NAME = 'page'
+
+
+def generate_site(num_pages: int = 40, seed: int = 1) -> dict[str, str]:
+    """
+    Pages of a site whose links are generated by `generate_mapping`; about as many
+    pages as exist are linked but missing.
+    """
+    mapping = generate_mapping(
+        num_htmls=num_pages,
+        num_links_mean=6,
+        num_links_sigma=4,
+        seed=seed
+    )
+    return {ROOT_URL + name: html for name, html in iter_htmls_from_mapping(mapping)}
+
+
+class SiteCrawler(worker.crawl.OpenerBasedCrawler):
+    def _page_family(self):
+        return None
+
+    def _group_url(self, url: str) -> Optional[GroupedURL]:
+        if not url.startswith(ROOT_URL):
+            return None
+        return GroupedURL(url=url, group_name=GROUP_NAME)
+
+    # noinspection PyMethodOverriding
+    def _iter_next_grouped_urls(self, source_url, document, current_grouped_url, **kwargs):
+        # every page is in the same group, which is not a child of itself
+        for child_grouped_url in AbstractCrawler._iter_next_grouped_urls(
+                self,
+                source_url,
+                document
+        ):
+            if child_grouped_url.url != current_grouped_url.url:
+                yield child_grouped_url
+
+
+def crawl_site(
+        session_context,
+        files: dict[str, str],
+        *,
+        storage: str,
+        mode: str = 'sequential',
+        url_opener: Optional[opener.MemoryURLOpener] = None,
+        **kwargs
+) -> int:
+    """
+    Crawl `files` in a new job of `storage` by the crawling method of `mode`; returns
+    the id of the job.
+    """
+    crawler = SiteCrawler(
+        session_context=session_context,
+        url_opener=url_opener or opener.MemoryURLOpener(files=dict(files))
+    )
+    crawler.initialize_tasks([INITIAL_URL], storage=storage)
+    if mode == 'sequential':
+        crawler.crawl(resume_state=crawler.RESUME_LATEST, **kwargs)
+    elif mode == 'concurrent':
+        crawler.crawl_concurrently(crawler.RESUME_LATEST, **kwargs)
+    elif mode == 'session':
+        crawler.crawl_in_session(crawler.RESUME_LATEST, **kwargs)
+    else:
+        raise ValueError(f'unknown mode {mode!r}')
+
+    with session_context(do_commit=False) as session:
+        return model.crawl.Job.get_job(session, state='finished', order='latest').id
+
+
+def map_urls(session: Session) -> dict[int, Optional[str]]:
+    return dict(session.query(model.crawl.Lookup.id, model.crawl.Lookup.url))
+
+
+def crawled_links(session: Session, *, job_id: int) -> set[tuple[Optional[str], str]]:
+    """
+    `(back_url, url)` of every link of the job; the back url of the roots is None.
+    """
+    job = model.crawl.Job.get_session_by_id(session, job_id=job_id)
+    urls = map_urls(session)
+    return {
+        (urls[back_url_id], urls[url_id])
+        for _, url_id, back_url_id, _ in model.crawl.storage_of(job).iter_edge_rows(
+            session,
+            job=job
+        )
+    }
+
+
+def retrieved_pages(session: Session, *, job_id: int) -> dict[str, Optional[str]]:
+    """
+    Contents of the urls retrieved in the job by url; None for missing pages.
+    """
+    job = model.crawl.Job.get_session_by_id(session, job_id=job_id)
+    entry_class = model.crawl.storage_of(job).entry_class
+    return {
+        entry.lookup.url: entry.page.content
+        for entry in session.query(entry_class).where(entry_class.job_id == job_id)
+        if entry.page is not None
+    }
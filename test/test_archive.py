@@ -0,0 +1,79 @@
+import os
+import tempfile
+import urllib.error
+from unittest import TestCase
+
+import opener
+from opener.prototype import extract_url_from_request_like
+
+ROOT_URL = 'https://example.invalid/'
+FILES = {
+    ROOT_URL + 'index.html': '<a href="page.html">ページ</a>',
+    ROOT_URL + 'page.html': 'page' * 100_000,
+    ROOT_URL + 'empty.html': '',
+}
+
+
+class ErrorMemoryURLOpener(opener.MemoryURLOpener):
+    def urlopen(self, url_or_req):
+        if extract_url_from_request_like(url_or_req).endswith('/forbidden.html'):
+            raise urllib.error.HTTPError(ROOT_URL, 403, 'Forbidden', None, None)
+        return super().urlopen(url_or_req)
+
+
+class TestArchive(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.archive_file_name = os.path.join(self.__temp_dir.name, 'archive.dat')
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _record(self, files: dict[str, str]) -> None:
+        with opener.RecordingURLOpener(
+                url_opener=ErrorMemoryURLOpener(files=dict(files)),
+                archive_file_name=self.archive_file_name
+        ) as url_opener:
+            for url, content in files.items():
+                self.assertEqual(url_opener.urlopen_string(url), content)
+            with self.assertRaises(urllib.error.HTTPError):
+                url_opener.urlopen_string(ROOT_URL + 'forbidden.html')
+            with self.assertRaises(FileNotFoundError):
+                url_opener.urlopen_string(ROOT_URL + 'missing.html')
+
+    def test_replayed(self):
+        self._record(FILES)
+        self._record({ROOT_URL + 'index.html': 'updated'})
+
+        with opener.ReplayURLOpener(archive_file_name=self.archive_file_name) as url_opener:
+            self.assertEqual(url_opener.urlopen_string(ROOT_URL + 'index.html'), 'updated')
+            for url in [ROOT_URL + 'page.html', ROOT_URL + 'empty.html']:
+                self.assertEqual(url_opener.urlopen_string(url), FILES[url])
+
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                url_opener.urlopen_string(ROOT_URL + 'forbidden.html')
+            self.assertEqual(cm.exception.code, 403)
+            with self.assertRaises(FileNotFoundError):
+                url_opener.urlopen_string(ROOT_URL + 'missing.html')
+
+            response = url_opener.urlopen_string_conditionally(ROOT_URL + 'page.html')
+            self.assertEqual(response.string, FILES[ROOT_URL + 'page.html'])
+            response = url_opener.urlopen_string_conditionally(
+                ROOT_URL + 'page.html',
+                validators=response.validators
+            )
+            self.assertTrue(response.not_modified)
+
+    def test_broken_record_ignored(self):
+        self._record(FILES)
+        size = os.path.getsize(self.archive_file_name)
+        with open(self.archive_file_name, 'ab') as f:
+            # a record cut off by a killed recording process
+            f.write(opener.archive.RECORD_HEADER.pack(opener.archive.ARCHIVE_MAGIC, 200, 3, 2, 10))
+
+        reader = opener.ArchiveReader(self.archive_file_name)
+        self.assertEqual(len(reader), len(FILES) + 1)
+        reader.close()
+
+        opener.ArchiveWriter(self.archive_file_name).close()
+        self.assertEqual(os.path.getsize(self.archive_file_name), size)
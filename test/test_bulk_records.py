@@ -0,0 +1,88 @@
+import datetime
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import model
+import model.crawl
+from worker.crawl.page_family import GroupedURL
+
+URLS = [f'https://example.invalid/{i}.html' for i in range(4)]
+TIMESTAMP = datetime.datetime(2021, 4, 1)
+
+
+class TestBulkNewRecords(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'bulk.db')
+        )
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    @classmethod
+    def _map_url_ids(cls, session) -> list[int]:
+        url_ids = model.crawl.Lookup.bulk_lookup_ids(
+            session,
+            urls=[GroupedURL(url=url, group_name='page') for url in URLS]
+        )
+        return [url_ids[url] for url in URLS]
+
+    def test_new_tasks_of_same_timestamp(self):
+        # the tasks are inserted within the resolution of the clock
+        with mock.patch('model.crawl.task.create_timestamp', return_value=TIMESTAMP), \
+                self.session_context() as session:
+            job = model.crawl.Job.get_new_session(session, storage='task')
+            url_ids = self._map_url_ids(session)
+
+            tasks = model.crawl.Task.bulk_new_records(
+                session,
+                job=job,
+                lookups=url_ids[1:3],
+                back_lookup=url_ids[0]
+            )
+            self.assertEqual(sorted(url_id for _, url_id in tasks), url_ids[1:3])
+
+            tasks = model.crawl.Task.bulk_new_records(
+                session,
+                job=job,
+                lookups=url_ids[2:],
+                back_lookup=url_ids[0]
+            )
+            self.assertEqual([url_id for _, url_id in tasks], [url_ids[3]])
+            self.assertEqual(
+                model.crawl.CrawlCounter.values(session, job=job)[
+                    model.crawl.CrawlCounter.UNFINISHED_TASK
+                ],
+                3
+            )
+
+    def test_new_nodes_of_same_timestamp(self):
+        with mock.patch('model.crawl.graph.create_timestamp', return_value=TIMESTAMP), \
+                self.session_context() as session:
+            job = model.crawl.Job.get_new_session(session, storage='graph')
+            url_ids = self._map_url_ids(session)
+
+            nodes = model.crawl.GraphStorage.add_children(
+                session,
+                job=job,
+                lookups=url_ids[1:3],
+                back_lookup=url_ids[0]
+            )
+            self.assertEqual(sorted(url_id for _, url_id in nodes), url_ids[1:3])
+
+            # a node linked from another page is not new
+            nodes = model.crawl.GraphStorage.add_children(
+                session,
+                job=job,
+                lookups=url_ids[2:],
+                back_lookup=url_ids[1]
+            )
+            self.assertEqual([url_id for _, url_id in nodes], [url_ids[3]])
+            self.assertEqual(
+                model.crawl.CrawlCounter.values(session, job=job)[
+                    model.crawl.CrawlCounter.UNFINISHED_TASK
+                ],
+                3
+            )
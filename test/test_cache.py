@@ -0,0 +1,115 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import opener
+from opener.cache import normalize_url
+
+ROOT_URL = 'https://example.invalid/'
+FILES = {
+    ROOT_URL + 'static/a.html': 'a' * 100,
+    ROOT_URL + 'static/b.html': 'b' * 100,
+    ROOT_URL + 'static/c.html': 'c' * 100,
+    ROOT_URL + 'news.html': 'news',
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingMemoryURLOpener(opener.MemoryURLOpener):
+    def __init__(self, *, scope: str = '', **kwargs):
+        super().__init__(**kwargs)
+        self.scope = scope
+        self.open_count = 0
+
+    def auth_scope(self) -> str:
+        return self.scope
+
+    def urlopen(self, url_or_req):
+        self.open_count += 1
+        return super().urlopen(url_or_req)
+
+
+def group_of(url: str):
+    return 'static' if '/static/' in url else 'news'
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _create_opener(self, max_bytes=1 << 20, **kwargs):
+        cache = opener.ResponseCache(
+            os.path.join(self.__temp_dir.name, 'cache'),
+            opener.CachePolicy(group_ttls={'static': 60.0}, max_bytes=max_bytes),
+            group_of=group_of,
+            clock=self.clock
+        )
+        self.addCleanup(cache.close)
+        return CountingMemoryURLOpener(files=dict(FILES), cache=cache, **kwargs)
+
+    def test_served_while_alive(self):
+        url_opener = self._create_opener()
+        url = ROOT_URL + 'static/a.html'
+        for _ in range(3):
+            self.assertEqual(url_opener.urlopen_string(url), FILES[url])
+            self.assertEqual(url_opener.urlopen_string(ROOT_URL + 'news.html'), 'news')
+        self.assertEqual(url_opener.open_count, 4)
+
+        # the cache outlives the opener
+        url_opener = self._create_opener()
+        self.assertEqual(url_opener.urlopen_string(url + '#top'), FILES[url])
+        self.assertEqual(url_opener.open_count, 0)
+
+        self.clock.now += 60.0
+        self.assertEqual(url_opener.urlopen_string(url), FILES[url])
+        self.assertEqual(url_opener.open_count, 1)
+
+        stats = url_opener.cache_stats()
+        self.assertEqual(stats['cache_groups']['static'], {'hit': 1, 'expired': 1, 'store': 1})
+        self.assertEqual(stats['cache_hit_ratio'], 0.5)
+
+    def test_scoped_by_auth(self):
+        url = ROOT_URL + 'static/a.html'
+        self._create_opener(scope='alice').urlopen_string(url)
+        url_opener = self._create_opener(scope='bob')
+        url_opener.urlopen_string(url)
+        self.assertEqual(url_opener.open_count, 1)
+
+    def test_least_recently_used_evicted(self):
+        url_opener = self._create_opener(max_bytes=250)
+        for name in ['a', 'b', 'a', 'c']:
+            self.clock.now += 1.0
+            url_opener.urlopen_string(f'{ROOT_URL}static/{name}.html')
+        self.assertEqual(url_opener.open_count, 3)
+        self.assertEqual(url_opener.cache_stats()['cache_evicted_count'], 1)
+
+        url_opener.urlopen_string(ROOT_URL + 'static/a.html')
+        self.assertEqual(url_opener.open_count, 3)
+        url_opener.urlopen_string(ROOT_URL + 'static/b.html')
+        self.assertEqual(url_opener.open_count, 4)
+
+    def test_not_modified_from_cache(self):
+        url_opener = self._create_opener()
+        url = ROOT_URL + 'static/a.html'
+        response = url_opener.urlopen_string_conditionally(url)
+        self.assertEqual(response.string, FILES[url])
+        response = url_opener.urlopen_string_conditionally(url, validators=response.validators)
+        self.assertTrue(response.not_modified)
+        self.assertEqual(url_opener.open_count, 1)
+
+    def test_url_normalized(self):
+        self.assertEqual(
+            normalize_url('HTTPS://Example.invalid:443/page?b=2&a=1#top'),
+            'https://example.invalid/page?a=1&b=2'
+        )
@@ -0,0 +1,77 @@
+import os
+import tempfile
+from typing import Optional
+from unittest import TestCase
+
+from sqlalchemy import func
+
+import app_logging
+import model
+import model.crawl
+from .crawl_site import generate_site, crawl_site, crawled_links, INITIAL_URL
+
+
+def map_page_ids(session, *, job_id: int) -> dict[str, Optional[int]]:
+    job = model.crawl.Job.get_session_by_id(session, job_id=job_id)
+    entry_class = model.crawl.storage_of(job).entry_class
+    return {
+        entry.lookup.url: entry.page_id
+        for entry in session.query(entry_class).where(entry_class.job_id == job_id)
+    }
+
+
+class TestConditionalCrawl(TestCase):
+    def setUp(self):
+        app_logging.set_level(app_logging.WARNING)
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'conditional.db')
+        )
+        self.files = generate_site()
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _count_pages(self) -> int:
+        with self.session_context(do_commit=False) as session:
+            return session.query(func.count(model.crawl.PageContent.id)).scalar()
+
+    def test_not_modified_pages_reused(self):
+        # the links of a page are copied from the job of its validator, whose storage
+        # may differ from the storage of the job crawling it
+        for first_storage, second_storage in [('task', 'task'), ('graph', 'task')]:
+            with self.subTest(storages=(first_storage, second_storage)):
+                changed_url = INITIAL_URL
+                files = dict(self.files)
+                first_job_id = crawl_site(self.session_context, files, storage=first_storage)
+                page_count = self._count_pages()
+
+                files[changed_url] += '<!-- changed -->'
+                second_job_id = crawl_site(self.session_context, files, storage=second_storage)
+
+                with self.session_context(do_commit=False) as session:
+                    first_page_ids = map_page_ids(session, job_id=first_job_id)
+                    second_page_ids = map_page_ids(session, job_id=second_job_id)
+                    self.assertEqual(second_page_ids.keys(), first_page_ids.keys())
+                    # the links of unchanged pages are copied from the first job
+                    self.assertEqual(
+                        crawled_links(session, job_id=second_job_id),
+                        crawled_links(session, job_id=first_job_id)
+                    )
+
+                    missing_urls = first_page_ids.keys() - files.keys()
+                    for url, page_id in second_page_ids.items():
+                        if url == changed_url or url in missing_urls:
+                            self.assertNotEqual(page_id, first_page_ids[url])
+                        else:
+                            self.assertEqual(page_id, first_page_ids[url])
+
+                    validator = model.crawl.PageValidator.get_record(
+                        session,
+                        lookup=model.crawl.Lookup.lookup_id(session, url=changed_url)
+                    )
+                    self.assertEqual(validator.job_id, second_job_id)
+                    self.assertEqual(validator.page_id, second_page_ids[changed_url])
+
+                # only missing pages, which have no validators, and the changed page
+                self.assertEqual(self._count_pages() - page_count, len(missing_urls) + 1)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import app_logging
+import model
+import model.crawl
+import opener
+from .crawl_site import generate_site, crawl_site, SiteCrawler, INITIAL_URL
+
+
+class InterruptedCrawler(SiteCrawler):
+    """
+    Crawler failing at the retrieval after `page_count` pages.
+    """
+
+    def __init__(self, *args, page_count: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__page_count = page_count
+
+    def _retrieve_task_result(self, *args, **kwargs):
+        if self.__page_count == 0:
+            raise RuntimeError('interrupted')
+        self.__page_count -= 1
+        return super()._retrieve_task_result(*args, **kwargs)
+
+
+class TestCrawlCounters(TestCase):
+    def setUp(self):
+        app_logging.set_level(app_logging.WARNING)
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'counters.db')
+        )
+        self.files = generate_site()
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def assertNoDrift(self):
+        with self.session_context(do_commit=False) as session:
+            self.assertEqual(model.crawl.check_counters(session), {})
+
+    def test_no_drift_after_crawl(self):
+        for storage in model.crawl.STORAGES:
+            with self.subTest(storage=storage):
+                crawl_site(self.session_context, self.files, storage=storage)
+                self.assertNoDrift()
+
+    def test_no_drift_after_rollback(self):
+        for storage in model.crawl.STORAGES:
+            with self.subTest(storage=storage):
+                crawler = InterruptedCrawler(
+                    session_context=self.session_context,
+                    url_opener=opener.MemoryURLOpener(files=dict(self.files)),
+                    page_count=12
+                )
+                crawler.initialize_tasks([INITIAL_URL], storage=storage)
+                # the pages after the last commit are rolled back
+                with self.assertRaises(RuntimeError):
+                    crawler.crawl_in_session(crawler.RESUME_LATEST, commit_interval=5)
+                self.assertNoDrift()
+
+                crawler = SiteCrawler(
+                    session_context=self.session_context,
+                    url_opener=opener.MemoryURLOpener(files=dict(self.files))
+                )
+                crawler.crawl_in_session(crawler.RESUME_LATEST, commit_interval=5)
+                self.assertNoDrift()
+
+    def test_repair(self):
+        job_id = crawl_site(self.session_context, self.files, storage='graph')
+        with self.session_context() as session:
+            counter = session.query(model.crawl.CrawlCounter).filter(
+                model.crawl.CrawlCounter.job_id == job_id,
+                model.crawl.CrawlCounter.name == model.crawl.CrawlCounter.FINISHED_TASK
+            ).one()
+            count = counter.value
+            counter.value += 3
+
+        with self.session_context() as session:
+            self.assertEqual(
+                model.crawl.check_counters(session, repair=True),
+                {(job_id, model.crawl.CrawlCounter.FINISHED_TASK): (count + 3, count)}
+            )
+        self.assertNoDrift()
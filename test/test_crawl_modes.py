@@ -0,0 +1,70 @@
+import os
+import tempfile
+from typing import Optional
+from unittest import TestCase
+
+import app_logging
+import model
+import model.crawl
+from .crawl_site import generate_site, crawl_site, crawled_links, retrieved_pages
+
+
+class TestCrawlModes(TestCase):
+    def setUp(self):
+        app_logging.set_level(app_logging.WARNING)
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.__database_count = 0
+        self.files = generate_site()
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _crawl(
+            self,
+            *,
+            storage: str,
+            **kwargs
+    ) -> tuple[set[tuple[Optional[str], str]], dict[str, Optional[str]]]:
+        """
+        Links and pages of a crawl in a database of its own, so that no page is
+        answered with `304 Not Modified` for an earlier crawl.
+        """
+        self.__database_count += 1
+        session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, f'{self.__database_count}.db')
+        )
+        job_id = crawl_site(session_context, self.files, storage=storage, **kwargs)
+        with session_context(do_commit=False) as session:
+            self.assertEqual(model.crawl.check_counters(session), {})
+            return (
+                crawled_links(session, job_id=job_id),
+                retrieved_pages(session, job_id=job_id)
+            )
+
+    def test_concurrent_crawl(self):
+        for storage in model.crawl.STORAGES:
+            expected = self._crawl(storage=storage)
+            for worker_count in [1, 4]:
+                with self.subTest(storage=storage, worker_count=worker_count):
+                    self.assertEqual(
+                        self._crawl(
+                            storage=storage,
+                            mode='concurrent',
+                            worker_count=worker_count
+                        ),
+                        expected
+                    )
+
+    def test_crawl_in_session(self):
+        for storage in model.crawl.STORAGES:
+            expected = self._crawl(storage=storage)
+            for commit_interval in [1, 7, 1000]:
+                with self.subTest(storage=storage, commit_interval=commit_interval):
+                    self.assertEqual(
+                        self._crawl(
+                            storage=storage,
+                            mode='session',
+                            commit_interval=commit_interval
+                        ),
+                        expected
+                    )
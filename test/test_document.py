@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import bs4
+
+from worker.crawl.document import HTMLDocument, extract_anchor_hrefs
+
+HTML = '''
+<html><body>
+<a href="a.html">a</a>
+<A HREF="b.html">b</A>
+<a>no href</a>
+<a href="">empty</a>
+<!-- <a href="comment.html"> -->
+<p><a href="c.html?x=1&amp;y=2">c<a href=d.html>d</a></p>
+</body></html>
+'''
+
+
+def soup_anchor_hrefs(content: str) -> list[str]:
+    soup = bs4.BeautifulSoup(content, features='lxml')
+    return [
+        tag_anchor.attrs['href']
+        for tag_anchor in soup.find_all('a')
+        if tag_anchor.attrs.get('href') is not None
+    ]
+
+
+class TestAnchorExtraction(TestCase):
+    def test_same_as_soup(self):
+        self.assertEqual(extract_anchor_hrefs(HTML), soup_anchor_hrefs(HTML))
+        self.assertEqual(
+            extract_anchor_hrefs(HTML),
+            ['a.html', 'b.html', '', 'c.html?x=1&y=2', 'd.html']
+        )
+
+    def test_soup_built_lazily(self):
+        document = HTMLDocument(HTML)
+        self.assertEqual(document.anchor_hrefs, soup_anchor_hrefs(HTML))
+        self.assertNotIn('soup', document.__dict__)
+        self.assertEqual(document.soup.find('a').attrs['href'], 'a.html')
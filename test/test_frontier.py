@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from worker.crawl.frontier import FrontierEntry, DepthFirstTaskFrontier, \
+    BreadthFirstTaskFrontier, PriorityTaskFrontier
+from worker.crawl.manaba_family import ManabaPageFamily
+
+
+def create_entries(*group_names: str) -> list[FrontierEntry]:
+    return [
+        FrontierEntry(task_id=i, url_id=i * 10, group_name=group_name)
+        for i, group_name in enumerate(group_names)
+    ]
+
+
+def pop_all(frontier) -> list[int]:
+    task_ids = []
+    while frontier:
+        task_ids.append(frontier.pop().task_id)
+    return task_ids
+
+
+class TestTaskFrontier(TestCase):
+    def test_depth_first_pops_newest(self):
+        frontier = DepthFirstTaskFrontier(create_entries('a', 'b', 'c'))
+        self.assertEqual(pop_all(frontier), [2, 1, 0])
+
+    def test_breadth_first_pops_oldest(self):
+        frontier = BreadthFirstTaskFrontier(create_entries('a', 'b', 'c'))
+        self.assertEqual(pop_all(frontier), [0, 1, 2])
+
+    def test_priority_by_depth(self):
+        frontier = PriorityTaskFrontier.from_page_family(
+            ManabaPageFamily,
+            entries=create_entries(
+                ManabaPageFamily.course_contents_page.name,
+                ManabaPageFamily.course.name,
+                ManabaPageFamily.course_news.name,
+                ManabaPageFamily.course.name,
+            )
+        )
+        self.assertEqual(pop_all(frontier), [1, 3, 2, 0])
+
+    def test_priority_by_group_priorities(self):
+        frontier = PriorityTaskFrontier.from_page_family(
+            ManabaPageFamily,
+            group_priorities={ManabaPageFamily.course_news.name: 1},
+            entries=create_entries(
+                ManabaPageFamily.course_list.name,
+                ManabaPageFamily.course_news.name,
+                ManabaPageFamily.course_contents_list.name,
+            )
+        )
+        self.assertEqual(pop_all(frontier), [1, 0, 2])
+
+    def test_page_group_depth(self):
+        self.assertEqual(ManabaPageFamily.course_list.depth, 0)
+        self.assertEqual(ManabaPageFamily.course_contents_page.depth, 4)
@@ -0,0 +1,133 @@
+import collections
+import os
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import func
+
+import app_logging
+import model
+import model.crawl
+from .crawl_site import generate_site, crawl_site, crawled_links, retrieved_pages, \
+    map_urls, INITIAL_URL
+
+
+def traverse(session, *, job_id: int) -> set[tuple[str, str]]:
+    """
+    Links found by walking from `iter_roots` along `iter_next`, expanding every url once.
+    """
+    job = model.crawl.Job.get_session_by_id(session, job_id=job_id)
+    storage = model.crawl.storage_of(job)
+    links = set()
+    expanded_urls = set()
+    stack = list(storage.iter_roots(session, job=job))
+    while stack:
+        entry = stack.pop()
+        if entry.lookup.url in expanded_urls:
+            continue
+        expanded_urls.add(entry.lookup.url)
+        for next_entry in storage.iter_next(session, base_entry=entry):
+            links.add((entry.lookup.url, next_entry.lookup.url))
+            stack.append(next_entry)
+    return links
+
+
+class TestGraphStorage(TestCase):
+    def setUp(self):
+        app_logging.set_level(app_logging.WARNING)
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'graph.db')
+        )
+        self.files = generate_site()
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def test_node_per_url(self):
+        job_id = crawl_site(self.session_context, self.files, storage='graph')
+        with self.session_context(do_commit=False) as session:
+            url_ids = [
+                url_id for url_id, in session.query(model.crawl.CrawlNode.url_id).where(
+                    model.crawl.CrawlNode.job_id == job_id
+                )
+            ]
+            self.assertEqual(len(url_ids), len(set(url_ids)))
+            # every page linked is retrieved, existing or not
+            linked_urls = {url for _, url in crawled_links(session, job_id=job_id)}
+            self.assertEqual(set(retrieved_pages(session, job_id=job_id)), linked_urls)
+
+    def test_edges_deduplicated(self):
+        job_id = crawl_site(self.session_context, self.files, storage='graph')
+        with self.session_context() as session:
+            edge_count = session.query(func.count(model.crawl.CrawlEdge.id)).scalar()
+            urls = map_urls(session)
+            back_url_id, url_ids = next(
+                (back_url_id, url_ids)
+                for back_url_id, url_ids in self.__map_links(session, job_id=job_id).items()
+                if urls[back_url_id] is not None
+            )
+
+            inserted_count = model.crawl.CrawlEdge.bulk_new_records(
+                session,
+                job=job_id,
+                lookups=url_ids + url_ids,
+                back_lookup=back_url_id
+            )
+            new_nodes = model.crawl.GraphStorage.add_children(
+                session,
+                job=job_id,
+                lookups=url_ids,
+                back_lookup=back_url_id
+            )
+
+            self.assertEqual(inserted_count, 0)
+            self.assertEqual(new_nodes, [])
+            self.assertEqual(
+                session.query(func.count(model.crawl.CrawlEdge.id)).scalar(),
+                edge_count
+            )
+
+    @classmethod
+    def __map_links(cls, session, *, job_id: int) -> dict[int, list[int]]:
+        links = collections.defaultdict(list)
+        for edge in session.query(model.crawl.CrawlEdge).where(
+                model.crawl.CrawlEdge.job_id == job_id
+        ):
+            links[edge.back_url_id].append(edge.url_id)
+        return links
+
+    def test_same_traversal_as_task_storage(self):
+        job_ids = {
+            storage: crawl_site(self.session_context, self.files, storage=storage)
+            for storage in ('task', 'graph')
+        }
+        with self.session_context(do_commit=False) as session:
+            links = {
+                storage: crawled_links(session, job_id=job_id)
+                for storage, job_id in job_ids.items()
+            }
+            self.assertEqual(links['graph'], links['task'])
+            self.assertIn((None, INITIAL_URL), links['graph'])
+
+            traversed_links = {
+                storage: traverse(session, job_id=job_id)
+                for storage, job_id in job_ids.items()
+            }
+            self.assertEqual(traversed_links['graph'], traversed_links['task'])
+            self.assertEqual(
+                traversed_links['graph'],
+                {link for link in links['graph'] if link[0] is not None}
+            )
+
+            self.assertEqual(
+                retrieved_pages(session, job_id=job_ids['graph']),
+                retrieved_pages(session, job_id=job_ids['task'])
+            )
+
+    def test_storage_of_job_without_storage(self):
+        with self.session_context() as session:
+            job = model.crawl.Job.get_new_session(session, storage='graph')
+            self.assertIs(model.crawl.storage_of(job), model.crawl.GraphStorage)
+            job.storage = None
+            self.assertIs(model.crawl.storage_of(job), model.crawl.TaskStorage)
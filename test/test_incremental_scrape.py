@@ -0,0 +1,95 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import model
+import model.scrape
+import opener
+import worker.crawl
+import worker.scrape
+from worker.crawl.crawler import AbstractCrawler
+from worker.crawl.manaba_family import ManabaPageFamily
+from worker.crawl.page_family import GroupedURL
+
+ROOT = 'https://example.invalid/'
+GROUP_NAMES = {
+    ROOT + 'courses': ManabaPageFamily.course_list.name,
+    ROOT + 'course': ManabaPageFamily.course.name,
+    ROOT + 'news': ManabaPageFamily.course_news.name,
+}
+
+
+def _create_files(*, news_title: str, with_course: bool = True) -> dict[str, str]:
+    return {
+        ROOT + 'courses':
+            f'<html><body>{"<a href=course>c</a>" if with_course else ""}</body></html>',
+        ROOT + 'course':
+            '<html><body><h1 id="coursename" title="Algorithms"></h1>'
+            '<div class="coursedata-info">2021 前期 月 2時限</div>'
+            '<div class="courseteacher" title="Yamada"></div>'
+            '<a href="news">n</a></body></html>',
+        ROOT + 'news':
+            f'<html><body><h2 class="msg-subject">{news_title}</h2>'
+            '<div class="msg-text">text</div></body></html>',
+    }
+
+
+class GroupedCrawler(worker.crawl.OpenerBasedCrawler):
+    def _page_family(self):
+        return None
+
+    def _group_url(self, url):
+        return GroupedURL(url=url, group_name=GROUP_NAMES[url])
+
+    def _iter_next_grouped_urls(self, source_url, document, **kwargs):
+        return AbstractCrawler._iter_next_grouped_urls(self, source_url, document)
+
+
+class TestIncrementalScrape(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'scrape.db')
+        )
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _crawl_and_scrape(self, files: dict[str, str]) -> dict[str, tuple]:
+        crawler = GroupedCrawler(
+            session_context=self.session_context,
+            url_opener=opener.MemoryURLOpener(files=files)
+        )
+        crawler.initialize_tasks([ROOT + 'courses'])
+        crawler.crawl(resume_state='latest')
+
+        scraper = worker.scrape.ManabaScraper(session_context=self.session_context)
+        scraper.set_active_job(state='finished', order='latest')
+        scraper.scrape_all()
+
+        with self.session_context(do_commit=False) as session:
+            rows = {
+                entry.url: (entry.id, entry.title, entry.course_id)
+                for entry in session.query(model.scrape.CourseNews)
+            }
+            rows.update(
+                (entry.url, (entry.id, entry.name, len(entry.schedules)))
+                for entry in session.query(model.scrape.Course)
+            )
+            self.assertEqual(session.query(model.scrape.ScrapeSource).count(), len(rows))
+            return rows
+
+    def test_changed_pages_scraped(self):
+        rows = self._crawl_and_scrape(_create_files(news_title='first'))
+        course_id = rows[ROOT + 'course'][0]
+        self.assertEqual(rows[ROOT + 'news'], (rows[ROOT + 'news'][0], 'first', course_id))
+
+        rows = self._crawl_and_scrape(_create_files(news_title='second'))
+        # the course is not parsed again and the news is updated in place
+        self.assertEqual(rows[ROOT + 'course'], (course_id, 'Algorithms', 1))
+        self.assertEqual(rows[ROOT + 'news'][1:], ('second', course_id))
+
+        rows = self._crawl_and_scrape(_create_files(news_title='second', with_course=False))
+        self.assertEqual(rows, {})
+        with self.session_context(do_commit=False) as session:
+            self.assertEqual(session.query(model.scrape.CourseSchedule).count(), 0)
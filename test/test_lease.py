@@ -0,0 +1,98 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import model
+import model.crawl
+from worker.crawl.page_family import GroupedURL
+
+URLS = [f'https://example.invalid/{i}.html' for i in range(3)]
+
+
+class TestCrawlLease(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'lease.db')
+        )
+
+    def tearDown(self):
+        self.__temp_dir.cleanup()
+
+    def _create_job(self, storage_name: str) -> int:
+        with self.session_context() as session:
+            job = model.crawl.Job.get_new_session(session, storage=storage_name)
+            storage = model.crawl.storage_of(job)
+            root_url = GroupedURL(url=URLS[0], group_name='page')
+            storage.add_initial_url(session, job=job, initial_mapped_url=root_url)
+            storage.add_children(
+                session,
+                job=job,
+                lookups=model.crawl.Lookup.bulk_lookup_ids(
+                    session,
+                    urls=[GroupedURL(url=url, group_name='page') for url in URLS[1:]]
+                ).values(),
+                back_lookup=model.crawl.Lookup.lookup_id(session, url=root_url)
+            )
+            return job.id
+
+    def test_entries_claimed_once(self):
+        for storage_name in model.crawl.STORAGES:
+            with self.subTest(storage=storage_name):
+                job_id = self._create_job(storage_name)
+                storage = model.crawl.STORAGES[storage_name]
+
+                claimed_url_ids = []
+                for worker in ['a', 'b', 'a', 'b']:
+                    with self.session_context(immediate=True) as session:
+                        entry = storage.claim_entry(
+                            session,
+                            job=job_id,
+                            worker=worker,
+                            lease_seconds=60
+                        )
+                        if entry is None:
+                            self.assertIsNotNone(
+                                storage.next_lease_expiry(session, job=job_id)
+                            )
+                            continue
+                        self.assertEqual(entry.claimed_by, worker)
+                        claimed_url_ids.append(entry.url_id)
+
+                self.assertEqual(len(claimed_url_ids), len(URLS))
+                self.assertEqual(len(set(claimed_url_ids)), len(URLS))
+
+    def test_expired_lease_claimed_again(self):
+        job_id = self._create_job('graph')
+        storage = model.crawl.GraphStorage
+
+        with self.session_context() as session:
+            # every entry is leased by a worker which crashed a while ago
+            entry_ids = [
+                storage.claim_entry(
+                    session,
+                    job=job_id,
+                    worker='crashed',
+                    lease_seconds=60
+                ).id
+                for _ in URLS
+            ]
+            session.query(model.crawl.CrawlNode).update({
+                model.crawl.CrawlNode.lease_expires_at: model.create_timestamp()
+            })
+
+        with self.session_context() as session:
+            self.assertIsNone(storage.next_lease_expiry(session, job=job_id))
+            entry = storage.claim_entry(session, job=job_id, worker='alive', lease_seconds=60)
+            self.assertIn(entry.id, entry_ids)
+            self.assertIsNone(
+                storage.hold_entry(session, entry_id=entry.id, worker='crashed', lease_seconds=60)
+            )
+            self.assertIsNotNone(
+                storage.hold_entry(session, entry_id=entry.id, worker='alive', lease_seconds=60)
+            )
+
+            self.assertTrue(storage.release_entry(session, entry_id=entry.id, worker='alive'))
+            self.assertIsNone(
+                storage.hold_entry(session, entry_id=entry.id, worker='alive', lease_seconds=60)
+            )
@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+from opener.limiter import URLRateLimiter, RateLimitPolicy, parse_retry_after
+
+URL = 'https://example.invalid/page'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+
+
+class TestURLRateLimiter(TestCase):
+    def _create_limiter(self, policy, **kwargs):
+        clock = FakeClock()
+        return URLRateLimiter(policy, clock=clock, sleep=clock.sleep, **kwargs), clock
+
+    def test_burst_then_spaced_by_rate(self):
+        limiter, clock = self._create_limiter(RateLimitPolicy(rate=2, burst=3))
+        for _ in range(5):
+            limiter.block(URL)
+        self.assertEqual(clock.sleeps, [0.5, 1.0])
+
+    def test_no_sleep_after_idle(self):
+        limiter, clock = self._create_limiter(RateLimitPolicy.fixed_interval(10))
+        limiter.block(URL)
+        clock.now += 10
+        limiter.block(URL)
+        self.assertEqual(clock.sleeps, [])
+
+    def test_domain_policy(self):
+        limiter, clock = self._create_limiter(
+            RateLimitPolicy(rate=1),
+            domain_policies={'fast.invalid': RateLimitPolicy(rate=10, burst=10)}
+        )
+        for _ in range(5):
+            limiter.block('https://fast.invalid/')
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual(limiter.rate_of('https://fast.invalid/'), 10)
+
+    def test_aimd(self):
+        policy = RateLimitPolicy(
+            rate=1, min_rate=0.25, max_rate=2, increase=0.5, target_latency=1.0
+        )
+        limiter, clock = self._create_limiter(policy)
+        for _ in range(3):
+            limiter.report_response(URL, status=200, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 2)
+
+        limiter.report_response(URL, status=200, latency=5.0)
+        self.assertEqual(limiter.rate_of(URL), 1)
+        # another congestion in the same interval is not counted twice
+        limiter.report_response(URL, status=503, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 1)
+        clock.now += 1
+        limiter.report_response(URL, status=429, latency=0.1)
+        clock.now += 2
+        limiter.report_response(URL, status=None, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 0.25)
+
+    def test_error_statuses(self):
+        policy = RateLimitPolicy(rate=1, min_rate=0.25, max_rate=2, increase=0.5)
+        limiter, clock = self._create_limiter(policy)
+        # fast server errors do not raise the rate
+        limiter.report_response(URL, status=500, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 0.5)
+        clock.now += 2
+        limiter.report_response(URL, status=502, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 0.25)
+
+        for _ in range(3):
+            limiter.report_response(URL, status=404, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 0.25)
+        limiter.report_response(URL, status=304, latency=0.1)
+        self.assertEqual(limiter.rate_of(URL), 0.75)
+
+    def test_retry_after(self):
+        limiter, clock = self._create_limiter(RateLimitPolicy(rate=1, burst=5))
+        limiter.report_response(URL, status=429, latency=0.1, retry_after='30')
+        limiter.block(URL)
+        limiter.block(URL)
+        self.assertEqual(clock.sleeps, [30.0, 31.0])
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120', now=0), 120)
+        self.assertEqual(
+            parse_retry_after('Thu, 01 Jan 1970 00:01:00 GMT', now=30),
+            30
+        )
+        self.assertIsNone(parse_retry_after('soon', now=0))
+        self.assertIsNone(parse_retry_after(None, now=0))
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from worker.scrape.link_index import LinkIndex
+
+ROOT_BACK_URL_ID = 0
+
+
+class TestLinkIndex(TestCase):
+    def test_walk_in_preorder(self):
+        # entry id, url id, back url id and whether it is a root; url 4 is linked from
+        # both 2 and 3 and is visited on both paths
+        index = LinkIndex([
+            (10, 1, ROOT_BACK_URL_ID, True),
+            (11, 2, 1, False),
+            (12, 4, 2, False),
+            (13, 3, 1, False),
+            (14, 4, 3, False),
+            (15, 5, 4, False),
+        ])
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.root_count, 1)
+        self.assertEqual(
+            [(step.entry_id, step.depth) for step in index.walk()],
+            [(10, 0), (11, 1), (12, 2), (15, 3), (13, 1), (14, 2), (15, 3)]
+        )
+
+    def test_link_back_not_followed(self):
+        index = LinkIndex([
+            (10, 1, ROOT_BACK_URL_ID, True),
+            (11, 2, 1, False),
+            (12, 1, 2, False),
+            (13, 3, 2, False),
+        ])
+        self.assertEqual([step.entry_id for step in index.walk()], [10, 11, 13])
+
+    def test_empty(self):
+        self.assertEqual(list(LinkIndex([]).walk()), [])
@@ -0,0 +1,98 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from sqlalchemy import event
+
+import model
+import model.crawl
+from worker.crawl.page_family import GroupedURL
+
+URL = GroupedURL(url='https://example.invalid/0.html', group_name='page')
+
+
+class TestLookupCache(TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.session_context = model.create_session_context(
+            os.path.join(self.__temp_dir.name, 'lookup.db')
+        )
+        model.crawl.lookup_cache.clear()
+
+    def tearDown(self):
+        model.crawl.lookup_cache.clear()
+        self.__temp_dir.cleanup()
+
+    @classmethod
+    def _record_statements(cls, session) -> list[str]:
+        statements = []
+        event.listen(
+            session.get_bind(),
+            'before_cursor_execute',
+            lambda conn, cursor, statement, *args: statements.append(statement)
+        )
+        return statements
+
+    def test_hit_without_query(self):
+        stats = model.crawl.lookup_cache.stats()
+        with self.session_context() as session:
+            lookup_id = model.crawl.Lookup.lookup_id(session, url=URL)
+
+        with self.session_context() as session:
+            statements = self._record_statements(session)
+            self.assertEqual(model.crawl.Lookup.lookup_id(session, url=URL), lookup_id)
+            self.assertEqual(
+                model.crawl.Lookup.bulk_lookup_ids(session, urls=[URL]),
+                {URL.url: lookup_id}
+            )
+            self.assertEqual(statements, [])
+
+        new_stats = model.crawl.lookup_cache.stats()
+        self.assertEqual(
+            new_stats['lookup_cache_miss_count'] - stats['lookup_cache_miss_count'],
+            1
+        )
+        self.assertEqual(
+            new_stats['lookup_cache_hit_count'] - stats['lookup_cache_hit_count'],
+            2
+        )
+
+    def test_rollback_evicts_pending_urls(self):
+        with self.assertRaises(RuntimeError), self.session_context() as session:
+            model.crawl.Lookup.lookup_id(session, url=URL)
+            model.crawl.Lookup.bulk_lookup_ids(
+                session,
+                urls=[GroupedURL(url='https://example.invalid/1.html', group_name='page')]
+            )
+            self.assertEqual(model.crawl.lookup_cache.stats()['lookup_cache_size'], 2)
+            raise RuntimeError
+        self.assertEqual(model.crawl.lookup_cache.stats()['lookup_cache_size'], 0)
+
+        with self.session_context() as session:
+            lookup_id = model.crawl.Lookup.lookup_id(session, url=URL)
+            self.assertEqual(session.get(model.crawl.Lookup, lookup_id).url, URL.url)
+        # committed lookups stay in the cache
+        self.assertEqual(model.crawl.lookup_cache.stats()['lookup_cache_size'], 1)
+
+    def test_hash_collision(self):
+        other_url = GroupedURL(url='https://example.invalid/1.html', group_name='page')
+        # every url is given the same id
+        with mock.patch('model.crawl.lookup.string_hash_63', return_value=42):
+            for existing_urls, new_urls in [([], [URL, other_url]), ([URL], [other_url])]:
+                with self.subTest(existing_urls=existing_urls):
+                    with self.session_context() as session:
+                        session.query(model.crawl.Lookup).delete()
+                        model.crawl.Lookup.bulk_lookup_ids(session, urls=existing_urls)
+
+                    with self.assertRaises(model.crawl.LookupHashCollisionError) as cm, \
+                            self.session_context() as session:
+                        model.crawl.Lookup.bulk_lookup_ids(session, urls=new_urls)
+                    self.assertEqual(cm.exception.args[1], [other_url.url])
+
+                    with self.session_context(do_commit=False) as session:
+                        self.assertEqual(
+                            [url for url, in session.query(model.crawl.Lookup.url)],
+                            [url.url for url in existing_urls]
+                        )
+                        for url in new_urls:
+                            self.assertIsNone(model.crawl.lookup_cache.get(session, url.url))
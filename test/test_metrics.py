@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(TestCase):
+    def test_disabled_records_nothing(self):
+        registry = MetricsRegistry()
+        registry.increment('pages_total', group='a')
+        with registry.timer('stage_seconds', stage='parse'):
+            pass
+        self.assertEqual(registry.snapshot()['counters'], [])
+        self.assertEqual(registry.snapshot()['histograms'], [])
+
+    def test_counters_and_histograms(self):
+        registry = MetricsRegistry(enabled=True, buckets=(0.1, 1.0))
+        registry.increment('pages_total', group='a')
+        registry.increment('pages_total', 2, group='a')
+        registry.observe('stage_seconds', 0.05, stage='parse')
+        registry.observe('stage_seconds', 0.5, stage='parse')
+        registry.observe('stage_seconds', 5.0, stage='parse')
+
+        snapshot = registry.snapshot()
+        self.assertEqual(
+            snapshot['counters'],
+            [dict(name='pages_total', labels=dict(group='a'), value=3)]
+        )
+        histogram, = snapshot['histograms']
+        self.assertEqual(histogram['count'], 3)
+        self.assertEqual(histogram['buckets'], {'0.1': 1, '1.0': 2, '+Inf': 3})
+
+        text = registry.to_prometheus_text()
+        self.assertIn('# TYPE pages_total counter', text)
+        self.assertIn('pages_total{group="a"} 3', text)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="parse"} 3', text)
+
+    def test_dump_json(self):
+        registry = MetricsRegistry(enabled=True)
+        registry.increment('pages_total')
+        with tempfile.TemporaryDirectory() as dir_path:
+            path = os.path.join(dir_path, 'metrics.json')
+            registry.dump(path)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['counters'][0]['value'], 1)
@@ -0,0 +1,140 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+
+import app_logging
+import model
+import model.crawl
+import model.scrape
+from model.migration import MigrationRunner, MIGRATIONS, has_table, has_column
+
+# schema of the crawl tables before any migration
+BASELINE_SCHEMA = [
+    'CREATE TABLE job (id INTEGER NOT NULL PRIMARY KEY, timestamp DATETIME)',
+    'CREATE TABLE lookup (id INTEGER NOT NULL PRIMARY KEY, url TEXT UNIQUE, group_name TEXT)',
+    'CREATE TABLE page_content (id INTEGER NOT NULL PRIMARY KEY,'
+    ' timestamp DATETIME NOT NULL, content TEXT, content_hash INTEGER NOT NULL)',
+    'CREATE TABLE task (id INTEGER NOT NULL PRIMARY KEY,'
+    ' job_id INTEGER NOT NULL REFERENCES job (id),'
+    ' url_id INTEGER NOT NULL REFERENCES lookup (id),'
+    ' back_url_id INTEGER REFERENCES lookup (id),'
+    ' timestamp DATETIME NOT NULL,'
+    ' page_id INTEGER REFERENCES page_content (id))',
+]
+
+NEW_INDEXES = {
+    'ix_job_timestamp',
+    'ix_task_job_id_page_id_timestamp',
+    'ix_task_job_id_back_url_id',
+    'ix_task_job_id_url_id_back_url_id',
+}
+
+
+class TestMigrationRunner(TestCase):
+    def setUp(self):
+        app_logging.set_level(app_logging.WARNING)
+        self.__temp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f'sqlite:///{os.path.join(self.__temp_dir.name, "migration.db")}'
+        )
+        self.runner = MigrationRunner(MIGRATIONS)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.__temp_dir.cleanup()
+
+    def _create_baseline(self) -> None:
+        with self.engine.begin() as connection:
+            for sql in BASELINE_SCHEMA:
+                connection.exec_driver_sql(sql)
+
+    def _migrate(self) -> int:
+        return self.runner.migrate(self.engine, model.SQLDataModelBase.metadata)
+
+    def _dump_schema(self) -> list[tuple]:
+        with self.engine.connect() as connection:
+            return connection.exec_driver_sql(
+                'SELECT type, name, sql FROM sqlite_master ORDER BY name'
+            ).all()
+
+    def test_migrate_baseline(self):
+        self._create_baseline()
+        self.assertEqual(self._migrate(), len(MIGRATIONS))
+
+        with self.engine.connect() as connection:
+            index_names = {
+                name for name, in connection.exec_driver_sql(
+                    'SELECT name FROM sqlite_master WHERE type = \'index\''
+                )
+            }
+            self.assertLessEqual(NEW_INDEXES, index_names)
+            self.assertTrue(has_column(connection, 'job', 'storage'))
+            self.assertTrue(has_column(connection, 'page_content', 'blob_digest'))
+            self.assertTrue(has_column(connection, 'task', 'claimed_by'))
+            self.assertTrue(has_table(connection, 'page_blob'))
+            self.assertEqual(
+                self.runner.current_version(connection),
+                self.runner.latest_version
+            )
+
+        schema = self._dump_schema()
+        self.assertEqual(self._migrate(), 0)
+        self.assertEqual(self._dump_schema(), schema)
+
+    def test_migrate_page_blobs(self):
+        self._create_baseline()
+        # more pages than a batch of the migration, sharing a few contents
+        contents = [
+            None if i % 50 == 0 else f'<html><body>{i % 7}</body></html>'
+            for i in range(300)
+        ]
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                'INSERT INTO page_content (id, timestamp, content, content_hash)'
+                ' VALUES (?, \'2021-04-01 00:00:00\', ?, 0)',
+                [(page_id, content) for page_id, content in enumerate(contents, 1)]
+            )
+        self._migrate()
+
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.exec_driver_sql('SELECT COUNT(*) FROM page_blob').scalar(),
+                len(set(contents) - {None})
+            )
+            self.assertEqual(
+                connection.exec_driver_sql(
+                    'SELECT COUNT(*) FROM page_content WHERE content IS NOT NULL'
+                ).scalar(),
+                0
+            )
+            self.assertEqual(
+                connection.exec_driver_sql(
+                    'SELECT COUNT(*) FROM page_content WHERE blob_digest IS NULL'
+                ).scalar(),
+                contents.count(None)
+            )
+
+        session_context = model.create_session_context(self.engine.url.database)
+        with session_context(do_commit=False) as session:
+            page = session.get(model.crawl.PageContent, 2)
+            self.assertEqual(page.content, contents[1])
+            pages = model.crawl.PageContent.map_pages(
+                session,
+                page_ids=range(1, len(contents) + 1)
+            )
+            model.crawl.PageContent.load_blobs(session, pages=pages.values())
+            self.assertEqual(
+                [pages[page_id].content for page_id in sorted(pages)],
+                contents
+            )
+
+    def test_new_database_stamped(self):
+        self.assertEqual(self._migrate(), 0)
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                self.runner.current_version(connection),
+                self.runner.latest_version
+            )
+            self.assertTrue(has_column(connection, 'job', 'storage'))
@@ -0,0 +1,79 @@
+import urllib.parse
+from unittest import TestCase
+
+from worker.crawl.manaba_family import ManabaPageFamily
+from worker.crawl.page_family import PageFamily, page_group_with_domain
+
+DOMAIN = 'room.chuo-u.ac.jp'
+
+
+class OverlappingPageFamily(PageFamily):
+    with page_group_with_domain(domain='example.com') as page_group:
+        specific = page_group(path_pattern=r'/item_1')
+        general = page_group(path_pattern=r'/item_(\d+)')
+
+
+class TestPageFamily(TestCase):
+    def test_classify_same_as_linear_search(self):
+        paths = [
+            '/ct/home_', '/ct/home__summary', '/ct/course_12', '/ct/course_12_news',
+            '/ct/course_12_news_3', '/ct/course_12_page', '/ct/page_1c2', '/ct/page_1c2_3',
+            '/ct/course_12_grade', '/ct/', '/',
+        ]
+        for path in paths:
+            url_components = urllib.parse.urlparse(f'https://{DOMAIN}{path}')
+            expected = next(
+                (
+                    page_group
+                    for page_group in ManabaPageFamily._page_groups.values()
+                    if page_group.match_url(url_components)
+                ),
+                None
+            )
+            self.assertEqual(
+                ManabaPageFamily._page_group_classifier.classify(url_components),
+                expected,
+                path
+            )
+
+    def test_first_defined_group_preferred(self):
+        self.assertEqual(
+            OverlappingPageFamily.apply_maps('https://example.com/item_1').group_name,
+            'specific'
+        )
+        self.assertEqual(
+            OverlappingPageFamily.apply_maps('https://example.com/item_2').group_name,
+            'general'
+        )
+        self.assertIsNone(OverlappingPageFamily.apply_maps(f'https://{DOMAIN}/item_1'))
+
+    def test_mappers_applied(self):
+        # (source url, url mapped before mappers returning `ParseResult` were applied,
+        # url mapped now); jobs crawled before have lookups of the former
+        cases = [
+            (
+                f'https://{DOMAIN}/ct/page_1c2_3#header',
+                f'https://{DOMAIN}/ct/page_1c2_3#header',
+                f'https://{DOMAIN}/ct/page_1c2_3'
+            ),
+            (
+                f'https://{DOMAIN}/ct/course_12_news?start=21&pagelen=20',
+                f'https://{DOMAIN}/ct/course_12_news?start=21&pagelen=20',
+                f'https://{DOMAIN}/ct/course_12_news?start=1&pagelen=100'
+            ),
+            (
+                f'https://{DOMAIN}/ct/home_',
+                f'https://{DOMAIN}/ct/home_',
+                f'https://{DOMAIN}/ct/home_?chglistformat=list'
+            ),
+            # pages of groups without mappers are mapped as before
+            (
+                f'https://{DOMAIN}/ct/course_12#header',
+                f'https://{DOMAIN}/ct/course_12#header',
+                f'https://{DOMAIN}/ct/course_12#header'
+            ),
+        ]
+        for source_url, _, expected_url in cases:
+            self.assertEqual(ManabaPageFamily.apply_maps(source_url).url, expected_url)
+            # the url mapped is a fixed point
+            self.assertEqual(ManabaPageFamily.apply_maps(expected_url).url, expected_url)
@@ -0,0 +1,169 @@
+import http.server
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from unittest import TestCase
+
+import opener
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def __send(self, body: bytes, status=200, **headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name.replace('_', '-'), value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        if self.path == '/cookie':
+            self.__send(b'set', Set_Cookie='sid=42; Path=/')
+        elif self.path == '/echo-cookie':
+            self.__send(self.headers.get('Cookie', '').encode())
+        elif self.path == '/redirect':
+            self.__send(b'', status=302, Location='/page')
+        elif self.path == '/etag':
+            if self.headers.get('If-None-Match') == '"1"':
+                self.__send(b'', status=304, ETag='"1"')
+            else:
+                self.__send(b'etag', ETag='"1"')
+        elif self.path == '/missing':
+            self.__send(b'missing', status=404)
+        elif self.path in ('/gzip', '/deflate', '/raw-deflate'):
+            self.server.accept_encodings.append(self.headers.get('Accept-Encoding'))
+            wbits = {'/gzip': 16 + zlib.MAX_WBITS, '/deflate': zlib.MAX_WBITS}.get(
+                self.path,
+                -zlib.MAX_WBITS
+            )
+            compressor = zlib.compressobj(wbits=wbits)
+            body = compressor.compress(b'page' * 1024) + compressor.flush()
+            self.__send(body, Content_Encoding=self.path.split('-')[-1].strip('/'))
+        elif self.path == '/large':
+            self.__send(b'page' * (1 << 18))
+        elif self.path == '/idle-close':
+            # like a server whose keep-alive timeout passes before the next request
+            self.__send(b'idle-close')
+            self.close_connection = True
+        else:
+            self.__send(b'page' * 1024)
+
+
+    def do_POST(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.post_count += 1
+        if self.path == '/post-drop':
+            # like a server closing the connection after processing the request
+            self.close_connection = True
+        else:
+            self.__send(b'posted')
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.client_ports = set()
+        self.accept_encodings = []
+        self.post_count = 0
+
+
+class TestKeepAliveHandler(TestCase):
+    def setUp(self):
+        self.server = _Server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.url_opener = opener.ManabaURLOpener(
+            cookie_file_name=os.path.join(self.temp_dir.name, 'cookie.txt')
+        )
+
+    def tearDown(self):
+        self.url_opener._exit_handler()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_connection_reused(self):
+        for path in ['/page', '/cookie', '/echo-cookie', '/redirect', '/missing', '/page']:
+            try:
+                content = self.url_opener.urlopen_bytes(self.base_url + path)
+            except urllib.error.HTTPError as e:
+                self.assertEqual(e.code, 404)
+                e.read()
+                continue
+            if path == '/echo-cookie':
+                self.assertEqual(content, b'sid=42')
+            if path == '/redirect':
+                self.assertEqual(content, b'page' * 1024)
+
+        response = self.url_opener.urlopen_string_conditionally(self.base_url + '/etag')
+        response = self.url_opener.urlopen_string_conditionally(
+            self.base_url + '/etag',
+            validators=response.validators
+        )
+        self.assertTrue(response.not_modified)
+
+        stats = self.url_opener.connection_stats()
+        self.assertEqual(stats['connection_pool_created_count'], 1)
+        self.assertEqual(stats['connection_pool_request_count'], 9)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_partially_read_connection_not_reused(self):
+        with self.url_opener.urlopen(self.base_url + '/large') as res:
+            res.read(4)
+        self.assertEqual(self.url_opener.urlopen_bytes(self.base_url + '/page'), b'page' * 1024)
+        self.assertEqual(self.url_opener.connection_stats()['connection_pool_reused_count'], 0)
+
+    def test_connection_closed_by_server_dropped(self):
+        self.url_opener.urlopen_bytes(self.base_url + '/idle-close')
+        time.sleep(0.1)
+        self.assertEqual(self.url_opener.urlopen_bytes(self.base_url + '/page'), b'page' * 1024)
+
+        stats = self.url_opener.connection_stats()
+        self.assertEqual(stats['connection_pool_created_count'], 2)
+        self.assertEqual(stats['connection_pool_dropped_count'], 1)
+
+    def test_post_not_sent_again(self):
+        self.url_opener.urlopen_bytes(self.base_url + '/page')
+        request = urllib.request.Request(
+            self.base_url + '/post-drop',
+            data=b'form',
+            method='POST'
+        )
+        with self.assertRaises(urllib.error.URLError):
+            self.url_opener.urlopen(request)
+        self.assertEqual(self.server.post_count, 1)
+
+        request = urllib.request.Request(self.base_url + '/post', data=b'form', method='POST')
+        with self.url_opener.urlopen(request) as res:
+            self.assertEqual(res.read(), b'posted')
+        self.assertEqual(self.server.post_count, 2)
+
+    def test_compressed_body_decoded(self):
+        for path in ['/gzip', '/deflate', '/raw-deflate']:
+            self.assertEqual(self.url_opener.urlopen_bytes(self.base_url + path), b'page' * 1024)
+        with self.url_opener.urlopen(self.base_url + '/gzip') as res:
+            self.assertEqual(res.read(3), b'pag')
+            self.assertEqual(len(res.read()), 4 * 1024 - 3)
+        self.assertEqual(self.server.accept_encodings, ['gzip, deflate'] * 4)
+
+        stats = self.url_opener.transfer_stats()
+        self.assertEqual(stats['transfer_decoded_bytes'], 4 * 4 * 1024)
+        self.assertLess(stats['transfer_wire_bytes'], stats['transfer_decoded_bytes'] / 10)
+        self.assertEqual(stats['transfer_responses'], {'gzip': 2, 'deflate': 2})
+        self.assertEqual(self.url_opener.connection_stats()['connection_pool_created_count'], 1)
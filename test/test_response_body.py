@@ -0,0 +1,36 @@
+import io
+from unittest import TestCase
+
+import opener
+
+URL = 'https://example.invalid/large.html'
+CONTENT = 'ページ' * 100_000
+
+
+class TestResponseBody(TestCase):
+    def setUp(self):
+        self.url_opener = opener.MemoryURLOpener(files={URL: CONTENT})
+
+    def test_spilled_above_threshold(self):
+        for spill_threshold, spilled in [(1 << 30, False), (1 << 16, True)]:
+            with self.subTest(spill_threshold=spill_threshold):
+                with self.url_opener.urlopen_body(URL, spill_threshold=spill_threshold) as body:
+                    self.assertEqual(body.spilled, spilled)
+                    self.assertEqual(body.size, len(CONTENT.encode('utf-8')))
+                    self.assertEqual(body.read_string('utf-8'), CONTENT)
+                    self.assertEqual(body.read_bytes(), CONTENT.encode('utf-8'))
+                    self.assertEqual(b''.join(body.iter_chunks(1000)), CONTENT.encode('utf-8'))
+
+                    fp = io.BytesIO()
+                    body.copy_to(fp)
+                    self.assertEqual(fp.getvalue(), CONTENT.encode('utf-8'))
+
+    def test_max_size(self):
+        size = len(CONTENT.encode('utf-8'))
+        self.assertEqual(self.url_opener.urlopen_string(URL, max_size=size), CONTENT)
+        with self.assertRaises(opener.ResponseTooLargeError):
+            self.url_opener.urlopen_string(URL, max_size=size - 1)
+        with self.assertRaises(opener.ResponseTooLargeError):
+            self.url_opener.urlopen_string_conditionally(URL, max_size=1 << 10)
+        with self.assertRaises(opener.ResponseTooLargeError):
+            list(self.url_opener.urlopen_chunks(URL, max_size=1 << 10))
@@ -0,0 +1,151 @@
+import email.message
+import socket
+import urllib.error
+from unittest import TestCase
+
+import opener
+from opener.retry import URLRetrier, RetryPolicy, CircuitBreakerPolicy, CircuitOpenError, \
+    is_transient_error
+
+URL = 'https://example.invalid/page'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _http_error(code: int, **headers) -> urllib.error.HTTPError:
+    message = email.message.Message()
+    for name, value in headers.items():
+        message[name.replace('_', '-')] = value
+    return urllib.error.HTTPError(URL, code, 'error', message, None)
+
+
+class FlakyMemoryURLOpener(opener.MemoryURLOpener):
+    def __init__(self, *, failures: list[Exception], **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.open_count = 0
+
+    def urlopen(self, url_or_req):
+        self.open_count += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return super().urlopen(url_or_req)
+
+
+class TestURLRetrier(TestCase):
+    def _create_retrier(self, policy=RetryPolicy(), **kwargs):
+        clock = FakeClock()
+        retrier = URLRetrier(
+            policy,
+            clock=clock,
+            sleep=clock.sleep,
+            random_value=lambda: 1.0,
+            **kwargs
+        )
+        return retrier, clock
+
+    def _call_failing(self, retrier, failures: list[Exception]):
+        def func():
+            if failures:
+                raise failures.pop(0)
+            return 'content'
+
+        return retrier.call(URL, func)
+
+    def test_error_classified(self):
+        for e, transient in [
+            (_http_error(404), False),
+            (_http_error(304), False),
+            (_http_error(503), True),
+            (_http_error(429), True),
+            (urllib.error.URLError(ConnectionResetError()), True),
+            (urllib.error.URLError(socket.timeout()), True),
+            (urllib.error.URLError('no host given'), False),
+            (TimeoutError(), True),
+            (FileNotFoundError(), False),
+            (opener.ResponseTooLargeError(), False),
+            (CircuitOpenError('example.invalid', 1.0), True),
+        ]:
+            with self.subTest(e=e):
+                self.assertEqual(is_transient_error(e), transient)
+
+    def test_backoff_exponentially(self):
+        retrier, clock = self._create_retrier(RetryPolicy(base_delay=2.0, max_delay=5.0))
+        result = self._call_failing(
+            retrier,
+            [ConnectionResetError(), TimeoutError(), _http_error(502)]
+        )
+        self.assertEqual(result, 'content')
+        self.assertEqual(clock.sleeps, [2.0, 4.0, 5.0])
+        self.assertEqual(retrier.stats()['retry_retried_count'], 3)
+
+    def test_permanent_error_not_retried(self):
+        retrier, clock = self._create_retrier()
+        with self.assertRaises(urllib.error.HTTPError):
+            self._call_failing(retrier, [_http_error(404)])
+        self.assertEqual(clock.sleeps, [])
+
+    def test_attempts_exhausted(self):
+        retrier, clock = self._create_retrier(RetryPolicy(max_attempts=2))
+        with self.assertRaises(ConnectionResetError):
+            self._call_failing(retrier, [ConnectionResetError()] * 3)
+        self.assertEqual(len(clock.sleeps), 1)
+
+    def test_retry_after_honored(self):
+        retrier, clock = self._create_retrier()
+        self._call_failing(retrier, [_http_error(503, Retry_After='30')])
+        self.assertEqual(clock.sleeps, [30.0])
+
+    def test_circuit_opened_and_closed(self):
+        retrier, clock = self._create_retrier(
+            RetryPolicy(max_attempts=1),
+            breaker_policy=CircuitBreakerPolicy(failure_threshold=2, reset_timeout=60.0)
+        )
+        for _ in range(2):
+            with self.assertRaises(ConnectionResetError):
+                self._call_failing(retrier, [ConnectionResetError()])
+        self.assertEqual(retrier.state_of(URL), 'open')
+
+        called = []
+        with self.assertRaises(CircuitOpenError):
+            retrier.call(URL, lambda: called.append(True))
+        self.assertEqual(called, [])
+        # other domains are not affected
+        self.assertEqual(retrier.call('https://other.invalid/', lambda: 'other'), 'other')
+
+        clock.now += 60.0
+        # the trial request fails and the circuit opens again at once
+        with self.assertRaises(ConnectionResetError):
+            self._call_failing(retrier, [ConnectionResetError()])
+        self.assertEqual(retrier.state_of(URL), 'open')
+
+        clock.now += 60.0
+        self.assertEqual(self._call_failing(retrier, []), 'content')
+        self.assertEqual(retrier.state_of(URL), 'closed')
+
+    def test_opener_retried(self):
+        retrier, clock = self._create_retrier()
+        url_opener = FlakyMemoryURLOpener(
+            files={URL: 'content'},
+            failures=[urllib.error.URLError(ConnectionRefusedError()), _http_error(500)],
+            retrier=retrier
+        )
+        self.assertEqual(url_opener.urlopen_string(URL), 'content')
+        self.assertEqual(url_opener.urlopen_string_conditionally(URL).string, 'content')
+        self.assertEqual(url_opener.open_count, 4)
+
+        with self.assertRaises(FileNotFoundError):
+            url_opener.urlopen_string('https://example.invalid/missing')
+        self.assertEqual(url_opener.open_count, 5)
+        self.assertEqual(len(clock.sleeps), 2)
@@ -0,0 +1,27 @@
+import pickle
+from unittest import TestCase
+
+import model.scrape
+
+COURSE_HTML = '''
+<html><body>
+<h1 id="coursename" title=" Algorithms "></h1>
+<div class="coursedata-info">2021 通年 月 2時限</div>
+<div class="courseteacher" title="Yamada、Tanaka"></div>
+</body></html>
+'''
+
+
+class TestParseFields(TestCase):
+    def test_plain_fields(self):
+        fields = model.scrape.Course.parse_fields(COURSE_HTML)
+        # the fields are sent back from the processes of the parsing pool
+        self.assertEqual(pickle.loads(pickle.dumps(fields)), fields)
+        self.assertEqual(fields, {
+            'name': 'Algorithms',
+            'schedules': [
+                dict(year=2021, semester=0, weekday=0, period=2),
+                dict(year=2021, semester=1, weekday=0, period=2),
+            ],
+            'instructors': [dict(name='Yamada'), dict(name='Tanaka')],
+        })
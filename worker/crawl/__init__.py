@@ -1,2 +1,4 @@
-from .crawler import OpenerBasedCrawler
+from .crawler import OpenerBasedCrawler, WorkerLease
+from .document import HTMLDocument
+from .frontier import DepthFirstTaskFrontier, BreadthFirstTaskFrontier, PriorityTaskFrontier
 from .manaba_crawler import ManabaCrawler
@@ -1,15 +1,59 @@
+import concurrent.futures
+import os
+import socket
+import time
 import urllib.error
 import urllib.parse
 from abc import ABCMeta, abstractmethod
 
 import bs4
+from sqlalchemy.orm import Session
 
+import metrics
 import model.crawl
 import opener
 from sessctx import SessionContext
+from .document import HTMLDocument
+from .frontier import FrontierEntry, TaskFrontier, DepthFirstTaskFrontier, \
+    PriorityTaskFrontier
 from .page_family import *
 
 
+class CrawlResult(NamedTuple):
+    grouped_url: GroupedURL
+    content: Optional[str]
+    child_grouped_urls: list[GroupedURL]
+    validators: Optional[opener.Validators] = None
+    # the content and the children are left empty if the page is not modified
+    not_modified: bool = False
+    # the page failed with a transient error; its task is left unfinished
+    deferred: bool = False
+
+
+class WorkerLease(NamedTuple):
+    """
+    Identity of a crawler process sharing a job with other processes, possibly on
+    other machines sharing the database file, and how long it may hold an entry.
+    """
+    worker_id: str
+    seconds: float = 600.0
+    # seconds to wait before looking again while every unfinished entry is leased
+    poll_interval: float = 5.0
+    # seconds an entry failing with a transient error is kept leased before it can
+    # be claimed again
+    retry_seconds: float = 300.0
+
+    @classmethod
+    def of_current_process(cls, **kwargs) -> 'WorkerLease':
+        return cls(worker_id=f'{socket.gethostname()}:{os.getpid()}', **kwargs)
+
+
+class RetrievedContent(NamedTuple):
+    # document is None if the page is not modified since the validators sent
+    document: Optional[HTMLDocument]
+    validators: Optional[opener.Validators]
+
+
 class AbstractCrawler(metaclass=ABCMeta):
     @abstractmethod
     def _group_url(self, url: str) -> Optional[GroupedURL]:
@@ -19,21 +63,30 @@ class AbstractCrawler(metaclass=ABCMeta):
     def _retrieve_content_and_soup(self, url: str) -> tuple[str, bs4.BeautifulSoup]:
         raise NotImplementedError()
 
+    def _retrieve_content_conditionally(
+            self,
+            url: str,
+            validators: Optional[opener.Validators]
+    ) -> RetrievedContent:
+        # crawlers which cannot send conditional requests always retrieve the content
+        content, soup = self._retrieve_content_and_soup(url)
+        return RetrievedContent(
+            document=HTMLDocument(content, soup=soup),
+            validators=None
+        )
+
     @staticmethod
-    def __iterate_anchor_full_url(source_url: str, soup: bs4.BeautifulSoup) \
+    def __iterate_anchor_full_url(source_url: str, document: HTMLDocument) \
             -> Iterable[str]:
-        for tag_anchor in soup.find_all('a'):
-            anchor_url = tag_anchor.attrs.get('href')
-            if anchor_url is None:
-                continue
+        for anchor_url in document.anchor_hrefs:
             full_url = urllib.parse.urljoin(source_url, anchor_url)
             yield full_url
 
     @abstractmethod
-    def _iter_next_grouped_urls(self, source_url: str, soup: bs4.BeautifulSoup, **kwargs) \
+    def _iter_next_grouped_urls(self, source_url: str, document: HTMLDocument, **kwargs) \
             -> Iterable[GroupedURL]:
         assert kwargs == {}
-        it = self.__iterate_anchor_full_url(source_url, soup)
+        it = self.__iterate_anchor_full_url(source_url, document)
         it = map(self._group_url, it)
         it = filter(None, it)
         urls_unique = set(it)
@@ -60,14 +113,27 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
 
     def __init__(self, session_context: SessionContext):
         self.__session_context = session_context
+        # urls failed with transient errors in this run, retrieved again in the next run
+        self.__deferred_url_ids: set[int] = set()
 
     @abstractmethod
     def _page_family(self) -> PageFamily:
         raise NotImplementedError()
 
-    def initialize_tasks(self, initial_urls: list[str]) -> None:
+    def initialize_tasks(
+            self,
+            initial_urls: list[str],
+            *,
+            storage: str = 'task'
+    ) -> None:
+        """
+        Create a new job crawling from `initial_urls`. `storage` is the name of
+        `model.crawl.CrawlStorage` the job is stored in; `'graph'` retrieves every url
+        once and needs no page fill.
+        """
         with self.__session_context() as session:
-            job = model.crawl.Job.get_new_session(session)
+            job = model.crawl.Job.get_new_session(session, storage=storage)
+            storage = model.crawl.storage_of(job)
 
             for initial_url in initial_urls:
                 mapped_url = self._group_url(initial_url)
@@ -75,7 +141,7 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
                     self.logger.warning(f'{initial_url=!r} mapped to None')
                     continue
 
-                model.crawl.Task.add_initial_url(
+                storage.add_initial_url(
                     session,
                     job=job,
                     initial_mapped_url=mapped_url
@@ -85,11 +151,11 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
     def _iter_next_grouped_urls(
             self,
             source_url: str,
-            soup: bs4.BeautifulSoup,
+            document: HTMLDocument,
             current_grouped_url: GroupedURL,
             **kwargs
     ) -> Iterable[GroupedURL]:
-        it = super()._iter_next_grouped_urls(source_url, soup)
+        it = super()._iter_next_grouped_urls(source_url, document)
         for child_grouped_url in it:
             if child_grouped_url.url == current_grouped_url.url:
                 continue
@@ -100,10 +166,271 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
                 continue
             yield child_grouped_url
 
+    def create_priority_frontier(
+            self,
+            group_priorities: Optional[dict[str, int]] = None
+    ) -> PriorityTaskFrontier:
+        return PriorityTaskFrontier.from_page_family(
+            self._page_family(),
+            group_priorities=group_priorities
+        )
+
     RESUME_LATEST = 'latest'
     RESUME_OLDEST = 'oldest'
 
-    def _process_job(self, resume_state) -> bool:
+    def _retrieve_task_result(
+            self,
+            current_grouped_url: GroupedURL,
+            validators: Optional[opener.Validators] = None
+    ) -> CrawlResult:
+        current_url = current_grouped_url.url
+        group_name = current_grouped_url.group_name
+
+        try:
+            with metrics.timer('crawl_stage_seconds', stage='retrieve', group=group_name):
+                retrieved = self._retrieve_content_conditionally(current_url, validators)
+        # TODO: distribute error handles to each classes
+        except Exception as e:
+            if opener.is_transient_error(e):
+                self.logger.warning(f'{e!r} occurred while retrieving content, task deferred')
+                metrics.increment('crawl_pages_total', result='deferred', group=group_name)
+                return CrawlResult(
+                    grouped_url=current_grouped_url,
+                    content=None,
+                    child_grouped_urls=[],
+                    deferred=True
+                )
+            if not isinstance(
+                    e,
+                    (urllib.error.HTTPError, FileNotFoundError, opener.ResponseTooLargeError)
+            ):
+                raise
+            self.logger.info(f'{e} occurred while retrieving content')
+            metrics.increment('crawl_pages_total', result='error', group=group_name)
+            return CrawlResult(
+                grouped_url=current_grouped_url,
+                content=None,
+                child_grouped_urls=[]
+            )
+
+        if retrieved.document is None:
+            self.logger.info('content not modified')
+            metrics.increment('crawl_pages_total', result='not_modified', group=group_name)
+            return CrawlResult(
+                grouped_url=current_grouped_url,
+                content=None,
+                child_grouped_urls=[],
+                validators=retrieved.validators,
+                not_modified=True
+            )
+        content = retrieved.document.content
+        self.logger.info(f'content retrieved: {len(content)=}')
+        metrics.increment('crawl_pages_total', result='retrieved', group=group_name)
+
+        with metrics.timer('crawl_stage_seconds', stage='parse', group=group_name):
+            anchor_hrefs = retrieved.document.anchor_hrefs
+        metrics.increment('crawl_anchors_total', len(anchor_hrefs), group=group_name)
+        with metrics.timer('crawl_stage_seconds', stage='classify', group=group_name):
+            child_grouped_urls = list(self._iter_next_grouped_urls(
+                source_url=current_url,
+                document=retrieved.document,
+                current_grouped_url=current_grouped_url
+            ))
+        return CrawlResult(
+            grouped_url=current_grouped_url,
+            content=content,
+            child_grouped_urls=child_grouped_urls,
+            validators=retrieved.validators
+        )
+
+    @staticmethod
+    def _validators_of_task(
+            session: Session,
+            task: 'model.crawl.CrawlEntry'
+    ) -> Optional[opener.Validators]:
+        validator = model.crawl.PageValidator.get_record(session, lookup=task.url_id)
+        if validator is None:
+            return None
+        return opener.Validators(
+            etag=validator.etag,
+            last_modified=validator.last_modified
+        )
+
+    def _store_task_result(
+            self,
+            session: Session,
+            *,
+            job: 'model.crawl.Job',
+            task: 'model.crawl.CrawlEntry',
+            result: CrawlResult
+    ) -> list[FrontierEntry]:
+        if result.deferred:
+            self.logger.debug(f'task left unfinished: {task=}')
+            return []
+
+        with metrics.timer(
+                'crawl_stage_seconds',
+                stage='store',
+                group=result.grouped_url.group_name
+        ):
+            back_lookup_id = model.crawl.Lookup.lookup_id(
+                session,
+                url=result.grouped_url.url
+            )
+            storage = model.crawl.storage_of(job)
+
+            if result.not_modified:
+                # the page and its links are the same as when the validators were stored
+                validator = model.crawl.PageValidator.get_record(session, lookup=back_lookup_id)
+                group_names = model.crawl.storage_of(validator.job).map_children(
+                    session,
+                    job=validator.job_id,
+                    back_lookup=back_lookup_id
+                )
+            else:
+                validator = None
+                lookup_ids = model.crawl.Lookup.bulk_lookup_ids(
+                    session,
+                    urls=result.child_grouped_urls
+                )
+                group_names = {
+                    lookup_ids[grouped_url.url]: grouped_url.group_name
+                    for grouped_url in result.child_grouped_urls
+                }
+
+            new_task_rows = storage.add_children(
+                session,
+                job=job,
+                lookups=group_names.keys(),
+                back_lookup=back_lookup_id
+            )
+            self.logger.debug(f'new tasks added: {len(new_task_rows)=}')
+
+            if validator is not None:
+                storage.fill_entry(session, entry=task, page_id=validator.page_id)
+            else:
+                storage.close_entry(
+                    session,
+                    entry=task,
+                    content=result.content
+                )
+            self.logger.debug(f'task closed: {task=}')
+
+            if result.validators is not None:
+                if task.page_id is None:
+                    session.flush()
+                model.crawl.PageValidator.put_record(
+                    session,
+                    lookup=back_lookup_id,
+                    job=job,
+                    page_id=task.page_id,
+                    etag=result.validators.etag,
+                    last_modified=result.validators.last_modified
+                )
+
+            return [
+                FrontierEntry(task_id=task_id, url_id=url_id, group_name=group_names[url_id])
+                for task_id, url_id in new_task_rows
+            ]
+
+    @staticmethod
+    def _grouped_url_of_task(task: 'model.crawl.CrawlEntry') -> GroupedURL:
+        return GroupedURL(
+            url=task.lookup.url,
+            group_name=task.lookup.group_name
+        )
+
+    def _process_leased_entry(self, resume_state, lease: WorkerLease) -> bool:
+        # the database is locked only while claiming and storing, not while retrieving
+        with self.__session_context(immediate=True) as session:
+            job = model.crawl.Job.get_job(
+                session,
+                state='unfinished',
+                order=resume_state
+            )
+            if job is None:
+                self.logger.info(f'no unfinished job left: {lease.worker_id=}')
+                return False
+            job_id = job.id
+            storage = model.crawl.storage_of(job)
+
+            fill_count = storage.fill_pages(session, job=job)
+            self.logger.info(f'page fill: {fill_count=}')
+
+            task = storage.claim_entry(
+                session,
+                job=job,
+                worker=lease.worker_id,
+                lease_seconds=lease.seconds
+            )
+            if task is None:
+                lease_expiry = storage.next_lease_expiry(session, job=job)
+            else:
+                task_id = task.id
+                grouped_url = self._grouped_url_of_task(task)
+                validators = self._validators_of_task(session, task)
+
+        if task is None:
+            # the rest of the job is leased to other workers, which may add new entries
+            # or crash and leave their entries to be claimed after their leases expire
+            wait_seconds = lease.poll_interval
+            if lease_expiry is not None:
+                wait_seconds = min(
+                    wait_seconds,
+                    max(0.0, (lease_expiry - model.create_timestamp()).total_seconds())
+                )
+            self.logger.info(f'every unfinished task is leased, waiting {wait_seconds:.3f} seconds')
+            time.sleep(wait_seconds)
+            return True
+
+        self.logger.debug(f'task claimed: {task_id=}, {grouped_url=}, {lease.worker_id=}')
+        try:
+            result = self._retrieve_task_result(grouped_url, validators)
+        except BaseException:
+            with self.__session_context(immediate=True) as session:
+                storage.release_entry(session, entry_id=task_id, worker=lease.worker_id)
+            raise
+
+        with self.__session_context(immediate=True) as session:
+            task = storage.hold_entry(
+                session,
+                entry_id=task_id,
+                worker=lease.worker_id,
+                lease_seconds=lease.seconds
+            )
+            if task is None:
+                self.logger.warning(
+                    f'lease of task lost while retrieving, result discarded: {task_id=}'
+                )
+                return True
+            if result.deferred:
+                # the lease keeps the task from being claimed again until it expires
+                storage.hold_entry(
+                    session,
+                    entry_id=task_id,
+                    worker=lease.worker_id,
+                    lease_seconds=lease.retry_seconds
+                )
+                return True
+            self._store_task_result(
+                session,
+                job=model.crawl.Job.get_session_by_id(session, job_id=job_id),
+                task=task,
+                result=result
+            )
+
+        return True
+
+    def _process_job(self, resume_state, *, lease: Optional[WorkerLease] = None) -> bool:
+        """
+        Retrieve an unfinished task of the job and store the result. With `lease`, the
+        task is claimed through a lease so that processes sharing the job never
+        retrieve the same task. Tasks failing with transient errors are left unfinished
+        and not opened again in this run, or with `lease`, until `retry_seconds` pass.
+        """
+        if lease is not None:
+            return self._process_leased_entry(resume_state, lease)
+
         crawling_executed = False
 
         self.logger.info('CRAWLING SESSION BEGIN')
@@ -116,61 +443,45 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
                 order=resume_state
             )
             self.logger.info(f'crawling session acquired: {job=}')
+            if job is None:
+                self.logger.info('CRAWLING SESSION END')
+                return crawling_executed
+            storage = model.crawl.storage_of(job)
 
-            fill_count = model.crawl.Task.fill_pages(
+            fill_count = storage.fill_pages(
                 session,
                 job=job
             )
             self.logger.info(f'page fill: {fill_count=}')
 
-            task = model.crawl.Task.open_task(
-                session,
-                job=job
-            )
+            if self.__deferred_url_ids:
+                tasks = storage.open_entries(
+                    session,
+                    job=job,
+                    limit=1,
+                    excluded_url_ids=self.__deferred_url_ids
+                )
+                task = tasks[0] if tasks else None
+            else:
+                task = storage.open_entry(
+                    session,
+                    job=job
+                )
             self.logger.debug(f'task open: {task=}')
 
             if task is not None:
-                current_grouped_url = GroupedURL(
-                    url=task.lookup.url,
-                    group_name=task.lookup.group_name
-                )
-                current_url = current_grouped_url.url
-
-                try:
-                    content, soup = self._retrieve_content_and_soup(current_url)
-                    self.logger.info(f'content retrieved: {len(content)=}')
-                # TODO: distribute error handles to each classes
-                except (urllib.error.HTTPError, FileNotFoundError) as e:
-                    content, soup = None, None
-                    self.logger.info(f'{e} occurred while retrieving content')
-                else:
-                    new_task_count = 0
-                    for grouped_url in self._iter_next_grouped_urls(
-                            source_url=current_url,
-                            soup=soup,
-                            current_grouped_url=current_grouped_url
-                    ):
-                        model.crawl.Task.new_record(
-                            session,
-                            job=job,
-                            lookup=model.crawl.Lookup.lookup(
-                                session,
-                                url=grouped_url
-                            ),
-                            back_lookup=model.crawl.Lookup.lookup(
-                                session,
-                                url=current_url
-                            )
-                        )
-                        new_task_count += 1
-                    self.logger.debug(f'new tasks added: {new_task_count=}')
-
-                model.crawl.Task.close_task(
+                result = self._retrieve_task_result(
+                    self._grouped_url_of_task(task),
+                    self._validators_of_task(session, task)
+                )
+                if result.deferred:
+                    self.__deferred_url_ids.add(task.url_id)
+                self._store_task_result(
                     session,
+                    job=job,
                     task=task,
-                    content=content
+                    result=result
                 )
-                self.logger.debug(f'task closed: {task=}')
 
                 crawling_executed = True
 
@@ -178,6 +489,7 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
                 session,
                 job=job
             )
+            info_dict |= model.crawl.lookup_cache.stats()
             info_dict |= {'crawling_executed': crawling_executed}
             self.logger.info('\n'.join(
                 f'[SUMMARY] {k!s:30s} {v!r:>8s}' for k, v in info_dict.items()
@@ -187,9 +499,195 @@ class DatabaseBasedCrawler(AbstractCrawler, metaclass=ABCMeta):
 
         return crawling_executed
 
+    def crawl_concurrently(self, resume_state, *, worker_count: int) -> None:
+        """
+        Crawl the job with `worker_count` threads retrieving pages at the same time.
+
+        Worker threads only retrieve and parse pages; every database write is done
+        by the calling thread, which acts as the single writer. Tasks sharing a url
+        with a task in flight are not claimed until the in-flight task is closed.
+        """
+        if worker_count < 1:
+            raise ValueError('parameter \'worker_count\' must be positive')
+
+        with self.__session_context() as session:
+            job = model.crawl.Job.get_job(
+                session,
+                state='unfinished',
+                order=resume_state
+            )
+            if job is None:
+                self.logger.info('no unfinished job found')
+                return
+            job_id = job.id
+            storage = model.crawl.storage_of(job)
+
+            warmed_count = model.crawl.warm_lookup_cache(session, job=job)
+            self.logger.info(f'lookup cache warmed: {warmed_count=}')
+        self.logger.info(f'concurrent crawling acquired: {job_id=}, {worker_count=}')
+
+        # future -> (task id, url id)
+        in_flight: dict[concurrent.futures.Future, tuple[int, int]] = {}
+        done_futures = set()
+        deferred_url_ids = set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
+            while True:
+                with self.__session_context() as session:
+                    job = model.crawl.Job.get_session_by_id(session, job_id=job_id)
+
+                    for future in done_futures:
+                        task_id, url_id = in_flight.pop(future)
+                        result = future.result()
+                        if result.deferred:
+                            deferred_url_ids.add(url_id)
+                        self._store_task_result(
+                            session,
+                            job=job,
+                            task=storage.get_entry(session, entry_id=task_id),
+                            result=result
+                        )
+
+                    fill_count = storage.fill_pages(
+                        session,
+                        job=job
+                    )
+                    self.logger.debug(f'page fill: {fill_count=}')
+
+                    tasks = storage.open_entries(
+                        session,
+                        job=job,
+                        limit=worker_count - len(in_flight),
+                        excluded_url_ids=deferred_url_ids.union(
+                            url_id for _, url_id in in_flight.values()
+                        )
+                    )
+                    for task in tasks:
+                        future = executor.submit(
+                            self._retrieve_task_result,
+                            self._grouped_url_of_task(task),
+                            self._validators_of_task(session, task)
+                        )
+                        in_flight[future] = task.id, task.url_id
+                    self.logger.debug(f'tasks claimed: {len(tasks)=}, {len(in_flight)=}')
+
+                if not in_flight:
+                    break
+
+                done_futures, _ = concurrent.futures.wait(
+                    in_flight.keys(),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+        self.logger.info(f'concurrent crawling finished: {job_id=}')
+
+    def crawl_in_session(
+            self,
+            resume_state,
+            *,
+            commit_interval: int = 100,
+            frontier: Optional[TaskFrontier] = None
+    ) -> None:
+        """
+        Crawl the job in one long-lived session keeping its unfinished tasks in memory.
+
+        The job is resolved, filled and loaded into `frontier` once; after that a page
+        costs its own retrieval and writes only. `frontier` is an empty `TaskFrontier`
+        deciding the crawling order, `DepthFirstTaskFrontier` by default. Tasks whose url
+        already has a page are filled when they are popped instead of by
+        `Task.fill_pages`. Changes are committed every `commit_interval` pages, so at
+        most that many pages are crawled again when an interrupted job is resumed.
+        """
+        if commit_interval < 1:
+            raise ValueError('parameter \'commit_interval\' must be positive')
+        if frontier is None:
+            frontier = DepthFirstTaskFrontier()
+        if len(frontier) != 0:
+            raise ValueError('parameter \'frontier\' must be empty')
+
+        with self.__session_context() as session:
+            job = model.crawl.Job.get_job(
+                session,
+                state='unfinished',
+                order=resume_state
+            )
+            if job is None:
+                self.logger.info('no unfinished job found')
+                return
+            self.logger.info(f'crawling session acquired: {job=}')
+            storage = model.crawl.storage_of(job)
+
+            fill_count = storage.fill_pages(
+                session,
+                job=job
+            )
+            self.logger.info(f'page fill: {fill_count=}')
+
+            warmed_count = model.crawl.warm_lookup_cache(session, job=job)
+            self.logger.info(f'lookup cache warmed: {warmed_count=}')
+
+            for task_id, url_id, group_name in storage.iter_unfinished_rows(
+                    session,
+                    job=job
+            ):
+                frontier.push(
+                    FrontierEntry(task_id=task_id, url_id=url_id, group_name=group_name)
+                )
+            page_id_of_url_id = storage.map_page_ids(session, job=job)
+            self.logger.info(f'frontier loaded: {len(frontier)=}, {len(page_id_of_url_id)=}')
+
+            processed_count = 0
+            deferred_url_ids = set()
+            while frontier:
+                entry = frontier.pop()
+                if entry.url_id in deferred_url_ids:
+                    continue
+
+                page_id = page_id_of_url_id.get(entry.url_id)
+                task = storage.get_entry(session, entry_id=entry.task_id)
+                if task.page_id is not None:
+                    continue
+                if page_id is not None:
+                    storage.fill_entry(session, entry=task, page_id=page_id)
+                    continue
+
+                result = self._retrieve_task_result(
+                    self._grouped_url_of_task(task),
+                    self._validators_of_task(session, task)
+                )
+                if result.deferred:
+                    deferred_url_ids.add(task.url_id)
+                    continue
+                new_entries = self._store_task_result(
+                    session,
+                    job=job,
+                    task=task,
+                    result=result
+                )
+                session.flush()
+
+                page_id_of_url_id[task.url_id] = task.page_id
+                for new_entry in new_entries:
+                    frontier.push(new_entry)
+
+                processed_count += 1
+                if processed_count % commit_interval == 0:
+                    session.commit()
+                    self.logger.info(
+                        f'[SUMMARY] committed {processed_count=}, {len(frontier)=}, '
+                        f'{model.crawl.lookup_cache.stats()}'
+                    )
+
+            self.logger.info(
+                f'crawling session finished: {processed_count=}, {len(deferred_url_ids)=}'
+            )
+
 
 # TODO: use mixin
 class OpenerBasedCrawler(DatabaseBasedCrawler, metaclass=ABCMeta):
+    # pages larger than this are recorded as failed without being held in memory
+    MAX_PAGE_SIZE = 1 << 24
+
     def __init__(
             self,
             session_context: SessionContext,
@@ -201,3 +699,23 @@ class OpenerBasedCrawler(DatabaseBasedCrawler, metaclass=ABCMeta):
 
     def _retrieve_content_and_soup(self, url: str) -> tuple[str, bs4.BeautifulSoup]:
         return self.__url_opener.urlopen_string_and_soup(url)
+
+    def _retrieve_content_conditionally(
+            self,
+            url: str,
+            validators: Optional[opener.Validators]
+    ) -> RetrievedContent:
+        response = self.__url_opener.urlopen_string_conditionally(
+            url,
+            validators=validators,
+            max_size=self.MAX_PAGE_SIZE
+        )
+        if response.not_modified:
+            return RetrievedContent(
+                document=None,
+                validators=response.validators
+            )
+        return RetrievedContent(
+            document=HTMLDocument(response.string),
+            validators=response.validators
+        )
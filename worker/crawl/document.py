@@ -0,0 +1,65 @@
+import functools
+from typing import Optional
+
+import bs4
+import lxml.etree
+
+
+class _AnchorHrefTarget:
+    """
+    Parser target of lxml collecting `href` of anchors without building any tree;
+    events without their handler, like text, are skipped by lxml.
+    """
+
+    def __init__(self):
+        self.__hrefs = []
+
+    def start(self, tag, attrib):
+        if tag == 'a':
+            href = attrib.get('href')
+            if href is not None:
+                self.__hrefs.append(href)
+
+    def close(self) -> list[str]:
+        return self.__hrefs
+
+
+def extract_anchor_hrefs(content: str) -> list[str]:
+    """
+    Extract `href` of every `<a>` in `content` in document order, parsing the HTML the
+    same way as `bs4.BeautifulSoup(content, features='lxml')` does.
+    """
+    parser = lxml.etree.HTMLParser(target=_AnchorHrefTarget())
+    parser.feed(content)
+    return parser.close()
+
+
+class HTMLDocument:
+    """
+    HTML content whose BeautifulSoup tree is built only when `soup` is accessed.
+    Anchors are extracted by `extract_anchor_hrefs` unless the tree is built already.
+    """
+
+    def __init__(self, content: str, soup: Optional[bs4.BeautifulSoup] = None):
+        self.__content = content
+        if soup is not None:
+            self.__dict__['soup'] = soup
+
+    @property
+    def content(self) -> str:
+        return self.__content
+
+    @functools.cached_property
+    def soup(self) -> bs4.BeautifulSoup:
+        return bs4.BeautifulSoup(self.__content, features='lxml')
+
+    @functools.cached_property
+    def anchor_hrefs(self) -> list[str]:
+        soup = self.__dict__.get('soup')
+        if soup is not None:
+            return [
+                tag_anchor.attrs['href']
+                for tag_anchor in soup.find_all('a')
+                if tag_anchor.attrs.get('href') is not None
+            ]
+        return extract_anchor_hrefs(self.__content)
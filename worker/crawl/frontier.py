@@ -0,0 +1,131 @@
+import collections
+import heapq
+import itertools
+from abc import ABCMeta, abstractmethod
+from typing import NamedTuple, Optional, Callable, Iterable
+
+from .page_family import PageFamily
+
+
+class FrontierEntry(NamedTuple):
+    task_id: int
+    url_id: int
+    group_name: str
+
+
+class TaskFrontier(metaclass=ABCMeta):
+    """
+    In-memory set of unfinished tasks of a job deciding the order of crawling.
+    """
+
+    def __init__(self, entries: Iterable[FrontierEntry] = ()):
+        for entry in entries:
+            self.push(entry)
+
+    @abstractmethod
+    def push(self, entry: FrontierEntry) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def pop(self) -> FrontierEntry:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def __len__(self):
+        raise NotImplementedError()
+
+
+class DepthFirstTaskFrontier(TaskFrontier):
+    """
+    Pops the newest task first, the same order as `Task.open_task`.
+    """
+
+    def __init__(self, entries: Iterable[FrontierEntry] = ()):
+        self.__stack = []
+        super().__init__(entries)
+
+    def push(self, entry: FrontierEntry) -> None:
+        self.__stack.append(entry)
+
+    def pop(self) -> FrontierEntry:
+        return self.__stack.pop()
+
+    def __len__(self):
+        return len(self.__stack)
+
+
+class BreadthFirstTaskFrontier(TaskFrontier):
+    """
+    Pops the oldest task first.
+    """
+
+    def __init__(self, entries: Iterable[FrontierEntry] = ()):
+        self.__queue = collections.deque()
+        super().__init__(entries)
+
+    def push(self, entry: FrontierEntry) -> None:
+        self.__queue.append(entry)
+
+    def pop(self) -> FrontierEntry:
+        return self.__queue.popleft()
+
+    def __len__(self):
+        return len(self.__queue)
+
+
+class PriorityTaskFrontier(TaskFrontier):
+    """
+    Pops the task with the smallest key first; ties are broken by insertion order.
+    """
+
+    def __init__(
+            self,
+            entries: Iterable[FrontierEntry] = (),
+            *,
+            key: Callable[[FrontierEntry], tuple]
+    ):
+        self.__key = key
+        self.__heap = []
+        self.__counter = itertools.count()
+        super().__init__(entries)
+
+    def push(self, entry: FrontierEntry) -> None:
+        heapq.heappush(self.__heap, (self.__key(entry), next(self.__counter), entry))
+
+    def pop(self) -> FrontierEntry:
+        *_, entry = heapq.heappop(self.__heap)
+        return entry
+
+    def __len__(self):
+        return len(self.__heap)
+
+    @classmethod
+    def from_page_family(
+            cls,
+            page_family: type[PageFamily],
+            *,
+            group_priorities: Optional[dict[str, int]] = None,
+            entries: Iterable[FrontierEntry] = ()
+    ) -> 'PriorityTaskFrontier':
+        """
+        Create a frontier popping tasks of higher `group_priorities` first (0 for groups
+        not listed), then tasks of shallower page groups, then by group name.
+        """
+        group_priorities = group_priorities or {}
+
+        # page groups never change, so resolve their keys once instead of on every push
+        group_keys = {}
+
+        def key(entry: FrontierEntry) -> tuple:
+            group_key = group_keys.get(entry.group_name)
+            if group_key is None:
+                page_group = page_family.find_page_group_by_name(entry.group_name)
+                group_key = (
+                    -group_priorities.get(entry.group_name, 0),
+                    page_group.depth,
+                    entry.group_name
+                )
+                group_keys[entry.group_name] = group_key
+            return group_key
+
+        return cls(entries, key=key)
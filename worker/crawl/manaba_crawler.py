@@ -38,13 +38,27 @@ class ManabaCrawler(OpenerBasedCrawler):
     def _group_url(self, url: str) -> Optional[GroupedURL]:
         return self._page_family().apply_maps(url)
 
+    # news are small and the most valuable pages, so crawl them as soon as they are found
+    NEWS_FIRST_GROUP_PRIORITIES = {
+        ManabaPageFamily.course_news_list.name: 1,
+        ManabaPageFamily.course_news.name: 1,
+    }
+
     PERIOD_CURRENT = HomeCoursePeriod([''])
     PERIOD_PAST = HomeCoursePeriod(['_past'])
     PERIOD_FUTURE = HomeCoursePeriod(['_upcoming'])
     PERIOD_ALL = PERIOD_CURRENT + PERIOD_PAST + PERIOD_FUTURE
 
-    def initialize_tasks_by_period(self, period: HomeCoursePeriod = PERIOD_ALL):
-        self.initialize_tasks(initial_urls=list(period.iter_home_course_urls()))
+    def initialize_tasks_by_period(
+            self,
+            period: HomeCoursePeriod = PERIOD_ALL,
+            *,
+            storage: str = 'task'
+    ):
+        self.initialize_tasks(
+            initial_urls=list(period.iter_home_course_urls()),
+            storage=storage
+        )
 
     # TODO: move this method into super class and resolve duplicated lines
     def force_initialize_unfinished_oldest(self, period: HomeCoursePeriod = PERIOD_ALL):
@@ -67,7 +81,7 @@ class ManabaCrawler(OpenerBasedCrawler):
                     continue
 
                 try:
-                    model.crawl.Task.add_initial_url(
+                    model.crawl.storage_of(job).add_initial_url(
                         session,
                         job=job,
                         initial_mapped_url=mapped_url,
@@ -1,4 +1,6 @@
+import collections
 import contextlib
+import functools
 import re
 import urllib.error
 import urllib.parse
@@ -48,6 +50,13 @@ class PageGroup(NamedTuple):
     def __hash__(self):
         return hash((self.domain, self.name))
 
+    @property
+    def depth(self) -> int:
+        depth, page_group = 0, self.parent
+        while page_group is not None:
+            depth, page_group = depth + 1, page_group.parent
+        return depth
+
     def match_url(self, url_components: urllib.parse.ParseResult) -> bool:
         domain, path = url_components.netloc, url_components.path
 
@@ -57,13 +66,22 @@ class PageGroup(NamedTuple):
             return False
         return True
 
-    def map(self, source_url: str) -> GroupedURL:
+    def map(
+            self,
+            source_url: str,
+            url_components: Optional[urllib.parse.ParseResult] = None
+    ) -> GroupedURL:
         if self.url_mappers:
-            url_components = urllib.parse.urlparse(source_url)
+            if url_components is None:
+                url_components = urllib.parse.urlparse(source_url)
+            # components are passed from mapper to mapper and parsed again only when
+            # a mapper returns a string
             for mapper in self.url_mappers:
                 mapping_result = mapper(url_components)
                 if isinstance(mapping_result, str):
                     url_components = urllib.parse.urlparse(mapping_result)
+                else:
+                    url_components = mapping_result
             url = urllib.parse.urlunparse(url_components)
         else:
             url = source_url
@@ -110,6 +128,41 @@ class PageGroupGeneratorParams(dict):
     pass
 
 
+class PageGroupClassifier:
+    """
+    Finds the first page group matching a url with one precompiled alternation of the
+    path patterns per domain, so a url is matched by a single regex search.
+    """
+
+    def __init__(self, page_groups: Iterable[PageGroup]):
+        patterns_by_domain = collections.defaultdict(list)
+        self.__page_groups_by_domain: dict[str, dict[str, PageGroup]] \
+            = collections.defaultdict(dict)
+        for i, page_group in enumerate(page_groups):
+            regex_group_name = f'_page_group_{i}'
+            patterns_by_domain[page_group.domain].append(
+                f'(?P<{regex_group_name}>{page_group.path_pattern})'
+            )
+            self.__page_groups_by_domain[page_group.domain][regex_group_name] = page_group
+
+        # alternatives are tried from the left, which keeps the groups defined earlier
+        # preferred as the linear search did
+        self.__pattern_by_domain: dict[str, re.Pattern] = {
+            domain: re.compile('|'.join(patterns))
+            for domain, patterns in patterns_by_domain.items()
+        }
+
+    def classify(self, url_components: urllib.parse.ParseResult) -> Optional[PageGroup]:
+        pattern = self.__pattern_by_domain.get(url_components.netloc)
+        if pattern is None:
+            return None
+        match = pattern.fullmatch(url_components.path)
+        if match is None:
+            return None
+        # the named group wrapping a path pattern closes after the groups in it
+        return self.__page_groups_by_domain[url_components.netloc][match.lastgroup]
+
+
 class PageFamilyMeta(type):
     @staticmethod
     def extract_page_groups(dct):
@@ -129,7 +182,12 @@ class PageFamilyMeta(type):
 
     def __new__(mcs, name, bases, dct):
         dct = mcs.extract_page_groups(dct)
+        dct['_page_group_classifier'] = PageGroupClassifier(dct['_page_groups'].values())
         page_family = super().__new__(mcs, name, bases, dct)
+        # each family has its own cache since the same url maps differently by family
+        page_family._apply_maps_cached = staticmethod(functools.lru_cache(
+            maxsize=page_family.APPLY_MAPS_CACHE_SIZE
+        )(page_family._apply_maps_uncached))
 
         return page_family
 
@@ -137,34 +195,41 @@ class PageFamilyMeta(type):
 class PageFamily(metaclass=PageFamilyMeta):
     logger = app_logging.create_logger()
 
-    _page_groups: dict[str, PageGroup]  # real value generated on PageFamilyMeta.__new__
-
-    @classmethod
-    def __iter_page_groups(cls) -> Iterable[PageGroup]:
-        return cls._page_groups.values()
+    APPLY_MAPS_CACHE_SIZE = 1 << 14
 
-    @classmethod
-    def __find_page_group_for_url(cls, url: str) -> Optional[PageGroup]:
-        url_components = urllib.parse.urlparse(url)
-        for page_group in cls.__iter_page_groups():
-            if page_group.match_url(url_components):
-                return page_group
-        return None
+    # real values generated on PageFamilyMeta.__new__
+    _page_groups: dict[str, PageGroup]
+    _page_group_classifier: PageGroupClassifier
+    _apply_maps_cached: Callable[[str], Optional[GroupedURL]]
 
     @classmethod
     def find_page_group_by_name(cls, name: str) -> PageGroup:
         return cls._page_groups[name]
 
     @classmethod
-    def apply_maps(cls, url: str) -> Optional[GroupedURL]:
-        page_group = cls.__find_page_group_for_url(url)
+    def _apply_maps_uncached(cls, url: str) -> Optional[GroupedURL]:
+        url_components = urllib.parse.urlparse(url)
+        page_group = cls._page_group_classifier.classify(url_components)
         if page_group is None:
             cls.logger.debug(f'grouper DENIED: {url!r}')
             return None
-        mapped_url = page_group.map(url)
+        mapped_url = page_group.map(url, url_components)
         cls.logger.debug(f'grouper ACCEPTED: {url!r}\n -> {mapped_url!r}')
         return mapped_url
 
+    @classmethod
+    def apply_maps(cls, url: str) -> Optional[GroupedURL]:
+        """
+        Map `url` by the first page group matching it; results of the latest
+        `APPLY_MAPS_CACHE_SIZE` urls are memoized.
+        """
+        return cls._apply_maps_cached(url)
+
+    @classmethod
+    def group_name_of(cls, url: str) -> Optional[str]:
+        grouped_url = cls.apply_maps(url)
+        return grouped_url.group_name if grouped_url is not None else None
+
 
 @contextlib.contextmanager
 def page_group_with_domain(domain=None):
@@ -16,6 +16,8 @@ class DownloadingEntry(NamedTuple):
 class DownloaderBase(metaclass=ABCMeta):
     logger = app_logging.create_logger()
 
+    MAX_DOWNLOAD_SIZE = 1 << 30
+
     def __init__(
             self,
             *,
@@ -42,19 +44,27 @@ class DownloaderBase(metaclass=ABCMeta):
             downloading_entry = self._create_downloading_entry(**param)
             yield downloading_entry
 
-    def execute_download(self, dl_entry: DownloadingEntry) -> Optional[bytes]:
+    def execute_download(self, dl_entry: DownloadingEntry) -> Optional[opener.ResponseBody]:
+        """
+        Download `dl_entry` into a `ResponseBody`, which spills to a temporary file if it
+        is large; None if the download failed permanently. Transient errors are raised.
+        """
         try:
-            content = self.__opener.urlopen_bytes(dl_entry.url)
-        except urllib.error.HTTPError:
-            content = None
-        return content
+            return self.__opener.urlopen_body(dl_entry.url, max_size=self.MAX_DOWNLOAD_SIZE)
+        except urllib.error.HTTPError as e:
+            if opener.is_transient_error(e):
+                raise
+            return None
+        except opener.ResponseTooLargeError as e:
+            self.logger.warning(f' download skipped: {e}')
+            return None
 
     @abstractmethod
     def _setup_download(self, dl_entry: DownloadingEntry) -> bool:
         raise NotImplementedError()
 
     @abstractmethod
-    def _process_content(self, dl_entry: DownloadingEntry, content: bytes):
+    def _process_content(self, dl_entry: DownloadingEntry, body: Optional[opener.ResponseBody]):
         raise NotImplementedError()
 
     def download_all(self):
@@ -64,9 +74,20 @@ class DownloaderBase(metaclass=ABCMeta):
             self.logger.info(f' proceed_downloading: {setup_result}')
             if not setup_result:
                 continue
-            content = self.execute_download(dl_entry)
-            if content:
-                self.logger.info(f' retrieved content with length {len(content)}')
+            try:
+                body = self.execute_download(dl_entry)
+            except Exception as e:
+                if not opener.is_transient_error(e):
+                    raise
+                # nothing is stored, so that the next run downloads it again
+                self.logger.warning(f' download deferred: {e!r}')
+                continue
+            if body is not None:
+                self.logger.info(f' retrieved content with length {body.size}')
             else:
                 self.logger.info(f' failed to get content')
-            self._process_content(dl_entry, content)
+            try:
+                self._process_content(dl_entry, body)
+            finally:
+                if body is not None:
+                    body.close()
@@ -2,7 +2,7 @@ import datetime
 import re
 import urllib.error
 import urllib.parse
-from typing import Iterable
+from typing import Iterable, Optional
 
 import dateutil.parser
 from bs4 import BeautifulSoup
@@ -21,6 +21,14 @@ from .downloader import DownloaderBase, DownloadingEntry
 class ManabaAttachmentDownloader(DownloaderBase):
     logger = app_logging.create_logger()
 
+    # group name of attachments in `opener.CachePolicy`
+    CACHE_GROUP_NAME = 'attachment'
+
+    @classmethod
+    def cache_group_of(cls, url: str) -> Optional[str]:
+        # every url the downloader retrieves is of an attachment
+        return cls.CACHE_GROUP_NAME
+
     def __init__(
             self,
             *,
@@ -91,12 +99,14 @@ class ManabaAttachmentDownloader(DownloaderBase):
             proceed_downloading = not entry_exists
             return proceed_downloading
 
-    def _process_content(self, dl_entry: DownloadingEntry, content: bytes):
+    def _process_content(self, dl_entry: DownloadingEntry, body: Optional[opener.ResponseBody]):
+        # `Attachment.content` is a single BLOB bound as a whole, so the body is read
+        # into memory here once; the download itself is only capped by `max_size`
         with self.__sc() as session:
             model.downloader.Attachment.put_entry_from_parameters(
                 session,
                 title=dl_entry.title,
                 url=dl_entry.url,
-                content=content,
+                content=body.read_bytes() if body is not None else None,
                 timestamp=dl_entry.timestamp
             )
@@ -9,9 +9,9 @@ import model.scrape
 import model.scrape.base
 
 
-def group_handler(*, group_name: str):
+def group_handler(*, group_name: str, **params):
     def decorator(func):
-        setattr(func, '_group_handler', {'group_name': group_name})
+        setattr(func, '_group_handler', {'group_name': group_name, **params})
         return func
 
     return decorator
@@ -33,12 +33,23 @@ class GroupHandlerMixin:
             if param['group_name'] == group_name:
                 return obj
 
+    def group_handler_params(self, group_name: str) -> Optional[dict]:
+        """
+        Parameters given to `group_handler` of the handler of `group_name`, or None if
+        the group is not handled.
+        """
+        handler = self.__find_group_handler(group_name)
+        if handler is None:
+            return None
+        return handler._group_handler
+
     def handle_by_group_name(
             self,
             *,
             session: Session,
-            task_entry: model.crawl.Task,
-            parent_model_entries: model.scrape.base.ParentModelEntries
+            task_entry: model.crawl.CrawlEntry,
+            parent_model_entries: model.scrape.base.ParentModelEntries,
+            **kwargs
     ) -> Optional[model.scrape.base.SQLScraperModelBase]:
         group_name = task_entry.lookup.group_name
 
@@ -52,7 +63,8 @@ class GroupHandlerMixin:
             handler_kwargs = dict(
                 task_entry=task_entry,
                 session=session,
-                parent_model_entries=parent_model_entries
+                parent_model_entries=parent_model_entries,
+                **kwargs
             )
             return handler(**handler_kwargs)
         else:
@@ -0,0 +1,64 @@
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+
+
+class TraversalStep(NamedTuple):
+    entry_id: int
+    depth: int
+
+
+class LinkIndex:
+    """
+    Links of a job held in arrays, loaded at once by `CrawlStorage.iter_edge_rows`.
+    The links are sorted by their back url id, so that the links from a url are a
+    contiguous range found by a binary search.
+    """
+
+    def __init__(self, rows: Iterable[tuple[int, int, int, bool]]):
+        rows = list(rows)
+        entry_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        url_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        back_url_ids = np.array([row[2] for row in rows], dtype=np.int64)
+        is_root = np.array([bool(row[3]) for row in rows], dtype=bool)
+
+        # stable, so that the links from a url keep the order they were stored in
+        order = np.argsort(back_url_ids, kind='stable')
+        self.__entry_ids = entry_ids[order]
+        self.__url_ids = url_ids[order]
+        self.__back_url_ids = back_url_ids[order]
+        self.__root_links = np.flatnonzero(is_root[order])
+
+    def __len__(self) -> int:
+        return len(self.__entry_ids)
+
+    @property
+    def root_count(self) -> int:
+        return len(self.__root_links)
+
+    def __links_from(self, url_id: int) -> np.ndarray:
+        start = np.searchsorted(self.__back_url_ids, url_id, side='left')
+        stop = np.searchsorted(self.__back_url_ids, url_id, side='right')
+        return np.arange(start, stop)
+
+    def walk(self) -> Iterator[TraversalStep]:
+        """
+        Entries of every path from the roots in depth-first preorder, as the scraper
+        visits them. Links back to a url already on the path are not followed.
+        """
+        stack = [(int(link), 0) for link in reversed(self.__root_links)]
+        path: list[int] = []
+        while stack:
+            link, depth = stack.pop()
+            url_id = int(self.__url_ids[link])
+            del path[depth:]
+            if url_id in path:
+                continue
+            path.append(url_id)
+
+            yield TraversalStep(entry_id=int(self.__entry_ids[link]), depth=depth)
+
+            stack.extend(
+                (int(next_link), depth + 1)
+                for next_link in reversed(self.__links_from(url_id))
+            )
@@ -1,7 +1,11 @@
-from typing import Literal, Optional
+import collections
+import concurrent.futures
+import contextlib
+import itertools
+from typing import Literal, Optional, Any, Iterable, NamedTuple
 
 import sqlalchemy.exc
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, lazyload
 
 import app_logging
 import model.crawl
@@ -10,6 +14,20 @@ import model.scrape.base
 from sessctx import SessionContext
 from worker.crawl.manaba_family import ManabaPageFamily
 from .group_handler import GroupHandlerMixin, group_handler
+from .link_index import LinkIndex, TraversalStep
+
+# name of the scraper model and url of a `ScrapeSource`
+SourceKey = tuple[str, str]
+
+
+class _ScrapeBatch(NamedTuple):
+    steps: list[TraversalStep]
+    task_entries: dict[int, model.crawl.CrawlEntry]
+    scraper_model_classes: dict[int, type[model.scrape.base.SQLScraperModelBase]]
+    # entries whose pages are parsed; the others are scraped from `existing_entries`
+    stale_entry_ids: set[int]
+    futures: dict[int, concurrent.futures.Future]
+    existing_entries: dict[SourceKey, model.scrape.base.SQLScraperModelBase]
 
 
 # noinspection PyUnresolvedReferences
@@ -19,13 +37,18 @@ class ManabaGroupHandlerImpl:
             group_name=None, scraper_model_class=None, /, *, ignore=False
     ):
         # noinspection PyUnusedLocal
-        @group_handler(group_name=group_name)
+        @group_handler(
+            group_name=group_name,
+            scraper_model_class=None if ignore else scraper_model_class
+        )
         def impl(
                 self,
                 *,
                 session: Session,
-                task_entry: model.crawl.Task,
-                parent_model_entries: model.scrape.base.ParentModelEntries
+                task_entry: model.crawl.CrawlEntry,
+                parent_model_entries: model.scrape.base.ParentModelEntries,
+                fields: Optional[dict[str, Any]] = None,
+                existing_entry: Optional[model.scrape.base.SQLScraperModelBase] = None
         ) -> Optional[model.scrape.base.SQLScraperModelBase]:
             if ignore:
                 return None
@@ -33,7 +56,9 @@ class ManabaGroupHandlerImpl:
             model_entry = scraper_model_class.insert_from_task_entry(
                 session,
                 task_entry=task_entry,
-                parent_model_entries=parent_model_entries
+                parent_model_entries=parent_model_entries,
+                fields=fields,
+                existing_entry=existing_entry
             )
             assert model_entry is None \
                    or isinstance(model_entry, model.scrape.base.SQLScraperModelBase)
@@ -77,11 +102,18 @@ class ManabaGroupHandlerImpl:
 class ManabaScraper(GroupHandlerMixin, ManabaGroupHandlerImpl):
     logger = app_logging.create_logger()
 
+    LOAD_BATCH_SIZE = 256
+
     def __init__(
             self,
             session_context: SessionContext,
-            max_process_count=None
+            max_process_count=None,
+            parse_worker_count: Optional[int] = None
     ):
+        """
+        Pages are parsed by a pool of `parse_worker_count` processes if given, while
+        this process writes the entries; otherwise they are parsed in this process.
+        """
         super().__init__()
 
         self.__sc = session_context
@@ -91,6 +123,9 @@ class ManabaScraper(GroupHandlerMixin, ManabaGroupHandlerImpl):
         self.__max_process_count = max_process_count
         self.__process_count = 0
 
+        self.__parse_worker_count = parse_worker_count
+        self.__scraper_model_classes = {}
+
     def set_active_job(
             self,
             state: Literal['finished', 'unfinished'],
@@ -105,44 +140,280 @@ class ManabaScraper(GroupHandlerMixin, ManabaGroupHandlerImpl):
             self.__active_job_id = job.id
         return self.__active_job_id
 
-    def scrape(
+    def __scraper_model_class_of(
             self,
+            group_name: str
+    ) -> Optional[type[model.scrape.base.SQLScraperModelBase]]:
+        if group_name not in self.__scraper_model_classes:
+            params = self.group_handler_params(group_name) or {}
+            self.__scraper_model_classes[group_name] = params.get('scraper_model_class')
+        return self.__scraper_model_classes[group_name]
+
+    @classmethod
+    def __source_key(
+            cls,
+            scraper_model_class: type[model.scrape.base.SQLScraperModelBase],
+            task_entry: model.crawl.CrawlEntry
+    ) -> SourceKey:
+        return scraper_model_class.__name__, task_entry.lookup.url
+
+    def __map_source_entries(
+            self,
+            session: Session,
             *,
+            sources: Iterable[model.scrape.ScrapeSource]
+    ) -> dict[SourceKey, model.scrape.base.SQLScraperModelBase]:
+        scraper_model_classes = {
+            scraper_model_class.__name__: scraper_model_class
+            for scraper_model_class in model.scrape.base.SQLScraperModelBase.__subclasses__()
+        }
+        row_ids = collections.defaultdict(list)
+        for source in sources:
+            row_ids[source.model_name].append(source.row_id)
+
+        source_entries = {}
+        for model_name, row_id_list in row_ids.items():
+            scraper_model_class = scraper_model_classes[model_name]
+            for i in range(0, len(row_id_list), self.LOAD_BATCH_SIZE):
+                chunk = row_id_list[i:i + self.LOAD_BATCH_SIZE]
+                # only the ids of the rows are needed as parents
+                query = session.query(scraper_model_class).options(
+                    lazyload('*')
+                ).where(
+                    scraper_model_class.id.in_(chunk)
+                )
+                source_entries.update(((model_name, entry.id), entry) for entry in query)
+
+        return {
+            (source.model_name, source.url): source_entries[source.model_name, source.row_id]
+            for source in sources
+            if (source.model_name, source.row_id) in source_entries
+        }
+
+    def __prepare_batch(
+            self,
             session: Session,
-            task_entry: model.crawl.Task,
-            parent_model_entries: model.scrape.base.ParentModelEntries
-    ):
-        current_model_entry = self.handle_by_group_name(
-            session=session,
-            task_entry=task_entry,
-            parent_model_entries=parent_model_entries
+            executor: Optional[concurrent.futures.Executor],
+            *,
+            storage: type[model.crawl.CrawlStorage],
+            steps: list[TraversalStep],
+            sources: dict[SourceKey, model.scrape.ScrapeSource],
+            scraped_entries: dict[SourceKey, Optional[model.scrape.base.SQLScraperModelBase]]
+    ) -> _ScrapeBatch:
+        task_entries = storage.map_entries(
+            session,
+            entry_ids=(step.entry_id for step in steps)
+        )
+        scraper_model_classes = {}
+        for entry_id, task_entry in task_entries.items():
+            scraper_model_class = self.__scraper_model_class_of(task_entry.lookup.group_name)
+            if scraper_model_class is not None:
+                scraper_model_classes[entry_id] = scraper_model_class
+
+        keys = {
+            entry_id: self.__source_key(scraper_model_class, task_entries[entry_id])
+            for entry_id, scraper_model_class in scraper_model_classes.items()
+        }
+        existing_entries = self.__map_source_entries(
+            session,
+            sources=[sources[key] for key in set(keys.values()) if key in sources]
         )
 
-        self.__process_count += 1
-        if self.__max_process_count and self.__process_count >= self.__max_process_count:
-            return
+        stale_entry_ids = set()
+        for entry_id, scraper_model_class in scraper_model_classes.items():
+            key = keys[entry_id]
+            page = task_entries[entry_id].page
+            if key in scraped_entries:
+                continue
+            if key in existing_entries and page is not None and not sources[key].is_stale(
+                    content_hash=page.content_hash,
+                    parser_version=scraper_model_class._soup_parser().version
+            ):
+                continue
+            stale_entry_ids.add(entry_id)
+
+        stale_pages = [
+            task_entries[entry_id].page
+            for entry_id in stale_entry_ids
+            if task_entries[entry_id].page is not None
+        ]
+        model.crawl.PageContent.load_blobs(session, pages=stale_pages)
+
+        futures = {}
+        if executor is not None:
+            for entry_id in stale_entry_ids:
+                page = task_entries[entry_id].page
+                if page is None or page.content is None:
+                    continue
+                futures[entry_id] = executor.submit(
+                    scraper_model_classes[entry_id].parse_fields,
+                    page.content
+                )
+
+        return _ScrapeBatch(
+            steps=steps,
+            task_entries=task_entries,
+            scraper_model_classes=scraper_model_classes,
+            stale_entry_ids=stale_entry_ids,
+            futures=futures,
+            existing_entries=existing_entries
+        )
 
-        for next_task_entry in model.crawl.Task.iter_next(
+    def __scrape_batch(
+            self,
+            session: Session,
+            batch: _ScrapeBatch,
+            *,
+            sources: dict[SourceKey, model.scrape.ScrapeSource],
+            scraped_entries: dict[SourceKey, Optional[model.scrape.base.SQLScraperModelBase]],
+            parent_model_entries_stack: list[model.scrape.base.ParentModelEntries],
+            counts: collections.Counter
+    ) -> None:
+        parsed = []
+        for step in batch.steps:
+            task_entry = batch.task_entries[step.entry_id]
+            scraper_model_class = batch.scraper_model_classes.get(step.entry_id)
+            parent_model_entries = parent_model_entries_stack[step.depth]
+
+            if scraper_model_class is None:
+                current_model_entry = self.handle_by_group_name(
+                    session=session,
+                    task_entry=task_entry,
+                    parent_model_entries=parent_model_entries
+                )
+            else:
+                key = self.__source_key(scraper_model_class, task_entry)
+                if key in scraped_entries:
+                    # reached again by another path in this scrape
+                    current_model_entry = scraped_entries[key]
+                elif step.entry_id in batch.stale_entry_ids:
+                    future = batch.futures.get(step.entry_id)
+                    current_model_entry = self.handle_by_group_name(
+                        session=session,
+                        task_entry=task_entry,
+                        parent_model_entries=parent_model_entries,
+                        fields=None if future is None else future.result(),
+                        existing_entry=batch.existing_entries.get(key)
+                    )
+                    parsed.append((key, scraper_model_class, task_entry, current_model_entry))
+                    counts['parsed'] += 1
+                else:
+                    current_model_entry = batch.existing_entries[key]
+                    current_model_entry._set_parent_model_entry(parent_model_entries)
+                    counts['unchanged'] += 1
+                scraped_entries[key] = current_model_entry
+
+            del parent_model_entries_stack[step.depth + 1:]
+            parent_model_entries_stack.append(parent_model_entries.add(current_model_entry))
+
+        # ids of the rows inserted are given by the flush
+        session.flush()
+        for key, scraper_model_class, task_entry, model_entry in parsed:
+            source = sources.get(key)
+            if model_entry is None:
+                if source is not None:
+                    session.delete(sources.pop(key))
+                continue
+            sources[key] = model.scrape.ScrapeSource.record(
                 session,
-                base_task=task_entry
-        ):
-            self.scrape(
-                session=session,
-                task_entry=next_task_entry,
-                parent_model_entries=parent_model_entries.add(current_model_entry)
+                source=source,
+                model_name=key[0],
+                url=key[1],
+                row_id=model_entry.id,
+                content_hash=task_entry.page.content_hash,
+                parser_version=scraper_model_class._soup_parser().version
             )
 
+    def __delete_disappeared(
+            self,
+            session: Session,
+            *,
+            sources: dict[SourceKey, model.scrape.ScrapeSource],
+            scraped_entries: dict[SourceKey, Optional[model.scrape.base.SQLScraperModelBase]]
+    ) -> int:
+        disappeared_sources = [
+            source for key, source in sources.items()
+            if key not in scraped_entries
+        ]
+        entries = self.__map_source_entries(session, sources=disappeared_sources)
+        for source in disappeared_sources:
+            key = source.model_name, source.url
+            if key in entries:
+                session.delete(entries[key])
+            session.delete(source)
+            del sources[key]
+        return len(disappeared_sources)
+
     def scrape_all(self):
-        with self.__sc() as session:
-            for root_task in model.crawl.Task.iter_roots(
+        """
+        Scrape every entry of the active job in the order of the links from the roots.
+        The links are loaded at once into `LinkIndex` and walked without recursion, and
+        the entries are loaded in batches of `LOAD_BATCH_SIZE` along the walk. With the
+        parsing pool, the pages of a batch are parsed while the previous batch is
+        written.
+
+        Only pages whose content or parser changed since the rows were scraped, by
+        `ScrapeSource`, are parsed, and rows of pages not in the job are deleted. If no
+        row has its source recorded, every scraped row is dropped and scraped again.
+        """
+        with self.__sc() as session, contextlib.ExitStack() as stack:
+            job = model.crawl.Job.get_session_by_id(session, job_id=self.__active_job_id)
+            storage = model.crawl.storage_of(job)
+            link_index = LinkIndex(storage.iter_edge_rows(session, job=job))
+            self.logger.info(f'links loaded: {len(link_index)=}, {link_index.root_count=}')
+
+            sources = model.scrape.ScrapeSource.map_sources(session)
+            if not sources:
+                self.logger.info('no scrape sources recorded, scraping every page')
+                self.__drop_all_scraper_tables(session)
+
+            executor = None
+            if self.__parse_worker_count:
+                executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(self.__parse_worker_count)
+                )
+
+            steps = link_index.walk()
+            if self.__max_process_count:
+                steps = itertools.islice(steps, self.__max_process_count)
+
+            scraped_entries = {}
+            counts = collections.Counter()
+            parent_model_entries_stack = [model.scrape.base.ParentModelEntries()]
+            pending = None
+            while True:
+                steps_batch = list(itertools.islice(steps, self.LOAD_BATCH_SIZE))
+                if steps_batch:
+                    batch = self.__prepare_batch(
+                        session,
+                        executor,
+                        storage=storage,
+                        steps=steps_batch,
+                        sources=sources,
+                        scraped_entries=scraped_entries
+                    )
+                if pending is not None:
+                    self.__scrape_batch(
+                        session,
+                        pending,
+                        sources=sources,
+                        scraped_entries=scraped_entries,
+                        parent_model_entries_stack=parent_model_entries_stack,
+                        counts=counts
+                    )
+                    self.__process_count += len(pending.steps)
+                if not steps_batch:
+                    break
+                pending = batch
+
+            # rows of the pages not walked are not known to have disappeared
+            if not self.__max_process_count:
+                counts['deleted'] = self.__delete_disappeared(
                     session,
-                    job=self.__active_job_id
-            ):
-                self.scrape(
-                    session=session,
-                    task_entry=root_task,
-                    parent_model_entries=model.scrape.base.ParentModelEntries()
+                    sources=sources,
+                    scraped_entries=scraped_entries
                 )
+            self.logger.info(f'scraped: {dict(counts)}')
 
     @classmethod
     def __drop_all_scraper_tables(cls, session: Session):
@@ -158,3 +429,4 @@ class ManabaScraper(GroupHandlerMixin, ManabaGroupHandlerImpl):
     def reset_database(self):
         with self.__sc() as session:
             self.__drop_all_scraper_tables(session)
+            session.query(model.scrape.ScrapeSource).delete()